@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+市町村の隣接グラフ（空間重み行列）
+
+N03の境界ポリゴンから隣接関係を求めてJSONに保存し、
+実行時は疎な重み行列（辺リスト）として読み込む。
+
+    python adjacency.py   # yamagata_municipalities.geojson から yamagata_adjacency.json を作成
+"""
+
+import json
+import os
+
+import numpy as np
+
+GEOJSON_FILE = "yamagata_municipalities.geojson"
+ADJACENCY_FILE = "yamagata_adjacency.json"
+
+# 共有境界線の簡略化の許容誤差（度、約50m）
+BORDER_SIMPLIFY_TOLERANCE = 0.0005
+
+
+def build_adjacency(geojson: dict) -> dict:
+    """
+    境界ポリゴンから市町村の隣接関係を求める
+
+    境界線を共有するペアを rook 隣接、点のみで接するペアを queen 隣接とする。
+    rook 隣接の辺には、共有境界線のGeoJSONジオメトリ（border）も持たせる。
+
+    Args:
+        geojson: 市町村ごとにマージ済みのFeatureCollection（N03_004 に市町村名）
+
+    Returns:
+        {"municipalities": [...], "codes": [...], "edges": [{"i", "j", "length", "type", "border"}, ...]}
+        の辞書。辺は i < j の向きで1本ずつ持つ。
+    """
+    from shapely.geometry import shape, mapping
+    from shapely.ops import linemerge
+    from shapely.strtree import STRtree
+
+    names, codes, polygons = [], [], []
+    for feature in geojson["features"]:
+        props = feature.get("properties", {})
+        name = props.get("N03_004")
+        if not name:
+            continue
+        geometry = shape(feature["geometry"])
+        if not geometry.is_valid:
+            geometry = geometry.buffer(0)
+        names.append(name)
+        codes.append(props.get("N03_007", ""))
+        polygons.append(geometry)
+
+    tree = STRtree(polygons)
+    edges = []
+    for i, polygon in enumerate(polygons):
+        for j in tree.query(polygon, predicate="intersects"):
+            j = int(j)
+            if j <= i:
+                continue
+            shared = polygon.boundary.intersection(polygons[j].boundary)
+            if shared.is_empty:
+                continue
+            edge = {
+                "i": i,
+                "j": j,
+                "length": shared.length,
+                "type": "rook" if shared.length > 0 else "queen",
+            }
+            if shared.length > 0:
+                # 共有境界線（等語線の描画用に簡略化して保持）
+                lines = [
+                    g for g in getattr(shared, "geoms", [shared])
+                    if g.geom_type in ("LineString", "MultiLineString")
+                ]
+                border = linemerge(lines).simplify(BORDER_SIMPLIFY_TOLERANCE)
+                edge["border"] = mapping(border)
+            edges.append(edge)
+
+    return {"municipalities": names, "codes": codes, "edges": edges}
+
+
+def save_adjacency(adjacency: dict, path: str = ADJACENCY_FILE) -> None:
+    """隣接関係をJSONに保存する"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(adjacency, f, ensure_ascii=False)
+
+
+def load_adjacency(path: str = ADJACENCY_FILE, geojson_path: str = GEOJSON_FILE) -> dict:
+    """
+    隣接関係を読み込む（JSONがなければ境界ポリゴンから構築する）
+
+    Returns:
+        build_adjacency と同じ形式の辞書。どちらのファイルもなければ None
+    """
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if os.path.exists(geojson_path):
+        with open(geojson_path, "r", encoding="utf-8") as f:
+            return build_adjacency(json.load(f))
+    return None
+
+
+class SpatialWeights:
+    """
+    疎な空間重み行列（CSR形式の辺リスト）
+
+    Args:
+        names: 市町村名のリスト（行・列の順序）
+        rows, cols: 隣接ペアの行・列インデックス（両方向を含む）
+        weights: 各辺の重み
+    """
+
+    def __init__(self, names, rows, cols, weights):
+        self.names = list(names)
+        self.n = len(self.names)
+        order = np.lexsort((cols, rows))
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self.cols = np.asarray(cols, dtype=np.int64)[order]
+        self.weights = np.asarray(weights, dtype=np.float64)[order]
+        self.cardinalities = np.bincount(self.rows, minlength=self.n)
+
+    @classmethod
+    def from_adjacency(cls, adjacency: dict, contiguity: str = "queen", row_standardize: bool = True):
+        """
+        隣接関係から重み行列を作る
+
+        Args:
+            adjacency: build_adjacency / load_adjacency の結果
+            contiguity: "queen"（点で接するペアも含む）または "rook"（境界線を共有するペアのみ）
+            row_standardize: 行和が1になるよう正規化するか
+        """
+        edges = [e for e in adjacency["edges"] if contiguity == "queen" or e["type"] == "rook"]
+        i = np.array([e["i"] for e in edges], dtype=np.int64)
+        j = np.array([e["j"] for e in edges], dtype=np.int64)
+        weights = cls(adjacency["municipalities"], np.concatenate([i, j]), np.concatenate([j, i]),
+                      np.ones(2 * len(edges)))
+        return weights.standardized() if row_standardize else weights
+
+    def standardized(self):
+        """行和が1になるよう正規化した重み行列"""
+        row_sums = np.bincount(self.rows, weights=self.weights, minlength=self.n)
+        return SpatialWeights(self.names, self.rows, self.cols, self.weights / row_sums[self.rows])
+
+    def subset(self, names):
+        """
+        指定した市町村だけに絞った重み行列（順序は names に従う）
+
+        行和を正規化した重み行列の場合は、絞り込み後に正規化をやり直す。
+        """
+        position = {name: k for k, name in enumerate(names)}
+        mapping = np.array([position.get(name, -1) for name in self.names], dtype=np.int64)
+        rows, cols = mapping[self.rows], mapping[self.cols]
+        keep = (rows >= 0) & (cols >= 0)
+        weights = SpatialWeights(names, rows[keep], cols[keep], self.weights[keep])
+        return weights.standardized() if self._is_standardized() else weights
+
+    def _is_standardized(self) -> bool:
+        row_sums = np.bincount(self.rows, weights=self.weights, minlength=self.n)
+        return bool(np.allclose(row_sums[self.cardinalities > 0], 1.0))
+
+    @property
+    def s0(self) -> float:
+        """重みの総和"""
+        return float(self.weights.sum())
+
+    def lag(self, values: np.ndarray) -> np.ndarray:
+        """
+        空間ラグ W·x を計算する
+
+        Args:
+            values: 形状 (..., n) の配列。先頭の次元はまとめて一度に計算する
+
+        Returns:
+            values と同じ形状の配列
+        """
+        values = np.asarray(values, dtype=np.float64)
+        batch = values.reshape(-1, self.n)
+        contributions = batch[:, self.cols] * self.weights
+        offsets = (np.arange(batch.shape[0]) * self.n)[:, None]
+        lagged = np.bincount((self.rows + offsets).ravel(), weights=contributions.ravel(),
+                             minlength=batch.size)
+        return lagged.reshape(values.shape)
+
+
+if __name__ == "__main__":
+    print(f"{GEOJSON_FILE} から隣接関係を構築します...")
+    with open(GEOJSON_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    adjacency = build_adjacency(data)
+    save_adjacency(adjacency)
+    rook = sum(1 for e in adjacency["edges"] if e["type"] == "rook")
+    print(f"  市町村数: {len(adjacency['municipalities'])}")
+    print(f"  隣接ペア数: {len(adjacency['edges'])}（境界線共有: {rook}）")
+    print(f"出力ファイル: {ADJACENCY_FILE}")
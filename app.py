@@ -6,24 +6,60 @@ Streamlit + Plotly による方言アンケート結果の可視化
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import requests
-import folium
-from streamlit_folium import st_folium
-from branca.element import MacroElement, Template, Element
-from shapely.geometry import shape
 import json
 import math
+import os
 from data_processor import (
-    load_data,
+    load_multiple_data,
+    compact_dataframe,
+    SPREADSHEET_URLS,
     get_question_distribution,
     get_municipality_distribution,
-    get_free_text_by_municipality,
+    get_prefecture_distribution,
+    get_dataset_version,
+    explode_answers,
     QUESTION_LABELS,
     QUESTION_COLUMNS,
+    RULE_COLUMN,
+    resolution_summary,
+    unmatched_locations,
 )
-from municipalities import MUNICIPALITIES, REGIONS, get_coordinates
+from municipalities import HOME_PREFECTURE, MUNICIPALITIES, REGIONS
+from map_view import (
+    YAMAGATA_COLORS,
+    build_color_map,
+    build_map_table,
+    build_map_features,
+    build_map_styles,
+    build_prefecture_styles,
+    home_prefecture_distribution,
+)
+from map_tiles import load_tile_index, tiled_geojson
+from response_store import (
+    store_is_fresh,
+    read_responses,
+    read_answers,
+    query_question_distribution,
+    query_municipality_distribution,
+    query_prefecture_distribution,
+)
+from free_text_index import FreeTextIndex
+from adjacency import load_adjacency, SpatialWeights, GEOJSON_FILE
+from spatial_stats import question_spatial_statistics, all_questions_spatial_statistics
+from isogloss import compute_isoglosses
+from dialect_similarity import (
+    DialectSimilarity,
+    build_feature_counts,
+    average_linkage,
+    cut_tree,
+    dendrogram_segments,
+)
+from share_intervals import compute_share_intervals
+from association import compute_associations, contingency_table, standardized_residuals
+from interpolation import InterpolationGrid, SurfaceInterpolator, render_share, render_dominant
+from timeseries import ResponseTimeSeries
+import instrumentation
+from instrumentation import stage, timed, cache_miss
 
 # ======================================
 # ページ設定
@@ -404,39 +440,242 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ======================================
-# カラーパレット（プロット用）
-# ======================================
-YAMAGATA_COLORS = [
-    "#E95464",  # 韓紅 (Karakurenai) - 鮮やかな赤
-    "#F4A460",  # 洒落柿 (Sharegaki) - 洗練されたオレンジ
-    "#8B4F35",  # 煉瓦色 (Rengairo) - 落ち着いた赤茶
-    "#2F5D50",  # 老竹色 (Oitakeiro) - 深い緑
-    "#91B493",  # 白緑 (Byakuroku) - 淡い緑
-    "#4B6584",  # 鉄御納戸 (Tetsuonando) - グレイッシュな青
-    "#A5B2C6",  # 藤鼠 (Fujinezu) - 紫がかったグレー
-    "#D7C4BB",  # 亜麻色 (Amairo) - ベージュ
-    "#E6C35C",  # 黄金 (Kogane) - 上品なゴールド
-    "#7B5544",  # 栗色 (Kuriiro) - ダークブラウン
-    "#6FA0B6",  # 錆浅葱 (Sabiasagi) - くすんだ青緑
-    "#C08EAF",  # 長春色 (Choshuniro) - 落ち着いたピンク
-    "#766C5B",  # 利休茶 (Rikyucha) - 緑がかった茶色
-    "#3A4F52",  # 鉄色 (Tetsuiro) - 非常に濃い青緑
-    "#BDBDB8",  # 潤色 (Urumiiro) - ウォームグレー
-]
-
 # ======================================
 # データ読み込み（キャッシュ）
 # ======================================
-@st.cache_data(ttl=3600)
+# 回答ストア（SQLite）のパス。設定すると複数のワーカープロセスで1つのデータベースを共有する
+RESPONSE_DB_PATH = os.environ.get("HOUGEN_DB_PATH")
+DATA_TTL = 3600
+
+# 自由記入欄の1ページあたりの表示件数
+FREE_TEXT_PAGE_SIZE = 20
+
+@timed("get_data", measure_bytes=True)
+@st.cache_data(ttl=DATA_TTL)
+@cache_miss("get_data")
 def get_data():
-    """データの読み込みとキャッシュ"""
-    return load_data()
+    """
+    データの読み込みとキャッシュ（全シートを並行取得）
+
+    キャッシュはワーカーごとに保持されるため、コンパクトな表現にしてから返す。
+    自由記入欄は別テーブルとして返す。最後の要素はデータセットの版（ハッシュ）。
+    回答ストアが設定されている場合は、ストアが古いときだけシートを読み込んで書き出し、
+    各ワーカーはストアから回答者テーブルのみを読む（設問の集計はSQLで行う）。
+    """
+    if RESPONSE_DB_PATH:
+        if store_is_fresh(RESPONSE_DB_PATH, DATA_TTL):
+            load_report = pd.DataFrame(columns=["状態", "件数", "所要時間", "エラー", "重複件数"])
+        else:
+            _, load_report = load_multiple_data(SPREADSHEET_URLS, db_path=RESPONSE_DB_PATH)
+        df, free_text_df = read_responses(RESPONSE_DB_PATH)
+        df, _ = compact_dataframe(df)
+    else:
+        df, load_report = load_multiple_data(SPREADSHEET_URLS)
+        df, free_text_df = compact_dataframe(df)
+
+    return df, free_text_df, load_report, get_dataset_version(df, free_text_df)
+
+
+def question_distribution(df, question_key, time_series=None, window=None):
+    """設問の回答分布（期間指定時は時系列の累積和から、回答ストアがあればSQLiteから取得）"""
+    if window is not None:
+        return time_series.question_distribution(question_key, *window)
+    if RESPONSE_DB_PATH:
+        return query_question_distribution(RESPONSE_DB_PATH, question_key)
+    return get_question_distribution(df, question_key)
+
+
+def municipality_distribution(df, question_key, time_series=None, window=None):
+    """市町村ごとの設問回答分布（期間指定時は時系列の累積和から、回答ストアがあればSQLiteから取得）"""
+    if window is not None:
+        return time_series.municipality_distribution(question_key, *window)
+    if RESPONSE_DB_PATH:
+        return query_municipality_distribution(RESPONSE_DB_PATH, question_key)
+    return get_municipality_distribution(df, question_key)
+
+
+def prefecture_distribution(df, question_key, map_dist, window=None):
+    """
+    都道府県ごとの設問回答分布と、都道府県 → 回答のあった市町村数（地図を縮小したときの集計）
+
+    期間を指定したときは時系列が市町村名（対象県）ごとの件数しか持たないため、対象県だけを集計する。
+    """
+    home_dist, municipality_counts = home_prefecture_distribution(map_dist)
+    if window is not None:
+        return home_dist, municipality_counts
+    if RESPONSE_DB_PATH:
+        return query_prefecture_distribution(RESPONSE_DB_PATH, question_key), municipality_counts
+    return get_prefecture_distribution(df, question_key), municipality_counts
+
+
+@st.cache_resource(max_entries=2)
+def get_time_series(_df, dataset_version):
+    """回答日時ごとの件数の累積和（データセットの版ごとに1回だけ構築）"""
+    answers = read_answers(RESPONSE_DB_PATH) if RESPONSE_DB_PATH else explode_answers(_df)
+    return ResponseTimeSeries(_df, answers)
+
+
+@st.cache_resource(max_entries=2)
+def get_free_text_index(_free_text_df, dataset_version):
+    """自由記入欄の検索インデックス（データセットの版ごとに1回だけ構築）"""
+    return FreeTextIndex(_free_text_df)
+
+@st.cache_data
+def get_geojson():
+    """市町村境界のGeoJSON（ローカルファイル、タイルだけを配置したときはなくてもよい）"""
+    try:
+        with open(GEOJSON_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError as e:
+        if get_tile_index() is None:
+            st.error(f"地図データの読み込みエラー: {e}")
+        return None
+    except Exception as e:
+        st.error(f"地図データの読み込みエラー: {e}")
+        return None
+
+
+@st.cache_data
+def get_tile_index():
+    """境界のタイルの一覧（map_tiles.py で書き出していなければ None）"""
+    return load_tile_index()
+
+
+@st.cache_resource
+def get_adjacency():
+    """市町村の隣接関係（境界データがなければ None）"""
+    return load_adjacency()
+
+
+@st.cache_resource
+def get_spatial_weights():
+    """市町村の隣接関係から空間重み行列を作成（境界データがなければ None）"""
+    adjacency = get_adjacency()
+    if adjacency is None:
+        return None
+    return SpatialWeights.from_adjacency(adjacency)
+
+
+@st.cache_data(max_entries=50)
+def get_spatial_statistics(_cross_tab, dataset_version, question_key):
+    """設問ごとの空間統計（データセットの版ごとにキャッシュ）"""
+    return question_spatial_statistics(_cross_tab, get_spatial_weights())
+
+
+@st.cache_data(max_entries=2)
+def get_all_spatial_statistics(_df, dataset_version):
+    """全設問の空間統計（データセットの版ごとにキャッシュ）"""
+    cross_tabs = {
+        question_key: municipality_distribution(_df, question_key)
+        for question_key in QUESTION_COLUMNS
+    }
+    return all_questions_spatial_statistics(cross_tabs, get_spatial_weights())
+
+@st.cache_data(max_entries=50)
+def get_isoglosses(_cross_tab, dataset_version, question_key, window=None):
+    """設問ごとの等語線（データセットの版・期間ごとにキャッシュ）"""
+    adjacency = get_adjacency()
+    if adjacency is None:
+        return None
+    return compute_isoglosses(_cross_tab, adjacency)
+
+@st.cache_resource
+def get_interpolation_grid():
+    """県域で切り抜いた補間グリッド（ワーカーごとに1回だけ作成）"""
+    return InterpolationGrid(get_geojson())
+
+
+@st.cache_resource
+def get_interpolator(method):
+    """補間グリッドの県域マスクと重み行列（境界データがなければ None）"""
+    if get_geojson() is None:
+        return None
+    return SurfaceInterpolator(get_interpolation_grid(), method)
+
+@st.cache_resource
+def get_dialect_similarity(metric):
+    """市町村間の距離行列（ワーカーごとに保持し、件数の変化に応じて差分更新する）"""
+    return DialectSimilarity(metric)
+
+
+@st.cache_data(max_entries=4)
+def get_dialect_clusters(_df, dataset_version, metric):
+    """全設問の距離行列と階層クラスタリング（データセットの版ごとにキャッシュ）"""
+    counts = build_feature_counts({
+        question_key: municipality_distribution(_df, question_key)
+        for question_key in QUESTION_COLUMNS
+    })
+    similarity = get_dialect_similarity(metric)
+    similarity.update(counts)
+    distances = similarity.distances
+    return distances, average_linkage(distances.to_numpy())
+
+@st.cache_data(max_entries=2)
+def get_share_intervals(_df, dataset_version):
+    """全設問の回答割合の信用区間（データセットの版ごとにキャッシュ）"""
+    return compute_share_intervals({
+        question_key: municipality_distribution(_df, question_key)
+        for question_key in QUESTION_COLUMNS
+    })
+
+@st.cache_data(max_entries=2)
+def get_associations(_df, dataset_version):
+    """設問間の関連（回答者単位の共起行列、データセットの版ごとにキャッシュ）"""
+    answers = read_answers(RESPONSE_DB_PATH) if RESPONSE_DB_PATH else explode_answers(_df)
+    associations = compute_associations(answers)
+    questions = [key for key in QUESTION_COLUMNS if key in associations["cramers_v"].index]
+    for name in ("cramers_v", "mutual_info", "respondents"):
+        associations[name] = associations[name].loc[questions, questions]
+    return associations
+
+def show_plotly(fig):
+    """Plotly の図を表示する（描画時間を計測する）"""
+    with stage("plotly"):
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+
+
+def show_diagnostics(run, df):
+    """
+    診断パネル（HOUGEN_DIAGNOSTICS=1 のときだけサイドバーに表示）
+
+    今回の再実行での段階ごとの処理時間・キャッシュのヒット/ミスと、計測記録のダウンロードを表示する。
+    回答データに名寄せ規則があれば（回答ストアにも保存する）、規則ごとの件数と県外/不明になった住所テキストも表示する。
+    """
+    with st.sidebar.expander("🩺 診断（処理時間）"):
+        summary = instrumentation.summary(run)
+        st.caption(f"再実行 #{run}（合計 {summary['合計秒'].sum():.2f}秒、入れ子の段階を含む）")
+        st.dataframe(
+            summary,
+            column_config={
+                "合計秒": st.column_config.NumberColumn(format="%.3f"),
+                "平均秒": st.column_config.NumberColumn(format="%.3f"),
+                "最大秒": st.column_config.NumberColumn(format="%.3f"),
+            },
+        )
+        st.download_button(
+            "計測記録をダウンロード（JSON Lines）",
+            instrumentation.to_jsonl(),
+            file_name="diagnostics.jsonl",
+            mime="application/jsonl",
+        )
+
+    if RULE_COLUMN in df.columns:
+        with st.sidebar.expander("🩺 診断（名寄せ）"):
+            st.dataframe(
+                resolution_summary(df),
+                column_config={"割合": st.column_config.NumberColumn(format="percent")},
+                hide_index=True,
+            )
+            st.caption("県外/不明になった住所テキスト（件数の多い順）")
+            st.dataframe(unmatched_locations(df), hide_index=True)
+
 
 # ======================================
 # メインアプリ
 # ======================================
 def main():
+    run = instrumentation.start_run()
+    
     # ヘッダー
     st.markdown("""
     <div class="hero-header animate-fade-in">
@@ -448,7 +687,7 @@ def main():
     # データ読み込み
     try:
         with st.spinner("データを読み込んでいます..."):
-            df = get_data()
+            df, free_text_df, load_report, dataset_version = get_data()
     except Exception as e:
         st.error(f"""
         ⚠️ **データの読み込みに失敗しました**
@@ -462,6 +701,16 @@ def main():
         """)
         st.stop()
     
+    # 一部のシートのみ失敗した場合は警告を出して続行
+    failed_sources = load_report[load_report["状態"] != "成功"]
+    if not failed_sources.empty:
+        st.warning(
+            "一部のシートを読み込めませんでした: "
+            + "、".join(f"{name}（{row['エラー']}）" for name, row in failed_sources.iterrows())
+        )
+    
+    time_series = get_time_series(df, dataset_version)
+    
     # ======================================
     # サイドバー
     # ======================================
@@ -477,6 +726,28 @@ def main():
         )
         selected_question = question_options[selected_question_label]
         
+        show_isoglosses = st.checkbox(
+            "等語線（方言の境界）を地図に重ねる",
+            help="隣り合う市町村で最多回答が入れ替わる境界、または回答分布が大きく異なる境界を線で表示します",
+        )
+        
+        # 回答期間の絞り込み（地図・サマリー・市町村別の分布に反映）
+        # window は時系列に渡す [開始, 終了) で、選んだ終了日の回答も含むよう終了日の翌バケットまでとする
+        window = None
+        period_label = None
+        if len(time_series) > 1:
+            period_options = list(time_series.bucket_starts.date)
+            period_start, period_end = st.select_slider(
+                "回答期間",
+                options=period_options,
+                value=(period_options[0], period_options[-1]),
+                help="指定した期間（終了日を含む）に送信された回答だけで地図と分布を表示します",
+            )
+            if (period_start, period_end) != (period_options[0], period_options[-1]):
+                bucket = pd.tseries.frequencies.to_offset(time_series.freq)
+                window = (pd.Timestamp(period_start), pd.Timestamp(period_end) + bucket)
+                period_label = f"{period_start} 〜 {period_end}"
+        
         st.markdown("---")
         
         # 市町村フィルター
@@ -505,6 +776,9 @@ def main():
         yamagata_responses = len(df[df["市町村名"] != "県外/不明"])
         st.metric("総回答数", f"{total_responses}件")
         st.metric("県内回答数", f"{yamagata_responses}件")
+        duplicate_count = int(load_report["重複件数"].sum()) if "重複件数" in load_report.columns else 0
+        if duplicate_count:
+            st.caption(f"※重複・機械的な送信と判定した {duplicate_count}件 を集計から除外しています")
         
         unique_municipalities = df[df["市町村名"] != "県外/不明"]["市町村名"].nunique()
         st.metric("回答のあった市町村", f"{unique_municipalities}箇所")
@@ -561,93 +835,34 @@ def main():
     """, unsafe_allow_html=True)
     
     # マップ用データの作成（市町村ごとの最多回答を抽出）
-    map_dist = get_municipality_distribution(df, selected_question)
+    map_dist = municipality_distribution(df, selected_question, time_series, window)
+    if window is not None:
+        st.caption(f"📅 {period_label} に送信された回答のみを表示しています")
     
     if not map_dist.empty:
-        # GeoJSONの読み込み（ローカルファイル）
-        @st.cache_data
-        def get_geojson():
-            import json
-            try:
-                with open("yamagata_municipalities.geojson", "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                st.error(f"地図データの読み込みエラー: {e}")
-                return None
-
+        # GeoJSONの読み込み（ローカルファイル）と境界のタイルの一覧（書き出していれば表示範囲のタイルだけを読み込む）
         geojson = get_geojson()
+        tile_index = get_tile_index()
         
-        # 最多回答（ドミナント）を特定
-        map_data = []
-        for city in map_dist.index:
-            row = map_dist.loc[city]
-            if row.sum() == 0:
-                continue
-            
-            # 最も多い回答を取得
-            top_answer = row.idxmax()
-            count = row[top_answer]
-            total = row.sum()
-            ratio = count / total
-            
-            # 上位3回答の詳細を作成
-            sorted_answers = row[row > 0].sort_values(ascending=False).head(3)
-            top3_details = []
-            for ans, cnt in sorted_answers.items():
-                pct = cnt / total * 100
-                top3_details.append(f"{ans}: {pct:.0f}%")
-            top3_str = " / ".join(top3_details)
-            
-            map_data.append({
-                "市町村": city,
-                "最も多い方言": top_answer,
-                "回答数": count,
-                "総回答数": total,
-                "割合": f"{ratio:.1%}",
-                "上位回答": top3_str,
-            })
-            
-
-        df_map_viz = pd.DataFrame(map_data)
-        
-        # 座標情報を追加（ラベル表示用）
-        # 緯度経度が取得できない（Noneの）場合はその行を除外
-        coords_mask = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[0] is not None)
-        df_map_viz = df_map_viz[coords_mask].copy()
-        
-        if not df_map_viz.empty:
-            df_map_viz["緯度"] = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[0]).astype(float)
-            df_map_viz["経度"] = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[1]).astype(float)
+        # 最多回答（ドミナント）と上位3回答を特定
+        with stage("map_table"):
+            df_map_viz = build_map_table(map_dist)
         
-        if not df_map_viz.empty and geojson:
+        if not df_map_viz.empty and (geojson or tile_index):
             # --- Folium マップの実装（ダークモード対応）---
+            # plotly・folium・shapely は読み込みに時間がかかるため、描画する箇所で読み込む
+            import folium
+            from shapely.geometry import shape
+            from streamlit_folium import st_folium
             
             # 1. 基本色の定義（上位回答に色を割り当て）
-            total_dist = get_question_distribution(df, selected_question)
+            total_dist = question_distribution(df, selected_question)
             top_answers = total_dist["回答"].tolist()
             
-            # 回答 -> 色（Hex）の辞書作成
-            base_color_map = {}
-            for i, ans in enumerate(top_answers):
-                if i < len(YAMAGATA_COLORS):
-                    base_color_map[ans] = YAMAGATA_COLORS[i]
-                else:
-                    base_color_map[ans] = "#808080"  # その他はグレー
-
-            # 2. 市町村ごとの最多回答の色を準備
-            municipality_colors = {}  # 市町村名 -> 色
-            for city in map_dist.index:
-                row = map_dist.loc[city]
-                total = row.sum()
-                if total == 0:
-                    continue
-                
-                # 最も多い回答を取得
-                top_answer = row.idxmax()
-                color = base_color_map.get(top_answer, "#808080")
-                municipality_colors[city] = color
+            # 回答 -> 色（Hex）の辞書作成（その他はグレー）
+            base_color_map = build_color_map(top_answers)
             
-            # 3. Foliumマップの作成（ダークモード対応タイル）
+            # 2. Foliumマップの作成（ダークモード対応タイル）
             # 山形県全体が見えるように調整（中心を少し西・南へ、ズームを引く）
             m = folium.Map(
                 location=[38.35, 140.1], 
@@ -655,90 +870,95 @@ def main():
                 tiles="CartoDB dark_matter"  # ダークモード対応タイル
             )
             
-            # ツールチップ用のデータを準備
-            tooltip_data = {}
-            for _, row in df_map_viz.iterrows():
-                city = row['市町村']
-                tooltip_data[city] = {
-                    'top_ans': row['最も多い方言'],
-                    'top3_str': row['上位回答'],
-                    'total_count': row['総回答数']
-                }
-
-            # 4. GeoJsonデータの構築（プロパティ注入）
-            processed_features = []
+            # 最多回答の割合の信用区間（回答数の少ない市町村は区間が広くなる）
+            if window is None:
+                _, dominant_intervals = get_share_intervals(df, dataset_version)
+            else:
+                _, dominant_intervals = compute_share_intervals({selected_question: map_dist})
+            if not dominant_intervals.empty:
+                dominant_intervals = dominant_intervals[dominant_intervals["設問"] == selected_question]
+                dominant_intervals = dominant_intervals.set_index("市町村名")
             
-            for feature in geojson['features']:
-                props = feature['properties']
-                city_name = props.get('N03_004')
-                
-                # 該当なしの場合はスキップまたはデフォルト表示
-                if not city_name:
-                    continue
-                    
-                color = municipality_colors.get(city_name, '#404050')
-                tip_info = tooltip_data.get(city_name, {})
-                
-                # ツールチップ/ポップアップHTMLの構築
-                if tip_info:
-                    html_content = f"""
-                    <div style="font-family: sans-serif; font-size: 14px; padding: 5px; min-width: 200px;">
-                        <b style="font-size: 16px;">{city_name}</b><br>
-                        <hr style="margin: 5px 0; border-color: #ccc;">
-                        <b>最多回答:</b> {tip_info.get('top_ans', 'N/A')}<br>
-                        <b>詳細:</b> {tip_info.get('top3_str', 'N/A')}<br>
-                        <b>回答数:</b> {tip_info.get('total_count', 0)}件
-                    </div>
-                    """
-                else:
-                    html_content = f"<b>{city_name}</b>"
-                
-                # プロパティに情報を注入
-                feature['properties']['fillColor'] = color
-                feature['properties']['popup_content'] = html_content
-                processed_features.append(feature)
+            # 3. 市町村ごとの色とポップアップ
+            if tile_index is not None:
+                # 境界のタイル: 縮小時は都道府県ごとの集計、拡大時は市町村ごとの塗り色を表示範囲のタイルに適用する
+                with stage("geojson_styling"):
+                    municipality_styles = build_map_styles(map_dist, df_map_viz, base_color_map, dominant_intervals)
+                    prefecture_dist, municipality_counts = prefecture_distribution(
+                        df, selected_question, map_dist, window
+                    )
+                    prefecture_styles = build_prefecture_styles(prefecture_dist, base_color_map, municipality_counts)
+                tiled_geojson(prefecture_styles, municipality_styles, HOME_PREFECTURE).add_to(m)
+            else:
+                # GeoJsonデータの構築（市町村ごとの色とポップアップをプロパティに注入）
+                with stage("geojson_styling"):
+                    processed_features = build_map_features(
+                        geojson, map_dist, df_map_viz, base_color_map, dominant_intervals
+                    )
             
-            # 更新されたGeoJSONデータ
-            geojson['features'] = processed_features
+                # 更新されたGeoJSONデータ
+                geojson['features'] = processed_features
             
-            # スタイル関数の定義（プロパティを参照）
-            def style_function(feature):
-                return {
-                    'fillColor': feature['properties'].get('fillColor', '#404050'),
-                    'color': '#ffffff',
-                    'weight': 1.5,
-                    'fillOpacity': 0.75,
-                    'opacity': 0.8
-                }
+                # スタイル関数の定義（プロパティを参照）
+                def style_function(feature):
+                    return {
+                        'fillColor': feature['properties'].get('fillColor', '#404050'),
+                        'color': '#ffffff',
+                        'weight': 1.5,
+                        'fillOpacity': 0.75,
+                        'opacity': 0.8
+                    }
             
-            def highlight_function(feature):
-                return {
-                    'fillColor': '#4ecdc4',  # ハイライト時はティール色
-                    'color': '#ffffff',
-                    'weight': 3,
-                    'fillOpacity': 0.95,
-                    'opacity': 1.0
-                }
+                def highlight_function(feature):
+                    return {
+                        'fillColor': '#4ecdc4',  # ハイライト時はティール色
+                        'color': '#ffffff',
+                        'weight': 3,
+                        'fillOpacity': 0.95,
+                        'opacity': 1.0
+                    }
             
-            # 単一のGeoJsonレイヤーとして追加
-            folium.GeoJson(
-                data=geojson,
-                name="山形県方言",
-                style_function=style_function,
-                highlight_function=highlight_function,
-                popup=folium.GeoJsonPopup(
-                    fields=['popup_content'],
-                    aliases=[''],
-                    labels=False,
-                    localize=True,
-                    style="max-width: 300px;" # ポップアップのスタイル制限
-                )
-            ).add_to(m)
+                # 単一のGeoJsonレイヤーとして追加
+                folium.GeoJson(
+                    data=geojson,
+                    name="山形県方言",
+                    style_function=style_function,
+                    highlight_function=highlight_function,
+                    popup=folium.GeoJsonPopup(
+                        fields=['popup_content'],
+                        aliases=[''],
+                        labels=False,
+                        localize=True,
+                        style="max-width: 300px;" # ポップアップのスタイル制限
+                    )
+                ).add_to(m)
+
+            # 等語線（隣接市町村の境界のうち、方言が切り替わる部分）
+            if show_isoglosses:
+                isoglosses = get_isoglosses(map_dist, dataset_version, selected_question, window)
+                if isoglosses and isoglosses["features"]:
+                    folium.GeoJson(
+                        data=isoglosses,
+                        name="等語線",
+                        style_function=lambda feature: {
+                            'color': '#ffd700' if feature['properties']['種別'] == '最多回答の変化' else '#ff8fa3',
+                            'weight': 2 + 6 * feature['properties']['乖離度'],
+                            'opacity': 0.9,
+                        },
+                        tooltip=folium.GeoJsonTooltip(
+                            fields=['市町村A', '最多回答A', '市町村B', '最多回答B', '乖離度'],
+                            aliases=['市町村A', '最多回答', '市町村B', '最多回答', '乖離度'],
+                        ),
+                    ).add_to(m)
 
-            # 5. ラベル（市町村名＋最多回答）を追加
+            # 4. ラベル（市町村名＋最多回答）を追加
             # DivIconを使用して文字のみを表示
             # GeoJSONから重心を計算して配置
-            for feature in geojson['features']:
+            # 境界のタイルだけがあるときは市町村の代表点の座標に置く
+            label_features = geojson['features'] if geojson else [
+                {'properties': {'N03_004': city}, 'geometry': None} for city in df_map_viz['市町村']
+            ]
+            for feature in label_features:
                 props = feature['properties']
                 city_name = props.get('N03_004')
                 
@@ -795,7 +1015,8 @@ def main():
                 ).add_to(m)
 
             # Streamlitで表示
-            st_folium(m, width=None, height=700)
+            with stage("folium"):
+                st_folium(m, width=None, height=700)
             
             # --- 凡例をマップ下に表示（モダンなデザイン） ---
             legend_items = []
@@ -805,9 +1026,69 @@ def main():
             legend_html = '<div class="legend-container">' + ''.join(legend_items) + '</div>'
             st.markdown(legend_html, unsafe_allow_html=True)
             
+            # 最多回答が2番目と区別できない市町村
+            if not dominant_intervals.empty:
+                uncertain = dominant_intervals[~dominant_intervals["区別可能"]]
+                uncertain = uncertain[uncertain.index != "県外/不明"]
+                if not uncertain.empty:
+                    with st.expander(f"⚠️ 最多回答が2番目と統計的に区別できない市町村（{len(uncertain)}件）"):
+                        st.caption("回答数が少ないため、地図の色（最多回答）が入れ替わる可能性があります。")
+                        st.dataframe(
+                            uncertain[["最も多い方言", "割合", "下限", "上限", "2番目の方言", "優位確率"]],
+                            column_config={
+                                "割合": st.column_config.NumberColumn(format="%.2f"),
+                                "下限": st.column_config.NumberColumn(format="%.2f"),
+                                "上限": st.column_config.NumberColumn(format="%.2f"),
+                                "優位確率": st.column_config.NumberColumn(format="%.2f"),
+                            },
+                        )
+            
+            # 補間した回答割合の面（市町村の中のグラデーションを見る）
+            # 補間のグリッドと境界線は埋め込みの GeoJSON から作るため、タイルだけの配置では表示しない
+            if geojson:
+                with st.expander("🌈 回答の広がりをなめらかに表示（空間補間）"):
+                    col_answer, col_method = st.columns([2, 1])
+                    with col_answer:
+                        surface_options = ["最も多い方言"] + [ans for ans in top_answers if ans in map_dist.columns]
+                        surface_answer = st.selectbox("表示する回答", surface_options)
+                    with col_method:
+                        method_label = st.radio("補間方法", ["カーネル平滑化", "逆距離加重"], horizontal=True)
+                    interpolator = get_interpolator("kernel" if method_label == "カーネル平滑化" else "idw")
+                
+                    if surface_answer == "最も多い方言":
+                        indices, shares = interpolator.dominant_surface(map_dist)
+                        image = render_dominant(
+                            indices, shares, [base_color_map.get(ans, "#808080") for ans in map_dist.columns]
+                        )
+                    else:
+                        shares = interpolator.share_surface(map_dist, surface_answer)
+                        image = render_share(shares, base_color_map.get(surface_answer, "#ff8fa3"))
+                
+                    m_surface = folium.Map(location=[38.35, 140.1], zoom_start=7.5, tiles="CartoDB dark_matter")
+                    folium.raster_layers.ImageOverlay(
+                        image=image,
+                        bounds=interpolator.grid.bounds,
+                        mercator_project=True,
+                        name="補間",
+                    ).add_to(m_surface)
+                    folium.GeoJson(
+                        data=geojson,
+                        name="市町村境界",
+                        style_function=lambda feature: {'fillOpacity': 0, 'color': '#ffffff', 'weight': 0.5, 'opacity': 0.5},
+                        tooltip=folium.GeoJsonTooltip(fields=['N03_004'], aliases=['市町村']),
+                    ).add_to(m_surface)
+                    with stage("folium"):
+                        st_folium(m_surface, width=None, height=550, key="surface_map", returned_objects=[])
+                    st.caption(
+                        "各市町村の代表点の回答件数から、約500m間隔のグリッド上の割合を推定しています。"
+                        "回答の多い市町村ほど周囲への影響が大きくなります。"
+                    )
+            
         elif not df_map_viz.empty:
             # GeoJSONがない場合のフォールバック（散布図）
             st.warning("地図データの読み込みに失敗しました。簡易表示に切り替えます。")
+            import plotly.express as px
+            import plotly.graph_objects as go
             
             fig_scatter = px.scatter_mapbox(
                 df_map_viz.dropna(subset=["緯度", "経度"]),
@@ -837,7 +1118,7 @@ def main():
             ))
 
             fig_scatter.update_layout(height=600)
-            st.plotly_chart(fig_scatter, use_container_width=True, config={'displayModeBar': False})
+            show_plotly(fig_scatter)
     else:
         st.info("表示するデータがありません")
 
@@ -852,9 +1133,11 @@ def main():
     ''', unsafe_allow_html=True)
     
     # 上位10回答の分布
-    distribution = get_question_distribution(df, selected_question)
+    distribution = question_distribution(df, selected_question, time_series, window)
     
     if not distribution.empty:
+        import plotly.graph_objects as go
+
         # 【重要】データ型変換とカラム名変更（Plotlyの挙動安定化のため）
         # 全体に対して適用
         distribution["件数"] = pd.to_numeric(distribution["件数"], errors='coerce')
@@ -883,8 +1166,6 @@ def main():
             with st.expander("詳細データを見る"):
                 st.dataframe(top_dist)
             
-            import plotly.graph_objects as go
-            
             # Pandas Seriesをリストに変換（Plotlyの互換性向上のため）
             pie_labels = top_dist["Answer"].tolist()
             pie_values = top_dist["Count"].astype(int).tolist()
@@ -907,7 +1188,7 @@ def main():
                 plot_bgcolor="rgba(0,0,0,0)",
                 font=dict(color="#f0f0f5"),
             )
-            st.plotly_chart(fig_pie, use_container_width=True, config={'displayModeBar': False})
+            show_plotly(fig_pie)
         
         with col2:
             # --- 棒グラフ (graph_objectsを使用) ---
@@ -959,7 +1240,7 @@ def main():
                 uniformtext_mode='show' # 常に表示
             )
             # fig_bar.update_traces(textposition='outside', cliponaxis=False) # 上記で設定済みのため削除
-            st.plotly_chart(fig_bar, use_container_width=True, config={'displayModeBar': False})
+            show_plotly(fig_bar)
     
     st.markdown("---")
     
@@ -971,9 +1252,11 @@ def main():
     </div>
     ''', unsafe_allow_html=True)
     
-    cross_tab = get_municipality_distribution(df, selected_question)
+    cross_tab = municipality_distribution(df, selected_question, time_series, window)
     
     if not cross_tab.empty:
+        import plotly.express as px
+
         # 地域でフィルタリング
         if selected_region != "すべて":
             filter_municipalities = REGIONS[selected_region]
@@ -1032,12 +1315,351 @@ def main():
                 font=dict(color="#f0f0f5"),
             )
             
-            st.plotly_chart(fig_stack, use_container_width=True, config={'displayModeBar': False})
+            show_plotly(fig_stack)
         else:
             st.warning(f"{selected_region}地方のデータがありません")
     
     st.markdown("---")
     
+    # --- 空間的自己相関（地理的なまとまり） ---
+    st.markdown('''
+    <div class="section-title">
+        <span class="icon">🧭</span>
+        地理的なまとまり（空間的自己相関）
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    spatial_weights = get_spatial_weights()
+    
+    if spatial_weights is None:
+        st.info("市町村の境界データがないため、空間統計を計算できません")
+    else:
+        import plotly.graph_objects as go
+
+        spatial_summary, spatial_clusters = get_spatial_statistics(
+            municipality_distribution(df, selected_question), dataset_version, selected_question
+        )
+        
+        if not spatial_summary.empty:
+            st.caption(
+                "モランIが正で p値が小さい回答ほど、隣り合う市町村で似た割合になっている（地理的にまとまっている）ことを示します。"
+                "BB結合数は「その回答が最多の市町村」同士が隣接している組の数です。"
+            )
+            
+            # 割合がすべての市町村で同じ回答はモランIが定義できない（NaN）ため描かない
+            moran_data = spatial_summary.dropna(subset=["モランI"]).sort_values("モランI", ascending=True).tail(15)
+            fig_moran = go.Figure(data=[go.Bar(
+                x=moran_data["モランI"].tolist(),
+                y=moran_data["回答"].tolist(),
+                orientation='h',
+                marker=dict(color=["#E95464" if p <= 0.05 else "#6a6a7a" for p in moran_data["p値"]]),
+                text=[f"p={p:.3f}" for p in moran_data["p値"]],
+                textposition='outside',
+                textfont=dict(color="#f0f0f5"),
+                cliponaxis=False,
+            )])
+            fig_moran.update_layout(
+                title="回答ごとの大域モランI（赤: p ≤ 0.05）",
+                showlegend=False,
+                height=max(300, len(moran_data) * 28),
+                margin=dict(t=50, b=20, l=10, r=80),
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="#f0f0f5"),
+                xaxis=dict(fixedrange=True),
+                yaxis=dict(fixedrange=True),
+            )
+            show_plotly(fig_moran)
+            
+            # 局所モランIで有意なクラスター（ホットスポット等）
+            significant = spatial_clusters[(spatial_clusters != "").any(axis=1)]
+            with st.expander("局所モランIのクラスター（HH: 高い割合の市町村が集まる地域）"):
+                if significant.empty:
+                    st.write("有意なクラスターはありません")
+                else:
+                    st.dataframe(significant)
+            
+            with st.expander("全設問の空間統計を見る"):
+                st.dataframe(get_all_spatial_statistics(df, dataset_version))
+        else:
+            st.info("空間統計を計算するのに十分なデータがありません")
+    
+    st.markdown("---")
+    
+    # --- 方言の似ている市町村（全設問のクラスタリング） ---
+    st.markdown('''
+    <div class="section-title">
+        <span class="icon">🧩</span>
+        方言の似ている市町村（全設問）
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    col_metric, col_clusters = st.columns([1, 1])
+    with col_metric:
+        metric_label = st.radio(
+            "距離の種類",
+            ["ジェンセン・シャノン距離", "コサイン距離"],
+            horizontal=True,
+        )
+    metric = "jensen_shannon" if metric_label == "ジェンセン・シャノン距離" else "cosine"
+    
+    distances, linkage = get_dialect_clusters(df, dataset_version, metric)
+    
+    if len(distances) >= 3:
+        with col_clusters:
+            n_clusters = st.slider(
+                "グループ数",
+                min_value=2,
+                max_value=min(8, len(distances)),
+                value=min(4, len(distances)),
+            )
+        
+        labels = cut_tree(linkage, n_clusters)
+        cluster_df = pd.DataFrame({
+            "市町村": distances.index,
+            "グループ": [f"グループ{label}" for label in labels],
+        })
+        
+        st.caption("12の設問すべての回答割合をもとに、言葉の使い方が似ている市町村をグループ分けしています。")
+        
+        col_map, col_tree = st.columns([1, 1])
+        with col_map:
+            geojson_data = get_geojson()
+            if geojson_data:
+                cluster_colors = {
+                    city: YAMAGATA_COLORS[(label - 1) % len(YAMAGATA_COLORS)]
+                    for city, label in zip(distances.index, labels)
+                }
+                cluster_labels = dict(zip(cluster_df["市町村"], cluster_df["グループ"]))
+                for feature in geojson_data["features"]:
+                    city_name = feature["properties"].get("N03_004")
+                    feature["properties"]["グループ"] = cluster_labels.get(city_name, "データなし")
+                
+                import folium
+                from streamlit_folium import st_folium
+
+                m_cluster = folium.Map(location=[38.45, 140.1], zoom_start=7, tiles="CartoDB dark_matter")
+                folium.GeoJson(
+                    data=geojson_data,
+                    name="方言グループ",
+                    style_function=lambda feature: {
+                        'fillColor': cluster_colors.get(feature['properties'].get('N03_004'), '#404050'),
+                        'color': '#ffffff',
+                        'weight': 1,
+                        'fillOpacity': 0.75,
+                    },
+                    tooltip=folium.GeoJsonTooltip(fields=['N03_004', 'グループ'], aliases=['市町村', 'グループ']),
+                ).add_to(m_cluster)
+                with stage("folium"):
+                    st_folium(m_cluster, width=None, height=550, key="cluster_map", returned_objects=[])
+                
+                legend_items = [
+                    f'<div class="legend-item"><div class="legend-color" style="background-color: '
+                    f'{YAMAGATA_COLORS[(k - 1) % len(YAMAGATA_COLORS)]};"></div><span>グループ{k}</span></div>'
+                    for k in range(1, n_clusters + 1)
+                ]
+                st.markdown('<div class="legend-container">' + ''.join(legend_items) + '</div>', unsafe_allow_html=True)
+            else:
+                st.dataframe(cluster_df, hide_index=True)
+        
+        with col_tree:
+            import plotly.graph_objects as go
+
+            order, segments = dendrogram_segments(linkage)
+            fig_tree = go.Figure()
+            for xs, ys in segments:
+                fig_tree.add_trace(go.Scatter(
+                    x=xs, y=ys, mode="lines",
+                    line=dict(color="#ff8fa3", width=1.5),
+                    hoverinfo="skip", showlegend=False,
+                ))
+            fig_tree.update_layout(
+                title="デンドログラム（群平均法）",
+                height=550,
+                margin=dict(t=50, b=120, l=40, r=10),
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="#f0f0f5"),
+                xaxis=dict(
+                    tickmode="array",
+                    tickvals=list(range(len(order))),
+                    ticktext=[distances.index[leaf] for leaf in order],
+                    tickangle=-90,
+                    fixedrange=True,
+                ),
+                yaxis=dict(title="距離", fixedrange=True),
+            )
+            show_plotly(fig_tree)
+    else:
+        st.info("グループ分けに十分な市町村のデータがありません")
+    
+    st.markdown("---")
+    
+    # --- 回答の推移 ---
+    st.markdown('''
+    <div class="section-title">
+        <span class="icon">⏱️</span>
+        回答の推移
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    if len(time_series) > 1:
+        import plotly.graph_objects as go
+
+        per_bucket = time_series.responses_per_bucket().sum(axis=1)
+        bursts = time_series.detect_bursts()
+        stabilization = time_series.stabilization(selected_question)
+        
+        col_volume, col_stable = st.columns([1, 1])
+        with col_volume:
+            fig_volume = go.Figure()
+            fig_volume.add_trace(go.Bar(
+                x=per_bucket.index, y=per_bucket.to_numpy(),
+                name="回答数", marker_color="#4ecdc4",
+            ))
+            total_bursts = bursts[bursts["市町村名"] == "全体"]
+            if not total_bursts.empty:
+                fig_volume.add_trace(go.Scatter(
+                    x=total_bursts["期間"], y=total_bursts["件数"],
+                    mode="markers", name="急増",
+                    marker=dict(color="#ffd166", size=12, symbol="triangle-down"),
+                ))
+            fig_volume.update_layout(
+                title="期間ごとの回答数",
+                height=350,
+                margin=dict(t=50, b=40, l=40, r=10),
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="#f0f0f5"),
+                legend=dict(orientation="h", y=-0.2),
+            )
+            show_plotly(fig_volume)
+        
+        with col_stable:
+            if not stabilization.empty:
+                fig_stable = go.Figure(go.Scatter(
+                    x=stabilization.index,
+                    y=stabilization["最終結果との一致率"],
+                    mode="lines",
+                    line=dict(color="#ff8fa3", width=2),
+                    customdata=stabilization["累積回答者数"],
+                    hovertemplate="%{x}<br>一致率: %{y:.0%}<br>累積回答者数: %{customdata}<extra></extra>",
+                ))
+                fig_stable.update_layout(
+                    title=f"「{QUESTION_LABELS[selected_question]}」の地図が落ち着くまで",
+                    height=350,
+                    margin=dict(t=50, b=40, l=40, r=10),
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font=dict(color="#f0f0f5"),
+                    yaxis=dict(title="最多回答が最終結果と同じ市町村の割合", tickformat=".0%", range=[0, 1.05]),
+                )
+                show_plotly(fig_stable)
+        
+        if not bursts.empty:
+            with st.expander(f"📈 回答数が急増した期間（{len(bursts)}件）"):
+                st.caption("直前の期間の中央値と比べて回答数が大きく増えた期間です。まとめて送信された回答の可能性があります。")
+                st.dataframe(bursts, hide_index=True, column_config={
+                    "基準": st.column_config.NumberColumn(format="%.1f"),
+                    "スコア": st.column_config.NumberColumn(format="%.1f"),
+                })
+        if time_series.undated:
+            st.caption(f"※タイムスタンプのない回答 {time_series.undated}件 は推移に含まれていません")
+    else:
+        st.info("回答日時のデータがないため、推移を表示できません")
+    
+    st.markdown("---")
+    
+    # --- 設問間の関連 ---
+    st.markdown('''
+    <div class="section-title">
+        <span class="icon">🔗</span>
+        設問間の関連（回答者単位）
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    associations = get_associations(df, dataset_version)
+    cramers_v = associations["cramers_v"]
+    
+    if len(cramers_v) >= 2:
+        import plotly.graph_objects as go
+
+        st.caption(
+            "同じ人がどの方言を一緒に使っているかを、設問のペアごとにクラメールの連関係数（0〜1）で表しています。"
+            "ペアを選ぶと回答の組み合わせを確認できます。"
+        )
+        
+        labels = [f"{key} {QUESTION_LABELS[key]}" for key in cramers_v.index]
+        fig_assoc = go.Figure(go.Heatmap(
+            z=cramers_v.to_numpy(),
+            x=labels,
+            y=labels,
+            zmin=0,
+            zmax=max(0.3, float(cramers_v.where(cramers_v < 1).max().max())),
+            colorscale=[[0, "#1a1a2e"], [0.5, "#e63946"], [1, "#ffd166"]],
+            customdata=associations["respondents"].to_numpy(),
+            hovertemplate="%{y} × %{x}<br>クラメールのV: %{z:.3f}<br>両方に回答: %{customdata}人<extra></extra>",
+        ))
+        fig_assoc.update_layout(
+            height=550,
+            margin=dict(t=20, b=120, l=160, r=20),
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            font=dict(color="#f0f0f5"),
+            xaxis=dict(tickangle=-45, fixedrange=True),
+            yaxis=dict(autorange="reversed", fixedrange=True),
+        )
+        show_plotly(fig_assoc)
+        
+        # 関連の強いペアの一覧
+        position = {key: k for k, key in enumerate(cramers_v.index)}
+        pairs = cramers_v.stack().rename("クラメールのV")
+        pairs = pairs[[position[a] < position[b] for a, b in pairs.index]].to_frame().join(
+            associations["mutual_info"].stack().rename("相互情報量（ビット）")
+        ).sort_values("クラメールのV", ascending=False)
+        pair_options = [f"{a} {QUESTION_LABELS[a]} × {b} {QUESTION_LABELS[b]}" for a, b in pairs.index]
+        
+        col_pair, col_top = st.columns([1, 1])
+        with col_top:
+            st.dataframe(
+                pairs.head(10).set_axis(pair_options[:10]).round(3),
+                use_container_width=True,
+            )
+        with col_pair:
+            selected_pair = st.selectbox("設問のペア（関連の強い順）", pair_options)
+            question_a, question_b = pairs.index[pair_options.index(selected_pair)]
+            table = contingency_table(associations, question_a, question_b)
+            if not table.empty:
+                residuals = standardized_residuals(table)
+                fig_pair = go.Figure(go.Heatmap(
+                    z=residuals.to_numpy(),
+                    x=list(table.columns),
+                    y=list(table.index),
+                    zmid=0,
+                    colorscale="RdBu_r",
+                    text=table.to_numpy(),
+                    texttemplate="%{text}",
+                    hovertemplate=(
+                        f"{QUESTION_LABELS[question_a]}: %{{y}}<br>{QUESTION_LABELS[question_b]}: %{{x}}"
+                        "<br>件数: %{text}<br>標準化残差: %{z:.2f}<extra></extra>"
+                    ),
+                ))
+                fig_pair.update_layout(
+                    height=400,
+                    margin=dict(t=20, b=80, l=100, r=20),
+                    paper_bgcolor="rgba(0,0,0,0)",
+                    plot_bgcolor="rgba(0,0,0,0)",
+                    font=dict(color="#f0f0f5"),
+                    xaxis=dict(title=QUESTION_LABELS[question_b], fixedrange=True),
+                    yaxis=dict(title=QUESTION_LABELS[question_a], autorange="reversed", fixedrange=True),
+                )
+                show_plotly(fig_pair)
+                st.caption("数字は回答の組み合わせの人数。赤いほど、偶然より多く一緒に使われている組み合わせです。")
+    else:
+        st.info("設問間の関連を計算するのに十分なデータがありません")
+    
+    st.markdown("---")
+    
     # --- 自由記入欄 ---
     st.markdown('''
     <div class="section-title">
@@ -1046,36 +1668,54 @@ def main():
     </div>
     ''', unsafe_allow_html=True)
     
-    if selected_municipality != "選択してください":
-        free_texts = get_free_text_by_municipality(df, selected_municipality)
+    free_text_index = get_free_text_index(free_text_df, dataset_version)
+    keyword = st.text_input("🔎 キーワードで検索", placeholder="例: もっけ").strip()
+    municipality_filter = selected_municipality if selected_municipality != "選択してください" else None
+    
+    if keyword or municipality_filter:
+        if keyword:
+            doc_ids = free_text_index.search(keyword, municipality_filter)
+            title = f"「{keyword}」を含む声" + (f"（{municipality_filter}）" if municipality_filter else "")
+        else:
+            doc_ids = free_text_index.municipality_ids(municipality_filter)
+            title = f"{municipality_filter}からの声"
         
-        if free_texts:
-            st.markdown(f"### {selected_municipality}からの声 ({len(free_texts)}件)")
-            for i, text in enumerate(free_texts, 1):
+        if len(doc_ids) > 0:
+            st.markdown(f"### {title} ({len(doc_ids)}件)")
+            
+            # ページ送り
+            page_count = math.ceil(len(doc_ids) / FREE_TEXT_PAGE_SIZE)
+            page = 1
+            if page_count > 1:
+                page = st.number_input(f"ページ（全{page_count}ページ）", min_value=1, max_value=page_count, value=1)
+            
+            start = (page - 1) * FREE_TEXT_PAGE_SIZE
+            for i, (municipality, text) in enumerate(
+                free_text_index.page(doc_ids, page, FREE_TEXT_PAGE_SIZE), start + 1
+            ):
+                location = "" if municipality_filter else f" 📍 {municipality}<br>"
                 st.markdown(f"""
                 <div class="free-text-card">
-                    <strong>#{i}</strong> {text}
+                    <strong>#{i}</strong>{location} {text}
                 </div>
                 """, unsafe_allow_html=True)
+        elif keyword:
+            st.info(f"「{keyword}」を含む自由記入はありません")
         else:
-            st.info(f"{selected_municipality}からの自由記入はありません")
+            st.info(f"{municipality_filter}からの自由記入はありません")
     else:
         # 全体からランダムに表示
         st.markdown("左のサイドバーで市町村を選択すると、その地域の声が表示されます。")
         
-        all_free_texts = df[["市町村名", "【自由記入欄】 面白い方言"]].dropna(subset=["【自由記入欄】 面白い方言"])
-        all_free_texts = all_free_texts[all_free_texts["【自由記入欄】 面白い方言"].str.strip() != ""]
-        
-        if not all_free_texts.empty:
+        samples = free_text_index.sample(5)
+        if samples:
             st.markdown("### 🎲 ピックアップ（全県から）")
-            sample_size = min(5, len(all_free_texts))
-            samples = all_free_texts.sample(sample_size)
             
-            for _, row in samples.iterrows():
+            for municipality, text in samples:
                 st.markdown(f"""
                 <div class="free-text-card">
-                    <strong>📍 {row['市町村名']}</strong><br>
-                    {row['【自由記入欄】 面白い方言']}
+                    <strong>📍 {municipality}</strong><br>
+                    {text}
                 </div>
                 """, unsafe_allow_html=True)
     
@@ -1406,6 +2046,9 @@ def main():
         🍒 山形県方言分布ダッシュボード | データ：Googleスプレッドシートより
     </div>
     """, unsafe_allow_html=True)
+    
+    if instrumentation.ENABLED:
+        show_diagnostics(run, df)
 
 
 if __name__ == "__main__":
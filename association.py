@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+設問間の回答の関連（クラメールの連関係数・相互情報量）
+
+回答者 × (設問, 回答) の 0/1 行列 X を作り、共起行列 XᵀX を1回の行列積で求める。
+XᵀX の (設問a, 設問b) のブロックがそのまま2設問の分割表になるため、
+設問ペアごとに pd.crosstab を呼ぶ必要はない。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 共起行列を計算するときに一度に密行列化する回答者数（メモリ使用量の上限）
+INCIDENCE_CHUNK_ROWS = 4096
+
+# これより回答者数の少ない回答は設問ごとに「その他」にまとめる（分割表の疎なセルによる過大評価を防ぐ）
+MIN_ANSWER_COUNT = 5
+
+OTHER_ANSWER = "その他"
+
+
+def _unique_keys(keys: np.ndarray) -> np.ndarray:
+    """整数キーの重複を除いて昇順に並べる（np.unique より速いソートと隣接比較のみで行う）"""
+    keys = np.sort(keys)
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+def build_incidence(answers: pd.DataFrame, min_count: int = MIN_ANSWER_COUNT) -> tuple:
+    """
+    縦持ちの回答から、回答者 × (設問, 回答) の疎な0/1行列（COO形式）を作る
+
+    Args:
+        answers: explode_answers / read_answers の結果
+            （response_id, question_key, municipality, answer）
+        min_count: これより回答者数の少ない回答は「その他」にまとめる
+
+    Returns:
+        (行インデックス, 列インデックス, 回答者数, 列の (設問, 回答) のMultiIndex) のタプル
+    """
+    if answers.empty:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0,
+                pd.MultiIndex.from_arrays([[], []], names=["設問", "回答"]))
+
+    # 文字列のまま重複除去・集計すると遅いため、先に設問・回答を別々に整数コードにする
+    rows, respondent_ids = pd.factorize(answers["response_id"], sort=True)
+    question_codes, questions = pd.factorize(answers["question_key"], sort=True)
+    answer_codes, answer_labels = pd.factorize(answers["answer"], sort=True)
+    n_rows, n_answers = len(respondent_ids), len(answer_labels)
+    codes, combined = pd.factorize(question_codes.astype(np.int64) * n_answers + answer_codes, sort=True)
+    n_features = len(combined)
+    rows, codes = np.divmod(_unique_keys(rows.astype(np.int64) * n_features + codes), n_features)
+
+    # 設問ごとに少数回答を「その他」にまとめる（回答者数は重複除去後に数える）
+    counts = np.bincount(codes, minlength=n_features)
+    feature_questions = np.asarray(questions, dtype=object)[combined // n_answers]
+    feature_answers = np.where(counts >= min_count, np.asarray(answer_labels, dtype=object)[combined % n_answers],
+                               OTHER_ANSWER)
+    columns = pd.MultiIndex.from_arrays([feature_questions, feature_answers], names=["設問", "回答"])
+    remap, merged = pd.factorize(columns.codes[0].astype(np.int64) * len(columns.levels[1]) + columns.codes[1],
+                                 sort=True)
+    columns = pd.MultiIndex.from_arrays(
+        [columns.levels[0][merged // len(columns.levels[1])], columns.levels[1][merged % len(columns.levels[1])]],
+        names=["設問", "回答"],
+    )
+    rows, cols = np.divmod(_unique_keys(rows * len(columns) + remap[codes]), len(columns))
+    return rows, cols, n_rows, columns
+
+
+def cooccurrence(rows: np.ndarray, cols: np.ndarray, n_rows: int, n_cols: int,
+                 chunk_rows: int = INCIDENCE_CHUNK_ROWS) -> np.ndarray:
+    """
+    疎な0/1行列 X について共起行列 XᵀX を計算する
+
+    回答者を chunk_rows 人ずつ密行列にして行列積を足し合わせる。
+
+    Args:
+        rows, cols: build_incidence の行・列インデックス（行の昇順）
+        n_rows, n_cols: 行列の形状
+
+    Returns:
+        形状 (n_cols, n_cols) の件数行列
+    """
+    result = np.zeros((n_cols, n_cols), dtype=np.float64)
+    bounds = np.searchsorted(rows, np.arange(0, n_rows + chunk_rows, chunk_rows))
+    for start, (lo, hi) in zip(range(0, n_rows, chunk_rows), zip(bounds[:-1], bounds[1:])):
+        block = np.zeros((min(chunk_rows, n_rows - start), n_cols), dtype=np.float32)
+        block[rows[lo:hi] - start, cols[lo:hi]] = 1.0
+        result += block.T @ block
+    return np.rint(result).astype(np.int64)
+
+
+def _pair_statistics(table: np.ndarray) -> tuple:
+    """
+    分割表からクラメールのV・相互情報量（ビット）・総数を求める
+
+    両方の設問に回答した人だけが分割表に入る。複数回答の人は回答の組の数だけ数える。
+    """
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    total = table.sum()
+    if total == 0 or min(table.shape) < 2:
+        return np.nan, np.nan, int(total)
+
+    p = table / total
+    row, col = p.sum(axis=1, keepdims=True), p.sum(axis=0, keepdims=True)
+    expected = row @ col
+    chi2 = total * ((p - expected) ** 2 / expected).sum()
+    cramers_v = np.sqrt(chi2 / (total * (min(table.shape) - 1)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mutual_info = np.where(p > 0, p * np.log2(p / expected), 0.0).sum()
+    return float(cramers_v), float(mutual_info), int(total)
+
+
+def compute_associations(answers: pd.DataFrame, min_count: int = MIN_ANSWER_COUNT) -> dict:
+    """
+    全設問ペアの関連の強さを計算する
+
+    Args:
+        answers: explode_answers / read_answers の結果
+        min_count: これより回答者数の少ない回答は「その他」にまとめる
+
+    Returns:
+        {"cramers_v": 設問 × 設問のDataFrame, "mutual_info": 同, "respondents": 同（両方に回答した人数）,
+         "cooccurrence": (設問, 回答) × (設問, 回答) の件数DataFrame} の辞書
+    """
+    rows, cols, n_rows, columns = build_incidence(answers, min_count)
+    counts = cooccurrence(rows, cols, n_rows, len(columns))
+
+    # 両方の設問に回答した人数は、回答者 × 設問の0/1行列の積で求める
+    question_of_column, questions = pd.factorize(columns.get_level_values(0), sort=True)
+    answered = _unique_keys(rows * len(questions) + question_of_column[cols])
+    respondents = cooccurrence(answered // len(questions), answered % len(questions), n_rows, len(questions))
+
+    k = len(questions)
+    cramers_v = np.full((k, k), np.nan)
+    mutual_info = np.full((k, k), np.nan)
+    blocks = [np.flatnonzero(question_of_column == q) for q in range(k)]
+    for a in range(k):
+        for b in range(a, k):
+            if a == b:
+                cramers_v[a, a] = 1.0
+                continue
+            v, mi, _ = _pair_statistics(counts[np.ix_(blocks[a], blocks[b])])
+            cramers_v[a, b] = cramers_v[b, a] = v
+            mutual_info[a, b] = mutual_info[b, a] = mi
+
+    questions = list(questions)
+    return {
+        "cramers_v": pd.DataFrame(cramers_v, index=questions, columns=questions),
+        "mutual_info": pd.DataFrame(mutual_info, index=questions, columns=questions),
+        "respondents": pd.DataFrame(respondents, index=questions, columns=questions),
+        "cooccurrence": pd.DataFrame(counts, index=columns, columns=columns),
+    }
+
+
+def contingency_table(associations: dict, question_a: str, question_b: str) -> pd.DataFrame:
+    """
+    2設問の分割表（compute_associations の共起行列から切り出す）
+
+    Returns:
+        行が設問aの回答、列が設問bの回答の件数DataFrame
+    """
+    counts = associations["cooccurrence"]
+    if question_a not in counts.index.get_level_values(0) or question_b not in counts.index.get_level_values(0):
+        return pd.DataFrame()
+    table = counts.loc[question_a, question_b]
+    table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+    table.index.name = question_a
+    table.columns.name = question_b
+    return table
+
+
+def standardized_residuals(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    分割表の標準化残差 (観測 - 期待) / √期待
+
+    正の値はその回答の組み合わせが独立の場合より多く現れることを示す。
+    """
+    observed = table.to_numpy(dtype=np.float64)
+    total = observed.sum()
+    if total == 0:
+        return table.astype(np.float64)
+    expected = observed.sum(axis=1, keepdims=True) @ observed.sum(axis=0, keepdims=True) / total
+    residuals = (observed - expected) / np.sqrt(expected)
+    return pd.DataFrame(residuals, index=table.index, columns=table.columns)
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+方言アンケートの一括分析（オフライン・定期実行用）
+
+保存したCSV（スプレッドシートのエクスポート）または回答ストアのスナップショット（SQLite）から、
+12の設問すべての回答分布・市町村別のクロス集計・地図の表示データを求め、CSV・JSON・HTMLのレポート一式を書き出す。
+設問ごとの集計は複数のワーカープロセスで並行して行う。ネットワークには接続しない。
+
+    python batch_report.py --csv responses.csv --output report
+    python batch_report.py --snapshot hougen.sqlite3 --output report --workers 4
+
+出力:
+    summary.json                全体の件数と設問ごとの概要
+    report.json                 設問ごとの回答分布と市町村ごとの最多回答
+    index.html                  上の内容の表（ブラウザで開くだけで見られる）
+    responses_by_*.csv          市町村別・地域別・都道府県別・全国の市区町村別の回答者数
+    resolution_rules.csv        名寄せの規則ごとの件数（名寄せ規則を保存していない古い回答ストアでは出力しない）
+    unmatched_locations.csv     県外/不明になった住所テキストの上位（同上）
+    questions/<設問>_*.csv      回答分布・市町村 × 回答のクロス集計・最多回答・割合の信用区間
+    questions/<設問>_map.geojson 塗り色とポップアップを注入した市町村ポリゴン（境界データがあるとき）
+"""
+
+import argparse
+import html
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from adjacency import GEOJSON_FILE
+from data_processor import (
+    QUESTION_COLUMNS,
+    QUESTION_LABELS,
+    PLACE_COLUMN,
+    PREFECTURE_COLUMN,
+    RULE_COLUMN,
+    get_dataset_version,
+    get_municipality_distribution,
+    get_question_distribution,
+    load_csv_file,
+    resolution_summary,
+    unmatched_locations,
+)
+from map_view import build_color_map, build_map_features, build_map_table
+from share_intervals import compute_share_intervals
+
+# CSVのエンコーディング（Excelでそのまま開けるようBOM付き）
+CSV_ENCODING = "utf-8-sig"
+
+# HTMLレポートに載せる回答の数（設問ごと）
+HTML_TOP_ANSWERS = 10
+
+# 県外/不明になった住所テキストを書き出す件数
+UNMATCHED_TOP = 100
+
+# 設問ごとのファイルを置くディレクトリ
+QUESTIONS_DIR = "questions"
+
+# レポートの出力先に置くファイル（responses_by_*.csv を除く）
+REPORT_ENTRIES = frozenset({
+    "summary.json", "report.json", "index.html", "resolution_rules.csv", "unmatched_locations.csv", QUESTIONS_DIR,
+})
+
+# ワーカープロセスごとに1回だけ読み込む境界データ
+_geojson = None
+
+
+def load_source(csv_path: str = None, snapshot_path: str = None, exclude_duplicates: bool = True) -> tuple:
+    """
+    回答を読み込む
+
+    Args:
+        csv_path: 保存したCSVのパス
+        snapshot_path: 回答ストア（SQLite）のパス（指定した場合はこちらを使う）
+        exclude_duplicates: 重複・機械的な送信と判定した行を除外するか（CSVのみ）
+
+    Returns:
+        (回答者のDataFrame, 設問の集計元) のタプル。
+        集計元はCSVなら設問カラムを含むDataFrame、スナップショットならデータベースのパス。
+    """
+    if snapshot_path:
+        from response_store import read_responses
+
+        df, _ = read_responses(snapshot_path)
+        return df, snapshot_path
+    df = load_csv_file(csv_path, exclude_duplicates=exclude_duplicates)
+    return df, df
+
+
+def question_tables(source, question_key: str) -> tuple:
+    """
+    設問の回答分布と市町村 × 回答のクロス集計
+
+    Args:
+        source: 設問カラムを含むDataFrame、または回答ストアのパス
+        question_key: 設問キー
+
+    Returns:
+        (回答分布, クロス集計) のタプル
+    """
+    if isinstance(source, str):
+        from response_store import query_municipality_distribution, query_question_distribution
+
+        return query_question_distribution(source, question_key), query_municipality_distribution(source, question_key)
+    return get_question_distribution(source, question_key), get_municipality_distribution(source, question_key)
+
+
+def _records(df: pd.DataFrame) -> list:
+    """DataFrameをJSONに書き出せる dict のリストにする（NumPyの数値型を含まない）"""
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def _init_worker(geojson_path: str):
+    global _geojson
+    if geojson_path and os.path.exists(geojson_path):
+        with open(geojson_path, "r", encoding="utf-8") as f:
+            _geojson = json.load(f)
+
+
+def analyze_question(question_key: str, source, directory: str) -> dict:
+    """
+    1つの設問を集計し、設問ごとのファイルを書き出す（ワーカープロセスで実行）
+
+    Args:
+        question_key: 設問キー
+        source: 設問カラムと市町村名を含むDataFrame、または回答ストアのパス
+        directory: 設問ごとのファイルの書き出し先
+
+    Returns:
+        レポートに載せる集計結果（回答分布と市町村ごとの最多回答）の dict
+    """
+    distribution, cross_tab = question_tables(source, question_key)
+    if "件数" not in distribution:
+        distribution = pd.DataFrame(columns=["回答", "件数"])
+    prefix = os.path.join(directory, question_key)
+    distribution.to_csv(f"{prefix}_distribution.csv", index=False, encoding=CSV_ENCODING)
+
+    result = {
+        "question": question_key,
+        "label": QUESTION_LABELS[question_key],
+        "answers": int(distribution["件数"].sum()),
+        "distinct_answers": len(distribution),
+        "distribution": _records(distribution),
+        "municipalities": [],
+    }
+    if cross_tab.empty:
+        return result
+
+    cross_tab.to_csv(f"{prefix}_crosstab.csv", encoding=CSV_ENCODING)
+    _, intervals = compute_share_intervals({question_key: cross_tab})
+    map_table = build_map_table(cross_tab)
+    if not intervals.empty:
+        intervals = intervals.drop(columns="設問").set_index("市町村名")
+        intervals.to_csv(f"{prefix}_intervals.csv", encoding=CSV_ENCODING)
+    map_table.to_csv(f"{prefix}_map.csv", index=False, encoding=CSV_ENCODING)
+    result["municipalities"] = _records(map_table)
+
+    if _geojson is not None:
+        color_map = build_color_map(distribution["回答"].tolist())
+        features = build_map_features(_geojson, cross_tab, map_table, color_map, intervals)
+        with open(f"{prefix}_map.geojson", "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False)
+    return result
+
+
+def analyze_all(df: pd.DataFrame, source, directory: str, workers: int, geojson_path: str) -> list:
+    """
+    全設問を並行して集計する
+
+    CSVから読み込んだ場合、各ワーカーには設問カラムと市町村名だけを渡す。
+
+    Args:
+        df: 回答者のDataFrame
+        source: load_source が返す集計元
+        directory: 設問ごとのファイルの書き出し先
+        workers: ワーカープロセス数（1ならこのプロセスで順に集計する）
+        geojson_path: 境界データのパス
+
+    Returns:
+        設問ごとの集計結果のリスト（QUESTION_COLUMNS の順）
+    """
+    def payload(question_key):
+        if isinstance(source, str):
+            return source
+        columns = [column for column in ("市町村名", QUESTION_COLUMNS[question_key]) if column in df.columns]
+        return df[columns]
+
+    if workers <= 1:
+        _init_worker(geojson_path)
+        return [analyze_question(key, payload(key), directory) for key in QUESTION_COLUMNS]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(geojson_path,)) as executor:
+        futures = [executor.submit(analyze_question, key, payload(key), directory) for key in QUESTION_COLUMNS]
+        return [future.result() for future in futures]
+
+
+def _count_table(values: pd.Series, name: str) -> pd.DataFrame:
+    counts = values.value_counts()
+    return pd.DataFrame({name: counts.index.astype(str), "回答者数": counts.to_numpy()})
+
+
+def render_html(summary: dict, results: list) -> str:
+    """
+    集計結果を1つのHTMLにする（外部のCSS・スクリプトを読み込まない）
+
+    Args:
+        summary: summary.json の内容
+        results: 設問ごとの集計結果
+
+    Returns:
+        HTML文字列
+    """
+    escape = html.escape
+    sections = []
+    for result in results:
+        rows = []
+        total = result["answers"] or 1
+        for item in result["distribution"][:HTML_TOP_ANSWERS]:
+            share = item["件数"] / total
+            rows.append(
+                f"<tr><td>{escape(str(item['回答']))}</td><td class='num'>{item['件数']}</td>"
+                f"<td class='bar'><span style='width:{share:.1%}'></span>{share:.1%}</td></tr>"
+            )
+        municipalities = pd.DataFrame(result["municipalities"])
+        if not municipalities.empty:
+            municipalities = municipalities[["市町村", "最も多い方言", "割合", "総回答数", "上位回答"]]
+        sections.append(
+            f"<section><h2>{escape(result['question'])} {escape(result['label'])}</h2>"
+            f"<p>回答 {result['answers']}件・{result['distinct_answers']}種類</p>"
+            "<table><tr><th>回答</th><th>件数</th><th>割合</th></tr>" + "".join(rows) + "</table>"
+            + (municipalities.to_html(index=False, border=0) if not municipalities.empty else "")
+            + "</section>"
+        )
+
+    return f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>山形県方言アンケート 分析レポート</title>
+<style>
+body {{ font-family: sans-serif; margin: 2rem; color: #222; }}
+table {{ border-collapse: collapse; margin: 0.5rem 0 1.5rem; font-size: 0.9rem; }}
+th, td {{ border-bottom: 1px solid #ddd; padding: 0.25rem 0.75rem; text-align: left; }}
+td.num {{ text-align: right; }}
+td.bar {{ min-width: 12rem; }}
+td.bar span {{ display: inline-block; height: 0.8rem; margin-right: 0.5rem; background: #E95464; }}
+</style>
+</head>
+<body>
+<h1>山形県方言アンケート 分析レポート</h1>
+<p>作成日時 {escape(summary['generated_at'])}・回答者 {summary['respondents']}人
+（県内 {summary['in_prefecture']}人・{summary['municipalities_with_responses']}市町村）・
+データの版 {escape(summary['dataset_version'])}</p>
+{"".join(sections)}
+</body>
+</html>
+"""
+
+
+def _is_report_dir(path: str) -> bool:
+    """以前にこのツールが書き出したレポートのディレクトリか（summary.json と index.html があり、ほかのファイルがない）"""
+    if not os.path.isdir(path):
+        return False
+    entries = os.listdir(path)
+    return {"summary.json", "index.html"} <= set(entries) and all(
+        entry in REPORT_ENTRIES or (entry.startswith("responses_by_") and entry.endswith(".csv"))
+        for entry in entries
+    )
+
+
+def check_output(output: str) -> None:
+    """
+    出力先を上書きしてよいか確かめる
+
+    Raises:
+        FileExistsError: 出力先がすでにあり、このツールの書き出したレポートでないとき
+    """
+    if os.path.lexists(output) and not _is_report_dir(output):
+        raise FileExistsError(f"{output} はこのツールの書き出したレポートではないため上書きしません")
+
+
+def write_report(output: str, df: pd.DataFrame, source, source_path: str, workers: int, geojson_path: str) -> dict:
+    """
+    レポート一式を書き出す
+
+    一時ディレクトリに書いてから置き換えるため、定期実行中に読まれても書きかけのレポートは見えない。
+    前回のレポートは脇に移してから置き換え、置き換えが済んでから削除する。
+
+    Returns:
+        summary.json の内容
+
+    Raises:
+        FileExistsError: 出力先がこのツールの書き出したレポートでないとき
+    """
+    check_output(output)
+    tmp_dir = f"{output.rstrip(os.sep)}.{os.getpid()}.tmp"
+    questions_dir = os.path.join(tmp_dir, QUESTIONS_DIR)
+    os.makedirs(questions_dir)
+    try:
+        started = time.perf_counter()
+        results = analyze_all(df, source, questions_dir, workers, geojson_path)
+        analysis_seconds = time.perf_counter() - started
+
+        in_prefecture = df[df["市町村名"] != "県外/不明"]
+        summary = {
+            "generated_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "source": os.path.abspath(source_path),
+            "source_type": "snapshot" if isinstance(source, str) else "csv",
+            "dataset_version": get_dataset_version(df),
+            "respondents": len(df),
+            "in_prefecture": len(in_prefecture),
+            "municipalities_with_responses": int(in_prefecture["市町村名"].nunique()),
+            "analysis_seconds": analysis_seconds,
+            "questions": {
+                result["question"]: {
+                    "label": result["label"],
+                    "answers": result["answers"],
+                    "distinct_answers": result["distinct_answers"],
+                    "top_answer": result["distribution"][0]["回答"] if result["distribution"] else None,
+                    "municipalities": len(result["municipalities"]),
+                }
+                for result in results
+            },
+        }
+
+        _count_table(df["市町村名"], "市町村名").to_csv(
+            os.path.join(tmp_dir, "responses_by_municipality.csv"), index=False, encoding=CSV_ENCODING
+        )
+        if "地域" in df.columns:
+            _count_table(df["地域"], "地域").to_csv(
+                os.path.join(tmp_dir, "responses_by_region.csv"), index=False, encoding=CSV_ENCODING
+            )
+        if PREFECTURE_COLUMN in df.columns:
+            # 全国の都道府県・市区町村ごとの回答者数（都道府県の分からない回答は空欄）
+            places = df[PREFECTURE_COLUMN].astype(str) + df[PLACE_COLUMN].astype(str)
+            _count_table(df[PREFECTURE_COLUMN], PREFECTURE_COLUMN).to_csv(
+                os.path.join(tmp_dir, "responses_by_prefecture.csv"), index=False, encoding=CSV_ENCODING
+            )
+            _count_table(places, f"{PREFECTURE_COLUMN}{PLACE_COLUMN}").to_csv(
+                os.path.join(tmp_dir, "responses_by_place.csv"), index=False, encoding=CSV_ENCODING
+            )
+        if RULE_COLUMN in df.columns:
+            # 名寄せの規則ごとの件数と、県外/不明になった住所テキスト（辞書の調整用）
+            resolution = resolution_summary(df)
+            summary["resolution"] = resolution.to_dict("records")
+            resolution.to_csv(os.path.join(tmp_dir, "resolution_rules.csv"), index=False, encoding=CSV_ENCODING)
+            unmatched_locations(df, top=UNMATCHED_TOP).to_csv(
+                os.path.join(tmp_dir, "unmatched_locations.csv"), index=False, encoding=CSV_ENCODING
+            )
+        with open(os.path.join(tmp_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(tmp_dir, "report.json"), "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "questions": results}, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(tmp_dir, "index.html"), "w", encoding="utf-8") as f:
+            f.write(render_html(summary, results))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    old_dir = None
+    if os.path.lexists(output):
+        old_dir = f"{output.rstrip(os.sep)}.{os.getpid()}.old"
+        os.replace(output, old_dir)
+    try:
+        os.replace(tmp_dir, output)
+    except BaseException:
+        if old_dir:
+            os.replace(old_dir, output)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全設問を集計してレポート一式を書き出す（オフライン）")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="保存したCSV（スプレッドシートのエクスポート）")
+    source.add_argument("--snapshot", help="回答ストア（SQLite）のスナップショット")
+    parser.add_argument("--output", default="report", help="レポートの書き出し先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数")
+    parser.add_argument("--geojson", default=GEOJSON_FILE, help="市町村境界のGeoJSON（なければ地図のファイルを省く）")
+    parser.add_argument("--include-duplicates", action="store_true", help="重複・機械的な送信と判定した行も集計する（CSVのみ）")
+    args = parser.parse_args()
+
+    source_path = args.snapshot or args.csv
+    if not os.path.exists(source_path):
+        print(f"{source_path} が見つかりません", file=sys.stderr)
+        return 1
+    try:
+        check_output(args.output)
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    df, source = load_source(args.csv, args.snapshot, exclude_duplicates=not args.include_duplicates)
+    print(f"読み込み: {len(df)}件 ({time.perf_counter() - started:.2f}s)")
+    if not os.path.exists(args.geojson):
+        print(f"{args.geojson} がないため地図のファイルは省略します")
+
+    summary = write_report(args.output, df, source, source_path, args.workers, args.geojson)
+    print(f"集計: {len(summary['questions'])}設問 ({summary['analysis_seconds']:.2f}s, {args.workers}プロセス)")
+    print(f"レポートを {args.output} に書き出しました ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+データ処理のベンチマーク
+
+synthetic_survey.py の合成データをローカルのHTTPサーバーから配信し、
+本番と同じ経路（ストリーミング読み込み → 名寄せ → 正規化）で各段階の処理時間とメモリを測る。
+結果はJSONに書き出し、--compare で以前の結果と比べられる。
+
+    python benchmark.py --rows 1k 100k --output bench.json
+    python benchmark.py --rows 100k --compare bench.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+import tracemalloc
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+from data_processor import load_data, get_question_distribution, get_municipality_distribution
+from municipalities import extract_municipality
+from synthetic_survey import SIZES, parse_size, write_survey
+
+# 以前の結果からこの比率以上遅くなった段階を悪化として表示する
+REGRESSION_RATIO = 1.2
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """
+    ディレクトリをHTTPで配信するスレッド（スプレッドシートのCSVエクスポートの代わり）
+
+    Args:
+        directory: 配信するディレクトリ
+    """
+
+    def __init__(self, directory: str):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/{os.path.basename(path)}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _clear_caches():
+    """測定ごとにキャッシュを空にして、毎回初回と同じ処理をさせる"""
+    data_processor.canonicalize_token.cache_clear()
+    for func in (get_question_distribution, get_municipality_distribution, data_processor.get_normalized_answers):
+        func.clear()
+
+
+def _measure(func, repeat: int) -> dict:
+    """
+    処理時間（repeat 回）とピークメモリ（tracemalloc で別に1回）を測る
+
+    tracemalloc を有効にすると処理が遅くなるため、時間の測定とは分けて実行する。
+    """
+    seconds = []
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+
+    _clear_caches()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def _map_view_model(map_dist: pd.DataFrame, question_dist: pd.DataFrame, question_key: str, geojson: dict):
+    """地図の表示データ（app.main と同じ組み立て）"""
+    from map_view import build_color_map, build_map_table, build_map_features
+    from share_intervals import compute_share_intervals
+
+    df_map_viz = build_map_table(map_dist)
+    base_color_map = build_color_map(question_dist["回答"].tolist())
+    _, intervals = compute_share_intervals({question_key: map_dist})
+    if not intervals.empty:
+        intervals = intervals.set_index("市町村名")
+    return build_map_features(geojson, map_dist, df_map_viz, base_color_map, intervals)
+
+
+def run_benchmark(path: str, url: str, question_key: str, repeat: int) -> list:
+    """
+    1つのデータセットについて各段階を測る
+
+    Returns:
+        段階ごとの結果（dict）のリスト
+    """
+    results = []
+
+    def record(stage, func):
+        result = _measure(func, repeat)
+        results.append({"stage": stage, **result})
+        print(f"  {stage:<32} {result['median']:9.3f}s  peak {result['peak_mb']:8.1f} MB")
+
+    record("load_data", lambda: load_data(url))
+    df = load_data(url)
+
+    raw = pd.read_csv(path, usecols=["現在お住まいの場所", "ルーツ"], dtype=str)
+    locations = np.concatenate([raw["現在お住まいの場所"].to_numpy(), raw["ルーツ"].to_numpy()])
+    record("extract_municipality", lambda: [extract_municipality(text) for text in locations])
+
+    record("get_question_distribution", lambda: get_question_distribution(df, question_key))
+    record("get_municipality_distribution", lambda: get_municipality_distribution(df, question_key))
+
+    from adjacency import GEOJSON_FILE
+    if not os.path.exists(GEOJSON_FILE):
+        print(f"  map_view_model: {GEOJSON_FILE} がないため省略します（merge_geojson.py で作成）")
+        return results
+    _clear_caches()
+    map_dist = get_municipality_distribution(df, question_key)
+    question_dist = get_question_distribution(df, question_key)
+    # GeoJSON の読み込みは測定に含めない（ダッシュボードでは1回だけ）
+    with open(GEOJSON_FILE, "r", encoding="utf-8") as f:
+        geojson = json.load(f)
+    record("map_view_model", lambda: _map_view_model(map_dist, question_dist, question_key, geojson))
+    return results
+
+
+def compare(results: dict, baseline_path: str):
+    """以前の結果と中央値を比べて表示する"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    print(f"\n{baseline_path} との比較（中央値）")
+    for result in results["results"]:
+        old = previous.get((result["rows"], result["stage"]))
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] > 0 else float("inf")
+        mark = "  ← 悪化" if ratio >= REGRESSION_RATIO else ""
+        print(f"  {result['rows']:>8} {result['stage']:<32} {old['median']:9.3f}s → {result['median']:9.3f}s"
+              f" ({ratio:.2f}x){mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="データ処理の各段階の処理時間とメモリを測る")
+    parser.add_argument("--rows", nargs="+", default=list(SIZES), help="行数（1k / 100k / 1m または整数）")
+    parser.add_argument("--question", default="Q2", help="分布を測る設問キー")
+    parser.add_argument("--repeat", type=int, default=3, help="時間を測る回数")
+    parser.add_argument("--data-dir", default="bench_data", help="合成データの保存先")
+    parser.add_argument("--output", default="benchmark_results.json", help="結果のJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果のJSONファイル")
+    args = parser.parse_args()
+
+    results = {
+        "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "question": args.question,
+        "repeat": args.repeat,
+        "results": [],
+    }
+
+    paths = [write_survey(parse_size(size), args.data_dir) for size in args.rows]
+    with LocalServer(args.data_dir) as server:
+        for size, path in zip(args.rows, paths):
+            n_rows = parse_size(size)
+            print(f"{n_rows}行 ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+            for result in run_benchmark(path, server.url(path), args.question, args.repeat):
+                results["results"].append({"rows": n_rows, **result})
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を {args.output} に書き出しました")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,47 @@
 Googleスプレッドシートからのデータ読み込みと前処理
 """
 
+import contextvars
+import copy
+import functools
+import io
+import itertools
+import json
+import sys
+import time
+import unicodedata
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-import requests
-import streamlit as st
-from io import StringIO
-from municipalities import extract_municipality, get_coordinates, get_region
+from municipalities import (
+    HOME_PREFECTURE,
+    RESOLUTION_RULES,
+    RULE_POINT,
+    RULE_ROOTS,
+    get_coordinates,
+    get_region,
+    resolve_location,
+    resolve_place,
+)
+from instrumentation import stage, timed, cache_miss, iter_stage, nbytes
 
 # Googleスプレッドシートの公開CSVエクスポートURL
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1ObFXkVmc_4AFsbAKKmzh14Uy6Zks_tF06Pspa8x0Ftk/export?format=csv"
 
+# 読み込むシートの一覧（地域別・調査回ごとにシートを分ける場合はここに追加）
+SPREADSHEET_URLS = {
+    "メイン": SPREADSHEET_URL,
+}
+
+# 複数シート読み込み時の取得元カラム
+SOURCE_COLUMN = "ソース"
+
+# 重複・機械的な送信の判定結果カラム（dedup.flag_duplicates が追加する）
+DUPLICATE_COLUMN = "重複判定"
+
 # 設問カラムの定義
 QUESTION_COLUMNS = {
     "Q1": "Q1.語尾につける言葉",
@@ -28,6 +60,59 @@ QUESTION_COLUMNS = {
     "Q12": "Q12.「かきまぜる」を方言で言うと？",
 }
 
+# 自由記入欄カラム
+FREE_TEXT_COLUMN = "【自由記入欄】 面白い方言"
+
+# Googleフォームの回答日時カラム（読み込み時に日時型に変換する）
+TIMESTAMP_COLUMN = "タイムスタンプ"
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+# 表記ゆれの統合ルール（variant_discovery.py で承認した統合、{設問キー: {表記: 代表表記}}）
+NORMALIZATION_RULES_FILE = "normalization_rules.json"
+_normalization_rules = None
+
+# 表記の統一（NFKC の後に適用する）: カタカナ→ひらがな、波ダッシュ・チルダ→長音
+_CANONICAL_TABLE = str.maketrans({
+    **{chr(code): chr(code - 0x60) for code in range(ord("ァ"), ord("ヶ") + 1)},
+    "〜": "ー", "～": "ー", "~": "ー",
+})
+
+# 小書きの母音を長音とみなす、直前のかなの段（のぉ → のー、にゃぁ → にゃー）
+_KANA_VOWELS = {
+    "ぁ": "あかさたなはまやらわがざだばぱぁゃゎ",
+    "ぃ": "いきしちにひみりぎじぢびぴぃ",
+    "ぅ": "うくすつぬふむゆるぐずづぶぷぅゅゔ",
+    "ぇ": "えけせてねへめれげぜでべぺぇ",
+    "ぉ": "おこそとのほもよろをごぞどぼぽぉょ",
+}
+
+# 表記の統一結果を保持するユニークな表記の数
+CANONICAL_CACHE_SIZE = 1 << 16
+
+# 読み込み時に保持するカラム（これ以外は読み込み時点で捨てる）
+LOCATION_COLUMNS = ["現在お住まいの場所", "ルーツ"]
+
+# 名寄せで使った規則のカラム（municipalities.RULE_* の整数コード、「ルーツ」から判定した行は RULE_ROOTS を足す）
+RULE_COLUMN = "名寄せ規則"
+
+# 全国の都道府県・市区町村・団体コードのカラム（市町村名は対象県の市町村か「県外/不明」、こちらは全国で残す）
+PREFECTURE_COLUMN = "都道府県"
+PLACE_COLUMN = "市区町村"
+PLACE_CODE_COLUMN = "市区町村コード"
+PLACE_COLUMNS = [PREFECTURE_COLUMN, PLACE_COLUMN, PLACE_CODE_COLUMN]
+
+# 回答地点の座標（GPS・地図のクリック位置）のカラム（緯度, 経度）。あれば境界ポリゴンで市町村を求める
+POINT_COLUMNS = ["回答地点の緯度", "回答地点の経度"]
+
+KEEP_COLUMNS = (
+    set(QUESTION_COLUMNS.values()) | set(LOCATION_COLUMNS) | set(POINT_COLUMNS)
+    | {FREE_TEXT_COLUMN, TIMESTAMP_COLUMN}
+)
+
+# ストリーミング読み込みの単位
+STREAM_BYTES = 64 * 1024
+CHUNK_ROWS = 5000
+
 # 設問の簡易ラベル（UI表示用）
 QUESTION_LABELS = {
     "Q1": "語尾につける言葉",
@@ -45,57 +130,296 @@ QUESTION_LABELS = {
 }
 
 
-def load_data(url: str = SPREADSHEET_URL) -> pd.DataFrame:
+def _resolve_column(values: pd.Series) -> tuple:
+    """
+    住所テキストのカラムを名寄せする（ユニークな値ごとに resolve_location・resolve_place を呼ぶ）
+
+    Returns:
+        (市町村名の配列, 規則のコードの配列, 全国の [都道府県, 市区町村, 団体コード] の配列（行 × 3）) のタプル
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    # 欠損値（コード -1）は末尾に足した空欄の結果を引く
+    uniques = [*uniques, None]
+    names = np.array([resolve_location(value)[0] for value in uniques], dtype=object)
+    places = [resolve_place(value) for value in uniques]
+    rules = np.array([rule for *_, rule in places], dtype=np.int8)
+    places = np.array([place[:3] for place in places], dtype=object)
+    return names[codes], rules[codes], places[codes]
+
+
+def _resolve_locations(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    市町村名の名寄せと、緯度経度・地域の付与を行う
+
+    Args:
+        df: スプレッドシートから読み込んだ生のDataFrame
+
+    Returns:
+        市町村名・名寄せ規則・都道府県・市区町村・市区町村コード・緯度・経度・地域カラムを追加したDataFrame
+        （緯度・経度は市町村の代表点、他の都道府県は市区町村辞書の代表点。地域は他の都道府県なら都道府県名）
+    """
+    # カラム名の確認
+    if "現在お住まいの場所" not in df.columns:
+        # カラム名をデバッグ出力
+        print(f"利用可能なカラム: {list(df.columns)}")
+        raise KeyError("'現在お住まいの場所' カラムが見つかりません")
+
+    # 市町村名の名寄せ（ユニークな住所テキストごとに1回だけ照合する）
+    # 1. 現在の居住地から判定し、2. 県外/不明ならルーツから判定する（Fallback）
+    municipality, rule, places = _resolve_column(df["現在お住まいの場所"])
+    if "ルーツ" in df.columns:
+        roots_municipality, roots_rule, roots_places = _resolve_column(df["ルーツ"])
+        use_roots = (municipality == "県外/不明") & (roots_municipality != "県外/不明")
+        municipality = np.where(use_roots, roots_municipality, municipality)
+        rule = np.where(use_roots, roots_rule + RULE_ROOTS, rule)
+        places = np.where(use_roots[:, None], roots_places, places)
+    df["市町村名"] = municipality
+    df[RULE_COLUMN] = rule.astype(np.int8)
+    for i, col in enumerate(PLACE_COLUMNS):
+        df[col] = places[:, i]
+
+    # 回答地点の座標があれば、境界ポリゴンに含まれる対象県の市町村を住所テキストより優先する
+    if all(col in df.columns for col in POINT_COLUMNS):
+        from point_geocoder import load_point_geocoder
+
+        geocoder = load_point_geocoder()
+        if geocoder is not None:
+            lats, lons = (pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) for col in POINT_COLUMNS)
+            numbers = geocoder.locate(lons, lats)
+            located = numbers >= 0
+            found = numbers[located]
+            df.loc[located, PREFECTURE_COLUMN] = geocoder.prefectures[found]
+            df.loc[located, PLACE_COLUMN] = geocoder.names[found]
+            df.loc[located, PLACE_CODE_COLUMN] = geocoder.codes[found]
+            located[located] = geocoder.prefectures[found] == HOME_PREFECTURE
+            df.loc[located, "市町村名"] = geocoder.names[numbers[located]]
+            df.loc[located, RULE_COLUMN] = RULE_POINT
+
+    # 緯度経度・地域の追加（市町村名・都道府県・市区町村の組ごとに1回だけ求める）
+    # 対象県の市町村は市町村名、それ以外は都道府県・市区町村で引く
+    prefecture = df[PREFECTURE_COLUMN].where(df["市町村名"] == "県外/不明", HOME_PREFECTURE)
+    place = df[PLACE_COLUMN].where(df["市町村名"] == "県外/不明", df["市町村名"])
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([prefecture, place]))
+    coordinates = np.array(
+        [get_coordinates(name, pref) for pref, name in uniques] or np.empty((0, 2)), dtype=float
+    ).reshape(-1, 2)
+    regions = np.array([get_region(name, pref) for pref, name in uniques], dtype=object)
+    df["緯度"] = coordinates[codes, 0]
+    df["経度"] = coordinates[codes, 1]
+    df["地域"] = regions[codes]
+
+    return df
+
+
+def resolution_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    名寄せの規則ごとの件数（どの規則で市町村名・県外/不明が決まったか）
+
+    Args:
+        df: 前処理済みDataFrame（名寄せ規則カラムを持つ）
+
+    Returns:
+        判定に使ったカラム, 規則, 件数, 割合 のDataFrame（件数の降順）
+    """
+    columns = ["判定に使ったカラム", "規則", "件数", "割合"]
+    if RULE_COLUMN not in df.columns or df.empty:
+        return pd.DataFrame(columns=columns)
+    counts = df[RULE_COLUMN].value_counts()
+    codes = counts.index.to_numpy(dtype=np.int64)
+    source = np.where(codes & RULE_ROOTS, "ルーツ", LOCATION_COLUMNS[0])
+    source = np.where(codes == RULE_POINT, POINT_COLUMNS[0].replace("の緯度", ""), source)
+    return pd.DataFrame({
+        "判定に使ったカラム": source,
+        "規則": [RESOLUTION_RULES[code & ~RULE_ROOTS] for code in codes],
+        "件数": counts.to_numpy(),
+        "割合": counts.to_numpy() / len(df),
+    }, columns=columns)
+
+
+def unmatched_locations(df: pd.DataFrame, top: int = 20, column: str = LOCATION_COLUMNS[0]) -> pd.DataFrame:
+    """
+    県外/不明になった回答の住所テキストを件数の多い順に並べる（辞書の調整用）
+
+    件数はユニークな住所テキストごとの value_counts で数え、規則は住所テキストごとに1回だけ求める。
+
+    Args:
+        df: 前処理済みDataFrame
+        top: 返す件数
+        column: 住所テキストのカラム
+
+    Returns:
+        住所テキスト, 件数, 規則 のDataFrame
+    """
+    columns = ["住所テキスト", "件数", "規則"]
+    if column not in df.columns or df.empty:
+        return pd.DataFrame(columns=columns)
+    texts = df.loc[df["市町村名"] == "県外/不明", column]
+    counts = texts.astype(object).fillna("").astype(str).str.strip().value_counts().head(top)
+    return pd.DataFrame({
+        "住所テキスト": counts.index,
+        "件数": counts.to_numpy(),
+        "規則": [RESOLUTION_RULES[resolve_location(text)[1]] for text in counts.index],
+    }, columns=columns)
+
+
+class _ResponseStream(io.RawIOBase):
+    """
+    HTTPレスポンスのチャンク列を、read_csv が読めるファイルオブジェクトとして見せる
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _keep_column(column: str) -> bool:
+    """読み込み時に保持するカラムかどうか（設問・所在地・自由記入欄・タイムスタンプのみ）"""
+    return column in KEEP_COLUMNS
+
+
+def _parse_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    タイムスタンプを日時型に変換する（解釈できない値は NaT）
+
+    時系列の集計で毎回文字列を解析しないよう、読み込み時に1回だけ行う。
+    """
+    if TIMESTAMP_COLUMN in df.columns:
+        df[TIMESTAMP_COLUMN] = pd.to_datetime(df[TIMESTAMP_COLUMN], format=TIMESTAMP_FORMAT, errors="coerce")
+    return df
+
+
+def _normalize_answer_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    設問カラムの回答を分割・正規化し、カンマ区切りで格納し直す
+
+    正規化はユニークな回答値ごとに1回だけ行う。
+    正規化後の値を再度 normalize_dialect_term に通しても結果は変わらないため、
+    集計関数はそのまま使える。
+    """
+    for question_key, col_name in QUESTION_COLUMNS.items():
+        if col_name not in df.columns:
+            continue
+
+        mapping = {}
+        for val in df[col_name].dropna().unique():
+            parts = str(val).replace("、", ",").split(",")
+            normalized = [n for n in (normalize_dialect_term(p, question_key) for p in parts) if n]
+            mapping[val] = ",".join(normalized) if normalized else None
+
+        df[col_name] = df[col_name].map(mapping)
+
+    return df
+
+
+def _load_csv(url: str, session=None, timeout: float = 10, chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    CSVをストリーミングで取得し、チャンクごとに名寄せ・正規化してDataFrameにする
+
+    レスポンス全体を文字列として保持せず、受信したバイト列を順に read_csv に渡す。
+    不要なカラムは読み込み時点で捨てる。
+
+    Args:
+        url: CSVエクスポートURL
+        session: 使い回す requests.Session（省略時は都度接続）
+        timeout: タイムアウト秒数
+        chunksize: 1チャンクあたりの行数
+
+    Returns:
+        前処理済みのDataFrame
+    """
+    import requests
+
+    # CSVデータの取得（ストリーミング）
+    getter = session.get if session is not None else requests.get
+    with getter(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        chunks = iter_stage("fetch", response.iter_content(chunk_size=STREAM_BYTES))
+
+        # 先頭チャンクでHTMLが返ってきていないか確認（認証が必要な可能性）
+        head = b""
+        for head in chunks:
+            if head:
+                break
+        stripped = head.lstrip()
+        if stripped.startswith(b'<!DOCTYPE') or stripped.startswith(b'<html'):
+            raise ValueError("スプレッドシートにアクセスできません。公開設定を確認してください。")
+
+        stream = io.BufferedReader(_ResponseStream(itertools.chain([head], chunks)))
+        # parse の時間には取得の待ち時間も含まれる
+        return _read_csv_chunks(stream, chunksize)
+
+
+def _read_csv_chunks(stream, chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    CSVをチャンクごとに読み込み、名寄せ・正規化してDataFrameにする
+
+    Args:
+        stream: バイト列を読めるファイルオブジェクト
+        chunksize: 1チャンクあたりの行数
+    """
+    reader = pd.read_csv(stream, encoding="utf-8", usecols=_keep_column, chunksize=chunksize)
+
+    frames = []
+    for chunk in iter_stage("parse", reader, size=nbytes):
+        with stage("resolution"):
+            chunk = _resolve_locations(chunk)
+        with stage("normalization"):
+            chunk = _normalize_answer_columns(chunk)
+        with stage("timestamps"):
+            chunk = _parse_timestamps(chunk)
+        frames.append(chunk)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _apply_duplicate_flags(df: pd.DataFrame, exclude_duplicates: bool) -> pd.DataFrame:
+    """
+    重複・機械的な送信を判定し、exclude_duplicates なら除外する
+
+    除外しない場合は判定結果のカラム（DUPLICATE_COLUMN）を残す。
+    """
+    from dedup import flag_duplicates
+
+    with stage("dedup"):
+        df = flag_duplicates(df)
+    if exclude_duplicates:
+        df = df[df[DUPLICATE_COLUMN] == ""].drop(columns=[DUPLICATE_COLUMN]).reset_index(drop=True)
+    return df
+
+
+def load_data(url: str = SPREADSHEET_URL, db_path: str = None, exclude_duplicates: bool = True) -> pd.DataFrame:
     """
     Googleスプレッドシートからデータを読み込み、前処理を行う
     
+    Args:
+        url: CSVエクスポートURL
+        db_path: 指定した場合、前処理済みの回答をSQLiteデータベースにも書き出す
+        exclude_duplicates: 重複・機械的な送信と判定した行を除外するか
+    
     Returns:
         前処理済みのDataFrame
     """
-    try:
-        # CSVデータの取得
-        response = requests.get(url, timeout=10)
-        response.encoding = 'utf-8'
-        
-        # HTMLが返ってきた場合はエラー（認証が必要な可能性）
-        if response.text.strip().startswith('<!DOCTYPE') or response.text.strip().startswith('<html'):
-            raise ValueError("スプレッドシートにアクセスできません。公開設定を確認してください。")
-        
-        # DataFrameに変換
-        df = pd.read_csv(StringIO(response.text))
-        
-        # カラム名の確認
-        if "現在お住まいの場所" not in df.columns:
-            # カラム名をデバッグ出力
-            print(f"利用可能なカラム: {list(df.columns)}")
-            raise KeyError("'現在お住まいの場所' カラムが見つかりません")
-        
-        # 市町村名の名寄せ
-        def determine_municipality(row):
-            # 1. 現在の居住地から判定
-            current = row.get("現在お住まいの場所", "")
-            muni = extract_municipality(current)
-            if muni != "県外/不明":
-                return muni
-            
-            # 2. ルーツから判定（Fallback）
-            roots = row.get("ルーツ", "")
-            muni_roots = extract_municipality(roots)
-            if muni_roots != "県外/不明":
-                return muni_roots
-            
-            # 3. それでもダメなら県外/不明
-            return "県外/不明"
+    import requests
 
-        df["市町村名"] = df.apply(determine_municipality, axis=1)
-        
-        # 緯度経度の追加
-        df["緯度"] = df["市町村名"].apply(lambda x: get_coordinates(x)[0])
-        df["経度"] = df["市町村名"].apply(lambda x: get_coordinates(x)[1])
-        
-        # 地域の追加
-        df["地域"] = df["市町村名"].apply(get_region)
-        
+    try:
+        df = _apply_duplicate_flags(_load_csv(url), exclude_duplicates)
+        if db_path:
+            from response_store import write_responses
+            write_responses(df, db_path)
         return df
         
     except requests.exceptions.RequestException as e:
@@ -104,6 +428,299 @@ def load_data(url: str = SPREADSHEET_URL) -> pd.DataFrame:
         raise RuntimeError(f"データ読み込みエラー: {e}")
 
 
+def load_csv_file(path: str, exclude_duplicates: bool = True, chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    ローカルに保存したCSV（スプレッドシートのエクスポート）を読み込み、load_data と同じ前処理を行う
+
+    ネットワークに接続しないため、定期実行のバッチ処理などで使う。
+
+    Args:
+        path: CSVファイルのパス
+        exclude_duplicates: 重複・機械的な送信と判定した行を除外するか
+        chunksize: 1チャンクあたりの行数
+
+    Returns:
+        前処理済みのDataFrame
+    """
+    with open(path, "rb") as f:
+        df = _read_csv_chunks(f, chunksize)
+    return _apply_duplicate_flags(df, exclude_duplicates)
+
+
+def create_session(max_retries: int = 3, pool_size: int = 8) -> "requests.Session":
+    """
+    リトライ付きの接続プールを持つセッションを作成する
+
+    Args:
+        max_retries: 接続エラー・5xx応答時の最大リトライ回数
+        pool_size: ホストごとに保持する接続数
+
+    Returns:
+        requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def load_multiple_data(urls, timeout=10, max_retries: int = 3, max_workers: int = None,
+                       db_path: str = None, exclude_duplicates: bool = True) -> tuple:
+    """
+    複数のスプレッドシート（地域別・調査回ごとなど）を並行して読み込み、結合する
+
+    各シートは取得できた順にワーカースレッド内で変換・名寄せされるため、
+    全体の読み込み時間は最も遅いシートの時間とほぼ等しくなる。
+    一部のシートが失敗しても、残りのシートで結果を返す。
+
+    Args:
+        urls: {ソース名: URL} の辞書、またはURLのリスト（リストの場合はURLをソース名とする）
+        timeout: タイムアウト秒数。{ソース名: 秒数} の辞書でソースごとに指定も可
+        max_retries: ソースごとの最大リトライ回数
+        max_workers: 同時取得数（省略時はソース数）
+        db_path: 指定した場合、結合した回答をSQLiteデータベースにも書き出す
+        exclude_duplicates: 重複・機械的な送信と判定した行を除外するか（判定はシートをまたいで行う）
+
+    Returns:
+        (前処理済みDataFrame, 読み込みレポート) のタプル。
+        DataFrameには取得元を示す「ソース」カラムが追加される。
+        レポートはソースごとの 状態/件数/所要時間/エラー/重複件数 を持つDataFrame。
+    """
+    sources = dict(urls) if isinstance(urls, dict) else {url: url for url in urls}
+    if not sources:
+        raise ValueError("読み込むURLが指定されていません")
+
+    def source_timeout(name):
+        if isinstance(timeout, dict):
+            return timeout.get(name, 10)
+        return timeout
+
+    def fetch_one(session, name, url):
+        started = time.perf_counter()
+        df = _load_csv(url, session=session, timeout=source_timeout(name))
+        df.insert(0, SOURCE_COLUMN, name)
+        return df, time.perf_counter() - started
+
+    frames = {}
+    report = {}
+    workers = max_workers or len(sources)
+    with create_session(max_retries=max_retries, pool_size=workers) as session:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            started = time.perf_counter()
+            futures = {
+                # 計測の再実行番号をワーカースレッドに引き継ぐ
+                executor.submit(contextvars.copy_context().run, fetch_one, session, name, url): name
+                for name, url in sources.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    df, elapsed = future.result()
+                except Exception as e:
+                    report[name] = {"状態": "失敗", "件数": 0,
+                                    "所要時間": time.perf_counter() - started, "エラー": str(e)}
+                    continue
+                frames[name] = df
+                report[name] = {"状態": "成功", "件数": len(df), "所要時間": elapsed, "エラー": ""}
+
+    report_df = pd.DataFrame.from_dict(report, orient="index").reindex(list(sources))
+    report_df.index.name = SOURCE_COLUMN
+
+    if not frames:
+        raise ConnectionError(f"すべてのソースの読み込みに失敗しました: {report_df['エラー'].to_dict()}")
+
+    # 指定順で結合（到着順に依存しない）
+    df = pd.concat([frames[name] for name in sources if name in frames], ignore_index=True)
+
+    # 重複・機械的な送信の判定（シートをまたいだ重複も対象）
+    df = _apply_duplicate_flags(df, exclude_duplicates=False)
+    flagged = df[df[DUPLICATE_COLUMN] != ""]
+    report_df["重複件数"] = flagged[SOURCE_COLUMN].value_counts().reindex(report_df.index).fillna(0).astype("int64")
+    if exclude_duplicates:
+        df = df[df[DUPLICATE_COLUMN] == ""].drop(columns=[DUPLICATE_COLUMN]).reset_index(drop=True)
+    if db_path:
+        from response_store import write_responses
+        write_responses(df, db_path)
+    return df, report_df
+
+
+@timed("compact", measure_bytes=True)
+def compact_dataframe(df: pd.DataFrame) -> tuple:
+    """
+    回答データをメモリ効率の良い表現に変換する
+
+    - 市町村名・地域などの名寄せ結果と、正規化済みの設問回答はカテゴリ型にする
+    - 緯度経度は float32 にする
+    - 自由記入欄は空でない行だけを別テーブルに切り出す
+
+    Args:
+        df: 前処理済みDataFrame
+
+    Returns:
+        (コンパクト化したDataFrame, 自由記入欄テーブル) のタプル。
+        自由記入欄テーブルは「市町村名」と自由記入欄カラムを持ち、
+        インデックスは元の行と対応する。
+    """
+    if FREE_TEXT_COLUMN in df.columns:
+        texts = df[FREE_TEXT_COLUMN].dropna().astype(str).str.strip()
+        texts = texts[texts != ""]
+        free_text_df = pd.DataFrame({
+            "市町村名": df.loc[texts.index, "市町村名"].astype("category"),
+            FREE_TEXT_COLUMN: texts,
+        })
+        df = df.drop(columns=[FREE_TEXT_COLUMN])
+    else:
+        free_text_df = pd.DataFrame(columns=["市町村名", FREE_TEXT_COLUMN])
+
+    compact = df.copy()
+    categorical_columns = [
+        "市町村名", "地域", *PLACE_COLUMNS, SOURCE_COLUMN, DUPLICATE_COLUMN, *LOCATION_COLUMNS,
+        *QUESTION_COLUMNS.values(),
+    ]
+    for col in categorical_columns:
+        if col in compact.columns:
+            compact[col] = compact[col].astype("category")
+
+    for col in ["緯度", "経度"]:
+        if col in compact.columns:
+            compact[col] = compact[col].astype("float32")
+
+    return compact, free_text_df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame, side_tables=()) -> pd.DataFrame:
+    """
+    カラムごとのメモリ使用量を変換前後で比較する
+
+    Args:
+        before: 変換前のDataFrame
+        after: 変換後のDataFrame
+        side_tables: 変換で切り出した別テーブル（合計に加算する）
+
+    Returns:
+        カラムごとの 変換前/変換後 のバイト数と削減率を持つDataFrame（最終行は合計）
+    """
+    before_usage = before.memory_usage(deep=True, index=False)
+    after_usage = after.memory_usage(deep=True, index=False)
+    report = pd.concat(
+        [before_usage.rename("変換前"), after_usage.rename("変換後")], axis=1, sort=False
+    ).fillna(0)
+
+    for i, table in enumerate(side_tables, 1):
+        report.loc[f"(別テーブル{i})", "変換後"] = table.memory_usage(deep=True).sum()
+        report.loc[f"(別テーブル{i})", "変換前"] = 0
+
+    report.loc["合計"] = report.sum()
+    report = report.astype("int64")
+    report["削減率"] = (1 - report["変換後"] / report["変換前"].where(report["変換前"] > 0)).round(3)
+    report.index.name = "カラム"
+    return report
+
+
+def explode_answers(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    設問カラムを (response_id, question_key, municipality, answer) の縦持ちに展開する
+
+    設問カラムは load_data で正規化済み（カンマ区切り）であることを前提とする。
+    response_id は元のDataFrameの行インデックス。
+    """
+    frames = []
+    for question_key, col_name in QUESTION_COLUMNS.items():
+        if col_name not in df.columns:
+            continue
+        answers = df[col_name].dropna().astype(str).str.split(",").explode()
+        answers = answers[answers != ""]
+        frames.append(pd.DataFrame({
+            "response_id": answers.index,
+            "question_key": question_key,
+            "municipality": df.loc[answers.index, "市町村名"].astype(str).to_numpy(),
+            "answer": answers.to_numpy(),
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=["response_id", "question_key", "municipality", "answer"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_dataset_version(*frames: pd.DataFrame) -> str:
+    """
+    データセットの内容から版を表すハッシュ値を求める
+
+    データセットごとに1回だけ構築するインデックスや集計結果のキャッシュキーに使う。
+
+    Args:
+        frames: 前処理済みDataFrame（自由記入欄テーブルなど複数可）
+
+    Returns:
+        16桁の16進文字列
+    """
+    digest = np.uint64(len(frames))
+    with np.errstate(over="ignore"):
+        for frame in frames:
+            hashes = pd.util.hash_pandas_object(frame, index=True).to_numpy()
+            digest = digest * np.uint64(1000003) + hashes.sum(dtype=np.uint64) + np.uint64(len(frame))
+    return format(int(digest), "016x")
+
+
+def load_normalization_rules(reload: bool = False) -> dict:
+    """
+    表記ゆれの統合ルールを読み込む（プロセスごとに1回だけ読み、ファイルがなければ空）
+
+    Args:
+        reload: ルールファイルを読み直すか（ルールを更新した後に使う）
+
+    Returns:
+        {設問キー: {表記: 代表表記}} の辞書
+    """
+    global _normalization_rules
+    if _normalization_rules is None or reload:
+        try:
+            with open(NORMALIZATION_RULES_FILE, "r", encoding="utf-8") as f:
+                _normalization_rules = json.load(f)
+        except FileNotFoundError:
+            _normalization_rules = {}
+    return _normalization_rules
+
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def canonicalize_token(text: str) -> str:
+    """
+    設問によらない表記の統一（設問ごとの正規化の前に行う）
+
+    NFKC（半角カナ・全角英数の統一）、カタカナ→ひらがな、波ダッシュ→長音、
+    同じ段の小書きの母音による長音（のぉー → のー）、長音の連続の短縮を行う。
+    結果は表記ごとにキャッシュするため、同じ表記を何度正規化しても計算は1回だけになる。
+
+    Args:
+        text: 回答テキスト（分割済みの1語）
+
+    Returns:
+        統一した表記（再度適用しても変わらない）
+    """
+    text = unicodedata.normalize("NFKC", text).translate(_CANONICAL_TABLE).strip()
+    if any(small in text for small in _KANA_VOWELS):
+        chars = list(text)
+        for k in range(1, len(chars)):
+            if chars[k] in _KANA_VOWELS and chars[k - 1] in _KANA_VOWELS[chars[k]] + "ー":
+                chars[k] = "ー"
+        text = "".join(chars)
+    while "ーー" in text:
+        text = text.replace("ーー", "ー")
+    return text
+
+
 def normalize_dialect_term(text: str, question_key: str) -> str:
     """
     回答の表記ゆれを正規化する
@@ -118,10 +735,8 @@ def normalize_dialect_term(text: str, question_key: str) -> str:
     if not text or not isinstance(text, str):
         return None
         
-    # 基本的なクリーニング
-    text = text.strip()
-    # 長音の統一
-    text = text.replace("〜", "ー").replace("～", "ー")
+    # 設問によらない表記の統一（かな・幅・長音）
+    text = canonicalize_token(text)
     
     if not text:
         return None
@@ -157,11 +772,47 @@ def normalize_dialect_term(text: str, question_key: str) -> str:
         # はっこいのバリエーション
         if text in ["はっこ", "はっこい", "はっこー"]:
             return "はっこい"
-            
-    return text
+    
+    # 承認済みの統合ルール（代表表記はルールのキーにならないため、再適用しても結果は変わらない）
+    return load_normalization_rules().get(question_key, {}).get(text, text)
+
+
+def _cache_by_frame(func):
+    """
+    DataFrame（第1引数）の同一性と残りの引数で結果を保持するデコレータ（streamlit を使わない場合の代わり）
+
+    DataFrame が破棄されるとその結果も捨てる。st.cache_data と同様に、呼び出し側が変更してもよいよう複製を返す。
+    """
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(df, *args, **kwargs):
+        results = cache.get(id(df))
+        if results is None:
+            results = cache[id(df)] = {}
+            weakref.finalize(df, cache.pop, id(df), None)
+        key = (args, tuple(sorted(kwargs.items())))
+        if key not in results:
+            results[key] = func(df, *args, **kwargs)
+        return copy.copy(results[key])
+
+    wrapper.clear = cache.clear
+    return wrapper
+
+
+def _cache_data(func):
+    """
+    集計結果をキャッシュするデコレータ
+
+    streamlit がすでに読み込まれている（ダッシュボードから使われている）ときは st.cache_data を、
+    そうでない（バッチ処理のスクリプトから使われている）ときは _cache_by_frame を使い、streamlit を読み込まない。
+    """
+    if "streamlit" in sys.modules:
+        return sys.modules["streamlit"].cache_data(func)
+    return _cache_by_frame(func)
 
 
-@st.cache_data
+@_cache_data
 def get_normalized_answers(df: pd.DataFrame, col_name: str, question_key: str) -> list:
     """
     指定されたカラムの回答を分割・正規化してフラットなリストとして返す
@@ -180,7 +831,9 @@ def get_normalized_answers(df: pd.DataFrame, col_name: str, question_key: str) -
     return all_answers
 
 
-@st.cache_data
+@timed("question_distribution")
+@_cache_data
+@cache_miss("question_distribution")
 def get_question_distribution(df: pd.DataFrame, question_key: str) -> pd.DataFrame:
     """
     特定の設問の回答分布を取得（分割・正規化済み）
@@ -203,48 +856,56 @@ def get_question_distribution(df: pd.DataFrame, question_key: str) -> pd.DataFra
     return distribution
 
 
-@st.cache_data
-def get_municipality_distribution(df: pd.DataFrame, question_key: str) -> pd.DataFrame:
-    """
-    市町村ごとの設問回答分布を取得（分割・正規化済み）
-    """
+def _area_distribution(df: pd.DataFrame, question_key: str, column: str, excluded: str) -> pd.DataFrame:
+    """区域（column の値）ごとの設問回答分布（excluded の区域と無回答は除く）"""
     col_name = QUESTION_COLUMNS.get(question_key)
-    if col_name is None or col_name not in df.columns:
+    if col_name is None or col_name not in df.columns or column not in df.columns:
         return pd.DataFrame()
     
-    # 県外/不明を除外
-    df_filtered = df[df["市町村名"] != "県外/不明"].copy()
+    answered = df.loc[(df[column] != excluded) & df[col_name].notna(), [column, col_name]]
     
-    # レコードごとに展開してリスト化 [(municipality, answer), ...]
-    expanded_data = []
+    # 回答を分割して縦持ちに展開 [(区域, answer), ...]
+    parts = answered[col_name].astype(str).str.replace("、", ",").str.split(",").explode()
     
-    for _, row in df_filtered.iterrows():
-        municipality = row["市町村名"]
-        raw_answer = row[col_name]
-        
-        if pd.isna(raw_answer):
-            continue
-            
-        parts = str(raw_answer).replace("、", ",").split(",")
-        for part in parts:
-            normalized = normalize_dialect_term(part, question_key)
-            if normalized:
-                expanded_data.append({
-                    "市町村名": municipality,
-                    "回答": normalized
-                })
+    # 正規化はユニークな表記ごとに1回だけ行う
+    mapping = {part: normalize_dialect_term(part, question_key) for part in parts.unique()}
+    normalized = parts.map(mapping)
+    normalized = normalized[normalized.fillna("") != ""]
     
-    if not expanded_data:
+    if normalized.empty:
         return pd.DataFrame()
-        
-    df_expanded = pd.DataFrame(expanded_data)
     
     # クロス集計
-    cross_tab = pd.crosstab(df_expanded["市町村名"], df_expanded["回答"])
+    cross_tab = pd.crosstab(
+        answered.loc[normalized.index, column].to_numpy(), normalized.to_numpy(),
+        rownames=[column], colnames=["回答"],
+    )
     
     return cross_tab
 
 
+@timed("municipality_distribution")
+@_cache_data
+@cache_miss("municipality_distribution")
+def get_municipality_distribution(df: pd.DataFrame, question_key: str) -> pd.DataFrame:
+    """
+    市町村ごとの設問回答分布を取得（分割・正規化済み）
+    """
+    # 県外/不明と無回答を除外
+    return _area_distribution(df, question_key, "市町村名", "県外/不明")
+
+
+@timed("prefecture_distribution")
+@_cache_data
+@cache_miss("prefecture_distribution")
+def get_prefecture_distribution(df: pd.DataFrame, question_key: str) -> pd.DataFrame:
+    """
+    都道府県ごとの設問回答分布を取得（分割・正規化済み、地図を縮小したときの集計に使う）
+    """
+    # 都道府県が分からない回答と無回答を除外
+    return _area_distribution(df, question_key, PREFECTURE_COLUMN, "")
+
+
 
 def get_free_text_by_municipality(df: pd.DataFrame, municipality: str) -> list:
     """
@@ -257,7 +918,7 @@ def get_free_text_by_municipality(df: pd.DataFrame, municipality: str) -> list:
     Returns:
         自由記入欄の内容リスト
     """
-    free_text_col = "【自由記入欄】 面白い方言"
+    free_text_col = FREE_TEXT_COLUMN
     
     if free_text_col not in df.columns:
         return []
@@ -284,3 +945,7 @@ if __name__ == "__main__":
     print(f"\nQ2の回答分布:")
     q2_dist = get_question_distribution(df, "Q2")
     print(q2_dist.head(10))
+
+    print(f"\nメモリ使用量（コンパクト化の前後）:")
+    compact, free_text_df = compact_dataframe(df)
+    print(memory_report(df, compact, side_tables=[free_text_df]).to_string())
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+重複・機械的な送信の検出
+
+公開フォームには同じ内容の二重送信や、スクリプトによるほぼ同じ内容の連続送信が混ざる。
+回答数の少ない市町村では数件でも分布が大きく変わるため、取り込み時に判定して集計から除く。
+
+- 完全重複: 正規化済みの回答・所在地・自由記入欄が同じで、送信時刻が近いもの（ハッシュで判定）
+- 類似重複: MinHash/LSH で回答・自由記入欄の集合が似ている候補を絞り、送信時刻が近いもの
+
+どちらも全ペアの比較は行わず、ソートと隣接比較だけで判定する。
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_processor import (
+    QUESTION_COLUMNS,
+    FREE_TEXT_COLUMN,
+    LOCATION_COLUMNS,
+    TIMESTAMP_COLUMN,
+    DUPLICATE_COLUMN,
+)
+
+# 判定結果（DUPLICATE_COLUMN の値、空文字は重複なし）
+EXACT_DUPLICATE = "完全重複"
+NEAR_DUPLICATE = "類似重複"
+
+# 同じ内容の送信を重複とみなす時間差
+EXACT_DUPLICATE_WINDOW = pd.Timedelta(minutes=60)
+
+# 似た内容の送信を重複とみなす時間差
+NEAR_DUPLICATE_WINDOW = pd.Timedelta(minutes=10)
+
+# 類似重複とみなす推定ジャッカード係数
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# MinHash の署名長と LSH のバンド分割（NUM_PERM = BANDS × ROWS_PER_BAND）
+NUM_PERM = 32
+BANDS = 8
+ROWS_PER_BAND = 4
+
+# MinHash を一度に計算する行数（メモリ使用量の上限）
+MINHASH_CHUNK_ROWS = 50000
+
+# 自由記入欄の文字 n-gram の長さ
+TEXT_SHINGLE_SIZE = 3
+
+# ハッシュ関数の法（メルセンヌ素数 2^31 - 1）
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+def _content_columns(df: pd.DataFrame) -> list:
+    """重複判定に使うカラム（設問・所在地・自由記入欄）"""
+    columns = [*QUESTION_COLUMNS.values(), *LOCATION_COLUMNS, FREE_TEXT_COLUMN]
+    return [col for col in columns if col in df.columns]
+
+
+def _timestamps_ns(df: pd.DataFrame) -> np.ndarray:
+    """送信時刻（ナノ秒、欠損は最小値）"""
+    if TIMESTAMP_COLUMN not in df.columns:
+        return np.full(len(df), np.iinfo(np.int64).min)
+    return pd.to_datetime(df[TIMESTAMP_COLUMN]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def _close_to_previous(keys: np.ndarray, times: np.ndarray, window: pd.Timedelta) -> tuple:
+    """
+    キーと時刻で並べたとき、直前の行と同じキーで時刻が window 以内の行を求める
+
+    Returns:
+        (並び順, 直前の行と近いかどうか) のタプル。時刻が欠損した行は近いとみなさない。
+    """
+    order = np.lexsort((times, keys))
+    sorted_keys, sorted_times = keys[order], times[order]
+    missing = sorted_times == np.iinfo(np.int64).min
+    close = np.zeros(len(order), dtype=bool)
+    close[1:] = (
+        (sorted_keys[1:] == sorted_keys[:-1])
+        & ~missing[1:] & ~missing[:-1]
+        & (sorted_times[1:] - sorted_times[:-1] <= window.value)
+    )
+    return order, close
+
+
+def find_exact_duplicates(df: pd.DataFrame, window: pd.Timedelta = EXACT_DUPLICATE_WINDOW) -> np.ndarray:
+    """
+    完全重複の行を求める（同じ内容の中で、最初の送信以外を重複とする）
+
+    Args:
+        df: 前処理済みDataFrame（設問カラムは正規化済み）
+        window: 直前の同じ内容の送信からこの時間以内なら重複とする
+
+    Returns:
+        行ごとの真偽値配列
+    """
+    # カラムごとにユニークな値だけをハッシュし、行のキーに合成する
+    keys = np.zeros(len(df), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for col in _content_columns(df):
+            codes, uniques = pd.factorize(df[col])
+            hashes = pd.util.hash_array(np.asarray(pd.Index(uniques).astype(str).str.strip(), dtype=object))
+            # 欠損（codes == -1）は末尾に足した 0 を引く（全行が欠損のカラムでは uniques が空になる）
+            keys = keys * np.uint64(1000003) + np.append(hashes, np.uint64(0))[codes]
+    order, close = _close_to_previous(keys, _timestamps_ns(df), window)
+    duplicated = np.zeros(len(df), dtype=bool)
+    duplicated[order] = close
+    return duplicated
+
+
+def _tokens(df: pd.DataFrame) -> tuple:
+    """
+    行ごとのトークン（設問ごとの回答・所在地）と、自由記入欄の文字 n-gram
+
+    Returns:
+        (カラムごとのトークン番号の配列のリスト（欠損は -1）,
+         行ごとの自由記入欄の番号（なしは -1）,
+         自由記入欄ごとの (文章番号, トークン番号) の配列の組,
+         トークンの総数) のタプル
+    """
+    column_tokens = []
+    offset = 0
+    for col in _content_columns(df):
+        if col == FREE_TEXT_COLUMN:
+            continue
+        codes, uniques = pd.factorize(df[col])
+        column_tokens.append(np.where(codes >= 0, codes + offset, -1))
+        offset += len(uniques)
+
+    text_of_row = np.full(len(df), -1)
+    text_ids, gram_tokens = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if FREE_TEXT_COLUMN in df.columns:
+        texts = df[FREE_TEXT_COLUMN].astype(object).where(df[FREE_TEXT_COLUMN].notna(), "")
+        texts = texts.astype(str).str.replace(r"\s+", "", regex=True)
+        text_codes, unique_texts = pd.factorize(texts.where(texts != ""))
+        text_of_row = text_codes
+        # n-gram の展開はユニークな文章ごとに1回だけ行う
+        # （集合の順序は文字列のハッシュのシードで変わるため、並べてからトークン番号を振る）
+        grams = pd.Series([
+            sorted({text[k:k + TEXT_SHINGLE_SIZE] for k in range(max(len(text) - TEXT_SHINGLE_SIZE + 1, 1))})
+            for text in unique_texts
+        ], dtype=object).explode().dropna()
+        gram_codes, gram_uniques = pd.factorize(grams)
+        text_ids, gram_tokens = grams.index.to_numpy(dtype=np.int64), gram_codes + offset
+        offset += len(gram_uniques)
+
+    return column_tokens, text_of_row, (text_ids, gram_tokens), offset
+
+
+def _hash_table(n_tokens: int, num_perm: int, seed: int) -> np.ndarray:
+    """
+    トークンごとの num_perm 個のハッシュ値 (a·x + b) mod p
+
+    Returns:
+        形状 (n_tokens + 1, num_perm) の uint32 配列。最後の行は欠損用（最大値）。
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    table = np.full((n_tokens + 1, num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    table[:n_tokens] = (np.arange(n_tokens, dtype=np.uint64)[:, None] * a + b) % _PRIME
+    return table
+
+
+def minhash_signatures(df: pd.DataFrame, num_perm: int = NUM_PERM, seed: int = 0) -> np.ndarray:
+    """
+    行ごとのトークン集合（設問ごとの回答・所在地・自由記入欄の文字 n-gram）の MinHash 署名
+
+    設問・所在地は1行に1トークンずつなので、カラムごとにハッシュ値を引いて最小値を更新する。
+    自由記入欄はユニークな文章ごとに署名を求めてから、各行に合成する。
+
+    Returns:
+        形状 (行数, num_perm) の uint32 配列（トークンのない行は最大値）
+    """
+    column_tokens, text_of_row, (text_ids, gram_tokens), n_tokens = _tokens(df)
+    table = _hash_table(n_tokens, num_perm, seed)
+
+    signatures = np.full((len(df), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for first in range(0, len(df), MINHASH_CHUNK_ROWS):
+        chunk = slice(first, first + MINHASH_CHUNK_ROWS)
+        for tokens in column_tokens:
+            np.minimum(signatures[chunk], table[tokens[chunk]], out=signatures[chunk])
+
+    if len(text_ids):
+        # 文章ごとの署名（文章番号の昇順に並んでいるので、区切りごとの最小値を取る）
+        starts = np.flatnonzero(np.concatenate([[True], text_ids[1:] != text_ids[:-1]]))
+        text_signatures = np.minimum.reduceat(table[gram_tokens], starts, axis=0)
+        has_text = text_of_row >= 0
+        signatures[has_text] = np.minimum(signatures[has_text], text_signatures[text_of_row[has_text]])
+    return signatures
+
+
+def _connected_components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """辺リストの連結成分（各頂点に成分内の最小の頂点番号を割り当てる）"""
+    labels = np.arange(n)
+    while True:
+        smaller = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smaller)
+        np.minimum.at(updated, right, smaller)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def find_near_duplicates(df: pd.DataFrame, window: pd.Timedelta = NEAR_DUPLICATE_WINDOW,
+                         threshold: float = NEAR_DUPLICATE_THRESHOLD) -> np.ndarray:
+    """
+    類似重複の行を求める（似た送信のまとまりの中で、最初の送信以外を重複とする）
+
+    LSH のバンドごとに、同じバケットの行を送信時刻順に並べて隣どうしだけを比べる。
+
+    Args:
+        df: 前処理済みDataFrame
+        window: 直前の似た送信からこの時間以内なら重複とする
+        threshold: 重複とみなす推定ジャッカード係数
+
+    Returns:
+        行ごとの真偽値配列
+    """
+    n = len(df)
+    if n < 2:
+        return np.zeros(n, dtype=bool)
+
+    signatures = minhash_signatures(df)
+    times = _timestamps_ns(df)
+
+    left, right = [], []
+    for band in range(BANDS):
+        block = signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].astype(np.uint64)
+        keys = np.zeros(n, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for k in range(ROWS_PER_BAND):
+                keys = keys * np.uint64(1000003) + block[:, k]
+        order, close = _close_to_previous(keys, times, window)
+        current = order[1:][close[1:]]
+        previous = order[:-1][close[1:]]
+        similarity = (signatures[current] == signatures[previous]).mean(axis=1)
+        keep = similarity >= threshold
+        left.append(previous[keep])
+        right.append(current[keep])
+
+    left, right = np.concatenate(left), np.concatenate(right)
+    if len(left) == 0:
+        return np.zeros(n, dtype=bool)
+
+    # 連結成分ごとに最初の送信（時刻、同時刻なら行番号が最小）だけを残す
+    labels = _connected_components(n, left, right)
+    first = pd.Series(np.arange(n)).groupby([labels, times]).min()
+    keepers = first.groupby(level=0).first().to_numpy()
+    duplicated = np.ones(n, dtype=bool)
+    duplicated[keepers] = False
+    return duplicated
+
+
+def flag_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    重複判定のカラムを追加する
+
+    Args:
+        df: load_data / load_multiple_data 内部の前処理済みDataFrame
+
+    Returns:
+        DUPLICATE_COLUMN（"" / 完全重複 / 類似重複）を追加したDataFrame
+    """
+    exact = find_exact_duplicates(df)
+    near = find_near_duplicates(df) & ~exact
+    flags = np.select([exact, near], [EXACT_DUPLICATE, NEAR_DUPLICATE], default="")
+    return df.assign(**{DUPLICATE_COLUMN: flags})
+
+
+if __name__ == "__main__":
+    # テスト（全行が空のカラム（未記入の自由記入欄・追加したばかりの設問）があっても判定できる）
+    question = next(iter(QUESTION_COLUMNS.values()))
+    sample = pd.DataFrame({
+        question: ["しゃっこい", "しゃっこい", "つめたい"],
+        LOCATION_COLUMNS[0]: ["鶴岡市", "鶴岡市", "山形市"],
+        FREE_TEXT_COLUMN: [None, None, None],
+        TIMESTAMP_COLUMN: pd.to_datetime(["2024-01-06 10:00", "2024-01-06 10:01", "2024-01-06 10:02"]),
+    })
+    exact = find_exact_duplicates(sample)
+    print(f"完全重複: {exact.tolist()}")
+    assert exact.tolist() == [False, True, False]
+    print(f"判定結果: {flag_duplicates(sample)[DUPLICATE_COLUMN].tolist()}")
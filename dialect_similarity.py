@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+全設問を通した市町村間の方言の類似度と階層クラスタリング
+
+市町村 × (設問, 回答) の割合行列から市町村間の距離行列を求め、
+群平均法で階層クラスタリングする。距離行列は件数が変わった市町村の行だけを更新する。
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# 距離計算で一度に比較する行数（メモリ使用量の上限）
+DISTANCE_CHUNK_ROWS = 128
+
+
+def build_feature_counts(cross_tabs: dict) -> pd.DataFrame:
+    """
+    設問ごとのクロス集計を、市町村 × (設問, 回答) の件数行列にまとめる
+
+    Args:
+        cross_tabs: {設問キー: 市町村 × 回答のクロス集計} の辞書
+
+    Returns:
+        列が (設問, 回答) のMultiIndexのDataFrame
+    """
+    frames = {key: tab for key, tab in cross_tabs.items() if not tab.empty}
+    if not frames:
+        return pd.DataFrame()
+    counts = pd.concat(frames, axis=1, names=["設問", "回答"]).fillna(0)
+    return counts.sort_index()
+
+
+def _question_blocks(columns: pd.MultiIndex) -> list:
+    """設問ごとの列範囲（slice）のリスト"""
+    questions = columns.get_level_values(0)
+    blocks = []
+    start = 0
+    for k in range(1, len(questions) + 1):
+        if k == len(questions) or questions[k] != questions[start]:
+            blocks.append(slice(start, k))
+            start = k
+    return blocks
+
+
+def _shares(counts: np.ndarray, blocks: list) -> tuple:
+    """
+    設問ごとに正規化した割合行列と、設問ごとの回答有無を返す
+
+    Returns:
+        (形状 (n, F) の割合行列, 形状 (n, 設問数) の回答有無)
+    """
+    shares = np.zeros_like(counts, dtype=np.float64)
+    answered = np.zeros((counts.shape[0], len(blocks)), dtype=bool)
+    for q, block in enumerate(blocks):
+        totals = counts[:, block].sum(axis=1, keepdims=True)
+        np.divide(counts[:, block], totals, out=shares[:, block], where=totals > 0)
+        answered[:, q] = totals[:, 0] > 0
+    return shares, answered
+
+
+def _entropy(p: np.ndarray) -> np.ndarray:
+    """最終軸方向のエントロピー（底2）"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=-1)
+
+
+def pairwise_distances(shares: np.ndarray, answered: np.ndarray, blocks: list, rows=None,
+                       metric: str = "jensen_shannon") -> np.ndarray:
+    """
+    市町村間の距離を計算する
+
+    ジェンセン・シャノン距離は設問ごとに求め、両方が回答している設問で平均する。
+    コサイン距離は設問ごとに正規化した割合ベクトル全体で求める。
+
+    Args:
+        shares, answered: _shares の結果
+        blocks: 設問ごとの列範囲
+        rows: 計算する行のインデックス（省略時は全行）
+        metric: "jensen_shannon" または "cosine"
+
+    Returns:
+        形状 (len(rows), n) の距離行列
+    """
+    n = shares.shape[0]
+    rows = np.arange(n) if rows is None else np.asarray(rows)
+
+    if metric == "cosine":
+        norms = np.linalg.norm(shares, axis=1)
+        norms = np.where(norms > 0, norms, 1.0)
+        similarity = (shares[rows] @ shares.T) / norms[rows, None] / norms[None, :]
+        return np.clip(1.0 - similarity, 0.0, 1.0)
+
+    if metric != "jensen_shannon":
+        raise ValueError(f"未対応の距離です: {metric}")
+
+    result = np.empty((len(rows), n))
+    for start in range(0, len(rows), DISTANCE_CHUNK_ROWS):
+        chunk = rows[start:start + DISTANCE_CHUNK_ROWS]
+        total = np.zeros((len(chunk), n))
+        both = answered[chunk][:, None, :] & answered[None, :, :]
+        for q, block in enumerate(blocks):
+            p = shares[chunk, block][:, None, :]
+            r = shares[:, block][None, :, :]
+            divergence = _entropy((p + r) / 2) - (_entropy(p) + _entropy(r)) / 2
+            total += np.where(both[:, :, q], np.sqrt(np.clip(divergence, 0.0, None)), 0.0)
+        count = both.sum(axis=2)
+        result[start:start + len(chunk)] = np.where(count > 0, total / np.maximum(count, 1), 1.0)
+
+    # 自分自身との距離は0
+    result[np.arange(len(rows)), rows] = 0.0
+    return result
+
+
+class DialectSimilarity:
+    """
+    市町村間の距離行列を保持し、件数の変化に応じて差分更新する
+
+    Args:
+        metric: "jensen_shannon" または "cosine"
+    """
+
+    def __init__(self, metric: str = "jensen_shannon"):
+        self.metric = metric
+        self.counts = pd.DataFrame()
+        self.distances = pd.DataFrame()
+        self._lock = threading.Lock()
+
+    def update(self, counts: pd.DataFrame) -> int:
+        """
+        件数行列を更新し、変化した市町村の行・列だけ距離を再計算する
+
+        回答の種類（列）が増えても、既存の市町村で件数が変わらなければ距離は変わらない。
+
+        Args:
+            counts: build_feature_counts の結果
+
+        Returns:
+            再計算した市町村の数
+        """
+        with self._lock:
+            if counts.empty:
+                self.counts, self.distances = counts, pd.DataFrame()
+                return 0
+
+            columns = counts.columns
+            previous = self.counts.reindex(index=counts.index, columns=columns)
+            is_new = previous.isna().all(axis=1).to_numpy()
+            changed = is_new | (previous.fillna(0).to_numpy() != counts.to_numpy()).any(axis=1)
+            if not changed.any() and self.distances.index.equals(counts.index):
+                self.counts = counts
+                return 0
+
+            blocks = _question_blocks(columns)
+            shares, answered = _shares(counts.to_numpy(dtype=np.float64), blocks)
+            distances = self.distances.reindex(index=counts.index, columns=counts.index).to_numpy(copy=True)
+            rows = np.flatnonzero(changed)
+            updated = pairwise_distances(shares, answered, blocks, rows, self.metric)
+            distances[rows, :] = updated
+            distances[:, rows] = updated.T
+
+            self.counts = counts
+            self.distances = pd.DataFrame(distances, index=counts.index, columns=counts.index)
+            return len(rows)
+
+
+def average_linkage(distances: np.ndarray) -> np.ndarray:
+    """
+    群平均法（UPGMA）による階層クラスタリング
+
+    Args:
+        distances: 形状 (n, n) の対称な距離行列
+
+    Returns:
+        scipy の linkage と同じ形式の (n - 1, 4) 配列
+        [結合したクラスタ1, クラスタ2, 距離, 要素数]
+    """
+    n = distances.shape[0]
+    d = distances.astype(np.float64, copy=True)
+    np.fill_diagonal(d, np.inf)
+    sizes = np.ones(n)
+    ids = np.arange(n)
+    active = np.ones(n, dtype=bool)
+    linkage = np.zeros((max(n - 1, 0), 4))
+
+    for step in range(n - 1):
+        masked = np.where(active[:, None] & active[None, :], d, np.inf)
+        i, j = np.unravel_index(np.argmin(masked), masked.shape)
+        if i > j:
+            i, j = j, i
+        linkage[step] = [min(ids[i], ids[j]), max(ids[i], ids[j]), d[i, j], sizes[i] + sizes[j]]
+
+        # i に併合し、j を無効にする
+        merged = (sizes[i] * d[i] + sizes[j] * d[j]) / (sizes[i] + sizes[j])
+        d[i, :] = merged
+        d[:, i] = merged
+        d[i, i] = np.inf
+        sizes[i] += sizes[j]
+        ids[i] = n + step
+        active[j] = False
+
+    return linkage
+
+
+def cut_tree(linkage: np.ndarray, n_clusters: int) -> np.ndarray:
+    """
+    デンドログラムを指定したクラスタ数で切る
+
+    Returns:
+        各葉のクラスタ番号（1始まり、最初に現れた順）
+    """
+    n = len(linkage) + 1
+    parent = np.arange(2 * n - 1)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for step in range(n - max(n_clusters, 1)):
+        a, b = int(linkage[step, 0]), int(linkage[step, 1])
+        parent[find(a)] = n + step
+        parent[find(b)] = n + step
+
+    roots = [find(leaf) for leaf in range(n)]
+    numbering = {}
+    return np.array([numbering.setdefault(root, len(numbering) + 1) for root in roots])
+
+
+def dendrogram_segments(linkage: np.ndarray) -> tuple:
+    """
+    デンドログラムの描画用座標
+
+    Returns:
+        (葉の並び順, 線分のリスト [(xs, ys), ...])。
+        葉は x = 0, 1, 2, ... に並び、y は結合距離。
+    """
+    n = len(linkage) + 1
+    children = {n + k: (int(linkage[k, 0]), int(linkage[k, 1])) for k in range(n - 1)}
+
+    # 葉の並び順（根から深さ優先）
+    order = []
+    stack = [2 * n - 2] if n > 1 else [0]
+    while stack:
+        node = stack.pop()
+        if node < n:
+            order.append(node)
+        else:
+            left, right = children[node]
+            stack.extend([right, left])
+
+    x = {leaf: float(k) for k, leaf in enumerate(order)}
+    y = {leaf: 0.0 for leaf in range(n)}
+    segments = []
+    for k in range(n - 1):
+        node = n + k
+        left, right = children[node]
+        height = linkage[k, 2]
+        segments.append(([x[left], x[left], x[right], x[right]], [y[left], height, height, y[right]]))
+        x[node] = (x[left] + x[right]) / 2
+        y[node] = height
+
+    return order, segments
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+自由記入欄の検索インデックス
+
+データセットの版ごとに1回だけ構築し、市町村別の一覧・キーワード検索・ページ送り・
+ランダムピックアップを全件フィルタなしで行う。
+日本語は単語の区切りがないため、文字バイグラムの転置インデックスを使う。
+"""
+
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from data_processor import FREE_TEXT_COLUMN
+
+
+def _normalize(text: str) -> str:
+    """検索用の正規化（全角・半角の統一と英字の小文字化）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _ngrams(text: str, n: int) -> set:
+    """文字 n-gram の集合"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class FreeTextIndex:
+    """
+    自由記入欄の転置インデックス
+
+    Args:
+        free_text_df: 「市町村名」と自由記入欄カラムを持つテーブル（空欄は除外済み）
+    """
+
+    def __init__(self, free_text_df: pd.DataFrame):
+        texts = free_text_df[FREE_TEXT_COLUMN].astype(str)
+        self.texts = texts.to_numpy(dtype=object)
+        self.municipalities = free_text_df["市町村名"].astype(str).to_numpy(dtype=object)
+        self._normalized = [_normalize(t) for t in self.texts]
+
+        # 市町村ごとの文書ID（元の行順）
+        self._by_municipality = {
+            municipality: np.asarray(ids, dtype=np.int32)
+            for municipality, ids in pd.Series(self.municipalities).groupby(self.municipalities).indices.items()
+        }
+
+        # 文字ユニグラム・バイグラムの転置リスト（文書IDは昇順）
+        unigrams = defaultdict(list)
+        bigrams = defaultdict(list)
+        for doc_id, text in enumerate(self._normalized):
+            for gram in _ngrams(text, 1):
+                unigrams[gram].append(doc_id)
+            for gram in _ngrams(text, 2):
+                bigrams[gram].append(doc_id)
+        self._unigrams = {g: np.asarray(ids, dtype=np.int32) for g, ids in unigrams.items()}
+        self._bigrams = {g: np.asarray(ids, dtype=np.int32) for g, ids in bigrams.items()}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def municipality_ids(self, municipality: str) -> np.ndarray:
+        """指定した市町村の文書ID"""
+        return self._by_municipality.get(municipality, np.empty(0, dtype=np.int32))
+
+    def counts_by_municipality(self) -> dict:
+        """市町村ごとの件数"""
+        return {municipality: len(ids) for municipality, ids in self._by_municipality.items()}
+
+    def search(self, keyword: str, municipality: str = None) -> np.ndarray:
+        """
+        キーワードを含む文書IDを返す
+
+        Args:
+            keyword: 検索語（部分一致）
+            municipality: 指定した場合はその市町村に絞り込む
+
+        Returns:
+            文書IDの配列（元の行順）
+        """
+        query = _normalize(keyword.strip())
+        if not query:
+            return self.municipality_ids(municipality) if municipality else np.arange(len(self), dtype=np.int32)
+
+        # 転置リストの積集合で候補を絞り込む（短いリストから順に）
+        if len(query) == 1:
+            postings = [self._unigrams.get(query)]
+        else:
+            postings = [self._bigrams.get(gram) for gram in _ngrams(query, 2)]
+        if any(p is None for p in postings):
+            return np.empty(0, dtype=np.int32)
+
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(candidates) == 0:
+                return candidates
+
+        if municipality:
+            candidates = np.intersect1d(candidates, self.municipality_ids(municipality), assume_unique=True)
+
+        # バイグラムがすべて含まれていても連続しているとは限らないため、候補だけ照合する
+        if len(query) > 2:
+            candidates = np.asarray(
+                [doc_id for doc_id in candidates if query in self._normalized[doc_id]], dtype=np.int32
+            )
+        return candidates
+
+    def page(self, doc_ids: np.ndarray, page: int, page_size: int = 20) -> list:
+        """
+        文書IDの一覧から指定ページ分の (市町村名, テキスト) を返す
+
+        Args:
+            doc_ids: search / municipality_ids の結果
+            page: ページ番号（1始まり）
+            page_size: 1ページあたりの件数
+        """
+        start = max(page - 1, 0) * page_size
+        selected = doc_ids[start:start + page_size]
+        return list(zip(self.municipalities[selected], self.texts[selected]))
+
+    def sample(self, n: int, rng: np.random.Generator = None) -> list:
+        """ランダムに n 件の (市町村名, テキスト) を返す"""
+        if len(self) == 0:
+            return []
+        rng = rng or np.random.default_rng()
+        selected = rng.choice(len(self), size=min(n, len(self)), replace=False)
+        return list(zip(self.municipalities[selected], self.texts[selected]))
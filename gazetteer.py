@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+全国の市区町村辞書（ガゼッティア）と住所テキストの照合
+
+国土数値情報の行政区域データ（N03）の属性（都道府県・郡・市区町村名・行政区域コード）と、
+読み仮名の表（総務省の全国地方公共団体コードの一覧など）から辞書を生成し、
+都道府県名・郡名・市区町村名・読み仮名のすべてを1つの照合器（先頭文字で引く辞書）にまとめる。
+住所テキストは1回走査するだけで、朝日町・川西町のような同名の市町村も都道府県名・郡名の文脈で区別する。
+合併前の旧市町村と地区名（合併の経緯の表）も同じ照合器に入れ、現在の市区町村が見つからないときに承継先へ変換する。
+
+    python gazetteer.py N03-20240101_06.shp --output gazetteer.json
+    python gazetteer.py N03-20240101_*.shp --readings 000925835.csv --output gazetteer.json
+    python gazetteer.py N03-20240101_06.shp --history municipal_history.csv --output gazetteer.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import unicodedata
+from collections import namedtuple
+
+# 行政区域コードの先頭2桁（都道府県コード）と都道府県名
+PREFECTURES = {
+    "01": "北海道", "02": "青森県", "03": "岩手県", "04": "宮城県", "05": "秋田県", "06": "山形県", "07": "福島県",
+    "08": "茨城県", "09": "栃木県", "10": "群馬県", "11": "埼玉県", "12": "千葉県", "13": "東京都", "14": "神奈川県",
+    "15": "新潟県", "16": "富山県", "17": "石川県", "18": "福井県", "19": "山梨県", "20": "長野県", "21": "岐阜県",
+    "22": "静岡県", "23": "愛知県", "24": "三重県", "25": "滋賀県", "26": "京都府", "27": "大阪府", "28": "兵庫県",
+    "29": "奈良県", "30": "和歌山県", "31": "鳥取県", "32": "島根県", "33": "岡山県", "34": "広島県", "35": "山口県",
+    "36": "徳島県", "37": "香川県", "38": "愛媛県", "39": "高知県", "40": "福岡県", "41": "佐賀県", "42": "長崎県",
+    "43": "熊本県", "44": "大分県", "45": "宮崎県", "46": "鹿児島県", "47": "沖縄県",
+}
+
+# 代表点の緯度・経度の小数点以下の桁数（約10m）
+POINT_DECIMALS = 4
+
+# N03 で市区町村に属さない区域の名前（辞書に入れない）
+UNASSIGNED_NAMES = {"", "所属未定地"}
+
+# 読み仮名の表のカラム（総務省「全国地方公共団体コード」の一覧と同じ見出し）
+READING_COLUMNS = {
+    "code": "団体コード",
+    "prefecture": "都道府県名（漢字）",
+    "name": "市区町村名（漢字）",
+    "prefecture_reading": "都道府県名（カナ）",
+    "reading": "市区町村名（カナ）",
+}
+
+# 合併の経緯の表（旧市町村・地区 → 承継先の市区町村）
+HISTORY_FILE = "municipal_history.csv"
+
+# 合併の経緯の表のカラム（別名は「|」区切り、廃止日は YYYY-MM-DD、地区は廃止日・旧団体コードなし）
+HISTORY_COLUMNS = {
+    "kind": "種別",
+    "code": "旧団体コード",
+    "prefecture": "都道府県名",
+    "county": "郡名",
+    "name": "名称",
+    "reading": "読み",
+    "aliases": "別名",
+    "abolished": "廃止日",
+    "successor_code": "承継団体コード",
+    "successor": "承継市区町村名",
+}
+
+# 照合結果（municipality が None なら都道府県だけが分かった。former は照合した旧市町村・地区の名前、
+# pattern は市区町村・旧市町村の決め手になったテキスト中の文字列（漢字の名前・読み・別名）
+Match = namedtuple("Match", ["code", "prefecture", "municipality", "former", "pattern"], defaults=(None, None))
+
+# カタカナ → ひらがな（読み仮名の表はカタカナのため）
+_KATAKANA_TO_HIRAGANA = str.maketrans({chr(code): chr(code - 0x60) for code in range(0x30A1, 0x30F7)})
+
+# 照合するパターンの種類
+_PREFECTURE, _COUNTY, _MUNICIPALITY, _FORMER = 0, 1, 2, 3
+
+
+def to_hiragana(text: str) -> str:
+    """読み仮名をひらがなにそろえる（半角カナは NFKC で全角にしてから変換）"""
+    return unicodedata.normalize("NFKC", text).translate(_KATAKANA_TO_HIRAGANA).strip()
+
+
+def _prefecture_stem(name: str) -> str:
+    """都道府県名から「都・府・県」を除いた名前（北海道はそのまま）"""
+    return name[:-1] if name[-1] in "都府県" else name
+
+
+class PatternIndex:
+    """
+    複数のパターンを1回の走査で探す照合器
+
+    先頭の文字ごとにパターンの長さ（長い順）を持ち、テキストの各位置ではその文字で始まる長さだけ
+    切り出して辞書を引く。住所のように短いテキストでは、エイホ–コラシック法を Python で実装するより速い。
+
+    Args:
+        patterns: パターン文字列のリスト（添字がパターンの番号になる）
+    """
+
+    def __init__(self, patterns: list):
+        self._numbers = {pattern: number for number, pattern in enumerate(patterns)}
+        lengths = {}
+        for pattern in patterns:
+            lengths.setdefault(pattern[0], set()).add(len(pattern))
+        self._lengths = {char: tuple(sorted(values, reverse=True)) for char, values in lengths.items()}
+
+    def find_longest(self, text: str) -> list:
+        """
+        左から順に、重ならない最長の出現を選ぶ（「東京都」の中の「京都」などを除く）
+
+        Returns:
+            [(開始位置, 終了位置, パターンの番号), ...] のリスト（テキストの順）
+        """
+        numbers, lengths_by_char = self._numbers, self._lengths
+        matches = []
+        start = 0
+        size = len(text)
+        while start < size:
+            lengths = lengths_by_char.get(text[start])
+            if lengths:
+                for length in lengths:
+                    number = numbers.get(text[start:start + length])
+                    if number is not None:
+                        matches.append((start, start + length, number))
+                        start += length
+                        break
+                else:
+                    start += 1
+            else:
+                start += 1
+        return matches
+
+
+class Gazetteer:
+    """
+    市区町村辞書と住所テキストの照合器
+
+    Args:
+        municipalities: [{"code", "prefecture", "county", "name", "readings", "lat", "lon"}, ...] のリスト
+            （lat・lon は代表点、省略可）
+        prefectures: [{"code", "name", "readings", "lat", "lon"}, ...] のリスト（省略時は PREFECTURES）
+        home_prefecture: 同名の市町村を文脈で区別できないときに優先する都道府県（調査の対象県）
+        former: 旧市町村・地区の [{"code", "prefecture", "county", "name", "readings", "aliases",
+            "abolished", "successor_code", "successor"}, ...] のリスト（read_history の結果）
+    """
+
+    def __init__(self, municipalities: list, prefectures: list = None, home_prefecture: str = None,
+                 former: list = None):
+        if prefectures is None:
+            prefectures = [{"code": code, "name": name, "readings": []} for code, name in PREFECTURES.items()]
+        self.municipalities = municipalities
+        self.prefectures = prefectures
+        self.home_prefecture = home_prefecture
+        # (都道府県, 市区町村名) → 市区町村、都道府県名 → 都道府県（代表点・コードを引く）
+        self._places = {(m["prefecture"], m["name"]): m for m in municipalities}
+        self._places.update({(p["name"], ""): p for p in prefectures})
+        self.former = former or []
+        # 旧市町村・地区 → 現在の承継先の市区町村の番号（承継先が辞書にないものは照合しない）
+        self._successors = self._find_successors()
+
+        # パターン → (種類, 値) の一覧。同じ文字列のパターンは1つにまとめ、値を集める
+        targets = {}
+
+        def add(pattern, kind, value):
+            if pattern:
+                targets.setdefault(pattern, {}).setdefault(kind, []).append(value)
+
+        for prefecture in prefectures:
+            for pattern in (prefecture["name"], _prefecture_stem(prefecture["name"]), *prefecture.get("readings", [])):
+                add(pattern, _PREFECTURE, prefecture["name"])
+        counties = {(m["prefecture"], m["county"]) for m in municipalities if m.get("county")}
+        for prefecture, county in counties:
+            add(county, _COUNTY, (prefecture, county))
+        for number, municipality in enumerate(municipalities):
+            for pattern in (municipality["name"], *municipality.get("readings", [])):
+                add(pattern, _MUNICIPALITY, number)
+        for number, entry in enumerate(self.former):
+            if self._successors[number] is None:
+                continue
+            for pattern in (entry["name"], *entry.get("readings", []), *entry.get("aliases", [])):
+                add(pattern, _FORMER, number)
+
+        self._patterns = list(targets)
+        # パターンの番号 → (都道府県のタプル, 郡のタプル, 市区町村の番号のタプル, 旧市町村・地区の番号のタプル)
+        self._targets = [
+            tuple(tuple(targets[pattern].get(kind, ())) for kind in (_PREFECTURE, _COUNTY, _MUNICIPALITY, _FORMER))
+            for pattern in self._patterns
+        ]
+        # 同名のない市区町村だけを指すパターンは、文脈を見ずに照合結果が決まる
+        self._unique = [
+            self._match(munis[0], pattern=pattern)
+            if len(munis) == 1 and not prefs and not cnts and not olds else None
+            for pattern, (prefs, cnts, munis, olds) in zip(self._patterns, self._targets)
+        ]
+        self._index = PatternIndex(self._patterns)
+
+    def place(self, prefecture: str, municipality: str = "") -> dict:
+        """
+        都道府県・市区町村の辞書の項目（市区町村を省略すると都道府県の項目）
+
+        Returns:
+            {"code", "name", "lat", "lon", ...} の dict、辞書になければ None
+        """
+        return self._places.get((prefecture, municipality or ""))
+
+    def _match(self, number: int, former: str = None, pattern: str = None) -> Match:
+        entry = self.municipalities[number]
+        return Match(entry["code"], entry["prefecture"], entry["name"], former, pattern)
+
+    def _find_successors(self) -> list:
+        """
+        旧市町村・地区ごとに、現在の承継先の市区町村を求める
+
+        承継先が別の旧市町村（2回以上の合併）なら、廃止日の順にたどって現在の市区町村まで進める。
+        """
+        by_code = {m["code"]: number for number, m in enumerate(self.municipalities) if m.get("code")}
+        by_name = {(m["prefecture"], m["name"]): number for number, m in enumerate(self.municipalities)}
+        former_by_code = {e["code"]: e for e in self.former if e.get("code")}
+
+        successors = []
+        for entry in self.former:
+            successor = None
+            for _ in range(len(self.former) + 1):
+                code = entry.get("successor_code", "")
+                successor = by_code.get(code, by_name.get((entry["prefecture"], entry.get("successor", ""))))
+                later = former_by_code.get(code)
+                if successor is not None or later is None or later.get("abolished", "") <= entry.get("abolished", ""):
+                    break
+                entry = later
+            successors.append(successor)
+        return successors
+
+    def _choose(self, candidates: list, prefectures: set, counties: set, former: bool = False):
+        """
+        同名の市町村の候補から、文脈（都道府県・郡）と対象県で1つを選ぶ（決まらなければ None）
+
+        候補が1つでも文脈と照らし合わせ、他の都道府県・郡だけが書かれていれば選ばない
+        （「奈良県川西町」を山形県の川西町に、「宮城県松山」を酒田市の松山にしない）。
+        """
+        entries = self.former if former else self.municipalities
+        in_context = [
+            number for number in candidates
+            if entries[number]["prefecture"] in prefectures
+            or (entries[number]["prefecture"], entries[number].get("county")) in counties
+        ]
+        if len(in_context) == 1:
+            return in_context[0]
+        if not in_context and (prefectures or counties):
+            # 文脈の都道府県にない同名の市町村は選ばない（「東京都」と書かれた朝日町を山形県にしない）
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        home = [number for number in (in_context or candidates) if entries[number]["prefecture"] == self.home_prefecture]
+        if len(home) == 1:
+            return home[0]
+        return None
+
+    def resolve(self, text: str):
+        """
+        住所テキストから市区町村（分からなければ都道府県だけ）を求める
+
+        テキストの先に現れた市区町村を優先する。同名の市町村は、テキスト中の都道府県名・郡名、
+        それもなければ対象県（home_prefecture）で区別し、区別できなければ次の候補を見る。
+        現在の市区町村が見つからなければ、旧市町村・地区を同じ規則で選び、承継先の市区町村にする。
+
+        Returns:
+            Match、何も見つからなければ None
+        """
+        prefectures = set()
+        counties = set()
+        candidates = []
+        former = []
+        for _, _, number in self._index.find_longest(text):
+            unique = self._unique[number]
+            if not candidates and unique is not None and (not (prefectures or counties) or unique.prefecture in prefectures):
+                # 最初の候補が同名のない市区町村で、それより前に他の都道府県・郡が書かれていなければ、
+                # 後ろの文脈に関係なくそれに決まる
+                return unique
+            prefs, cnts, munis, olds = self._targets[number]
+            prefectures.update(prefs)
+            counties.update(cnts)
+            if munis:
+                candidates.append((munis, number))
+            if olds:
+                former.append((olds, number))
+
+        for numbers, pattern in candidates:
+            chosen = self._choose(numbers, prefectures, counties)
+            if chosen is not None:
+                return self._match(chosen, pattern=self._patterns[pattern])
+        for numbers, pattern in former:
+            chosen = self._choose(numbers, prefectures, counties, former=True)
+            if chosen is not None:
+                return self._match(self._successors[chosen], self.former[chosen]["name"], self._patterns[pattern])
+        if len(prefectures) == 1:
+            prefecture = next(iter(prefectures))
+            return Match(None, prefecture, None)
+        return None
+
+    @classmethod
+    def load(cls, path: str, home_prefecture: str = None) -> "Gazetteer":
+        """build_gazetteer で書き出した辞書を読み込む"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["municipalities"], data.get("prefectures"), home_prefecture, data.get("former_municipalities"))
+
+
+def _shapefile_reader(path: str):
+    import shapefile
+
+    # 2023年以前の N03 は .cpg がなく Shift_JIS
+    base = os.path.splitext(path)[0]
+    options = {} if os.path.exists(base + ".cpg") or path.lower().endswith(".zip") else {"encoding": "cp932"}
+    return shapefile.Reader(path, **options)
+
+
+def _read_n03_attributes(path: str) -> list:
+    """N03 のシェープファイル（.shp/.dbf/.zip）または GeoJSON から属性の dict のリストを読む"""
+    if path.lower().endswith((".json", ".geojson")):
+        with open(path, "r", encoding="utf-8") as f:
+            return [feature["properties"] for feature in json.load(f)["features"]]
+
+    with _shapefile_reader(path) as reader:
+        names = [field[0] for field in reader.fields[1:]]
+        return [dict(zip(names, record)) for record in reader.iterRecords()]
+
+
+def read_n03_features(path: str) -> list:
+    """
+    N03 のシェープファイル（.shp/.zip）または GeoJSON から属性と形状を読む
+
+    Returns:
+        [(属性の dict, GeoJSON の geometry), ...] のリスト
+    """
+    if path.lower().endswith((".json", ".geojson")):
+        with open(path, "r", encoding="utf-8") as f:
+            return [(feature["properties"], feature["geometry"]) for feature in json.load(f)["features"]]
+
+    with _shapefile_reader(path) as reader:
+        names = [field[0] for field in reader.fields[1:]]
+        return [
+            (dict(zip(names, item.record)), item.shape.__geo_interface__)
+            for item in reader.iterShapeRecords()
+        ]
+
+
+def n03_unit(props: dict) -> tuple:
+    """
+    N03 の1区域が属する市区町村（政令指定都市の区は市にまとめる）
+
+    Returns:
+        (都道府県, 郡, 市区町村名) のタプル
+    """
+    prefecture = (props.get("N03_001") or "").strip()
+    county = (props.get("N03_003") or "").strip()
+    name = (props.get("N03_004") or "").strip()
+    if (props.get("N03_005") or "").strip():
+        # 2024年以降: N03_004 が政令指定都市、N03_005 が区
+        return prefecture, "", name
+    if county.endswith("市") and name.endswith("区"):
+        # 2023年以前: N03_003 が政令指定都市、N03_004 が区
+        return prefecture, "", county
+    return prefecture, county if county.endswith("郡") else "", name
+
+
+def read_readings(path: str) -> tuple:
+    """
+    読み仮名の表（CSV）を読む
+
+    Returns:
+        ({(都道府県, 市区町村名): (団体コード5桁, 読み)}, {都道府県: 読み}) のタプル
+    """
+    municipalities = {}
+    prefectures = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            prefecture = row[READING_COLUMNS["prefecture"]].strip()
+            name = row.get(READING_COLUMNS["name"], "").strip()
+            if not name:
+                prefectures[prefecture] = to_hiragana(row.get(READING_COLUMNS["prefecture_reading"], ""))
+                continue
+            code = row.get(READING_COLUMNS["code"], "").strip()[:5]
+            municipalities[(prefecture, name)] = (code, to_hiragana(row.get(READING_COLUMNS["reading"], "")))
+    return municipalities, prefectures
+
+
+def read_history(path: str) -> list:
+    """
+    合併の経緯の表（CSV）を読む
+
+    Returns:
+        [{"kind", "code", "prefecture", "county", "name", "readings", "aliases",
+          "abolished", "successor_code", "successor"}, ...] のリスト
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            value = {key: (row.get(column) or "").strip() for key, column in HISTORY_COLUMNS.items()}
+            if not value["name"]:
+                continue
+            reading = to_hiragana(value.pop("reading"))
+            value["readings"] = [reading] if reading else []
+            value["aliases"] = [alias.strip() for alias in value["aliases"].split("|") if alias.strip()]
+            entries.append(value)
+    return entries
+
+
+def _representative_point(shapes: list) -> dict:
+    """区域の形状（GeoJSON の geometry のリスト）から、区域の中にある代表点を求める（形状がなければ空）"""
+    if not shapes:
+        return {}
+    from shapely import make_valid, unary_union
+    from shapely.geometry import shape
+
+    point = unary_union([make_valid(shape(geometry)) for geometry in shapes]).representative_point()
+    return {"lat": round(point.y, POINT_DECIMALS), "lon": round(point.x, POINT_DECIMALS)}
+
+
+def build_gazetteer(n03_paths: list, readings_path: str = None, extra_readings: dict = None,
+                    history_path: str = None) -> dict:
+    """
+    N03 の属性と読み仮名の表から市区町村辞書を作る
+
+    形状を持つファイル（.shp / .zip / .geojson）からは、市区町村・都道府県の代表点（lat, lon）も求める。
+
+    Args:
+        n03_paths: N03 のファイル（都道府県ごとのファイルを複数指定できる）
+        readings_path: 読み仮名の表（CSV、省略可）
+        extra_readings: 追加の読み {(都道府県, 市区町村名): [読み, ...]}
+        history_path: 合併の経緯の表（CSV、省略可）
+
+    Returns:
+        {"prefectures": [...], "municipalities": [...], "former_municipalities": [...]} の辞書
+    """
+    units = {}
+    for path in n03_paths:
+        if path.lower().endswith(".dbf"):
+            features = [(props, None) for props in _read_n03_attributes(path)]
+        else:
+            features = read_n03_features(path)
+        for props, geometry in features:
+            prefecture, county, name = n03_unit(props)
+            if name in UNASSIGNED_NAMES or not prefecture:
+                continue
+            unit = units.setdefault((prefecture, name), {"county": county, "codes": set(), "shapes": []})
+            code = (props.get("N03_007") or "").strip()
+            if code:
+                unit["codes"].add(code)
+            if geometry:
+                unit["shapes"].append(geometry)
+
+    reading_table, prefecture_readings = read_readings(readings_path) if readings_path else ({}, {})
+    municipalities = []
+    for (prefecture, name), unit in sorted(units.items(), key=lambda item: min(item[1]["codes"], default="")):
+        code, reading = reading_table.get((prefecture, name), ("", ""))
+        if not code and len(unit["codes"]) == 1:
+            code = next(iter(unit["codes"]))
+        readings = [reading] if reading else []
+        for extra in (extra_readings or {}).get((prefecture, name), []):
+            if extra not in readings:
+                readings.append(extra)
+        municipality = {
+            "code": code, "prefecture": prefecture, "county": unit["county"], "name": name, "readings": readings,
+        }
+        municipality.update(_representative_point(unit["shapes"]))
+        municipalities.append(municipality)
+
+    present = {municipality["prefecture"] for municipality in municipalities}
+    prefectures = []
+    for code, name in PREFECTURES.items():
+        readings = [prefecture_readings[name]] if prefecture_readings.get(name) else []
+        prefecture = {"code": code, "name": name, "readings": readings}
+        # 都道府県の代表点は市区町村の代表点の平均（県名だけの回答の位置に使う）
+        points = [(m["lat"], m["lon"]) for m in municipalities if m["prefecture"] == name and "lat" in m]
+        if points:
+            prefecture["lat"] = round(sum(lat for lat, _ in points) / len(points), POINT_DECIMALS)
+            prefecture["lon"] = round(sum(lon for _, lon in points) / len(points), POINT_DECIMALS)
+        prefectures.append(prefecture)
+    return {
+        "covered_prefectures": sorted(present),
+        "prefectures": prefectures,
+        "municipalities": municipalities,
+        "former_municipalities": read_history(history_path) if history_path else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N03 の属性から市区町村辞書（gazetteer.json）を作る")
+    parser.add_argument("n03", nargs="+", help="N03 のファイル（.shp / .dbf / .zip / .geojson）")
+    parser.add_argument("--readings", help="読み仮名の表（総務省の全国地方公共団体コードの一覧をCSVにしたもの）")
+    parser.add_argument("--history", default=HISTORY_FILE, help="合併の経緯の表（旧市町村・地区 → 承継先）")
+    parser.add_argument("--output", default="gazetteer.json", help="書き出すファイル")
+    args = parser.parse_args()
+
+    # 山形県の読み（municipalities.py の平仮名表）は読み仮名の表がなくても入れる
+    from municipalities import HIRAGANA_TO_KANJI
+
+    extra_readings = {}
+    for reading, name in HIRAGANA_TO_KANJI.items():
+        extra_readings.setdefault(("山形県", name), []).append(reading)
+
+    history = args.history if os.path.exists(args.history) else None
+    gazetteer = build_gazetteer(args.n03, args.readings, extra_readings, history)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(gazetteer, f, ensure_ascii=False, indent=1)
+    print(f"{len(gazetteer['municipalities'])}市区町村（{len(gazetteer['covered_prefectures'])}都道府県）、"
+          f"旧市町村・地区 {len(gazetteer['former_municipalities'])}件を {args.output} に書き出しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+モジュールの読み込み時間（コールドスタート）のベンチマーク
+
+ダッシュボード（app）とバッチ処理のスクリプトが使うモジュールを、それぞれ新しいPythonプロセスで読み込み、
+import にかかる時間と、読み込まれた重い依存ライブラリ（streamlit・plotly・folium など）を測る。
+-X importtime の結果から、各モジュールが直接読み込んだパッケージのうち時間のかかったものも表示する。
+
+    python import_benchmark.py --output before.json
+    python import_benchmark.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+# 測るモジュール（ダッシュボードとバッチ処理のスクリプトが読み込むもの）
+TARGETS = [
+    "app",
+    "data_processor",
+    "dedup",
+    "response_store",
+    "variant_discovery",
+    "synthetic_survey",
+    "benchmark",
+]
+
+# 読み込まれたかを確認する重い依存ライブラリ
+HEAVY_MODULES = [
+    "streamlit",
+    "plotly.express",
+    "plotly.graph_objects",
+    "folium",
+    "streamlit_folium",
+    "branca",
+    "shapely",
+    "requests",
+]
+
+# 以前の結果からこの比率以上遅くなったモジュールを悪化として表示する
+REGRESSION_RATIO = 1.2
+
+# 子プロセスで実行するスクリプト（import の時間と読み込まれた重いライブラリを JSON で出力する）
+_CHILD = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _run_child(module: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    repo = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _CHILD.format(repo=repo, module=module, heavy=HEAVY_MODULES)]
+    result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} の読み込みに失敗しました:\n{result.stderr}")
+    return result
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    """
+    -X importtime の出力から、測るモジュールが直接読み込んだパッケージを累積時間の降順に並べる
+
+    Args:
+        stderr: 子プロセスの標準エラー出力
+        top: 返す件数
+
+    Returns:
+        [{"package": パッケージ名, "cumulative_ms": 累積時間}, ...] のリスト
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 入れ子の深さ1（先頭の空白が3文字）の行が、測るモジュールが直接読み込んだもの
+        if not cumulative.strip().isdigit() or not name.startswith("   ") or name.startswith("    "):
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative) / 1000
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": package, "cumulative_ms": ms} for package, ms in ranked]
+
+
+def measure(module: str, repeat: int, top: int) -> dict:
+    """
+    1つのモジュールの読み込み時間を repeat 回測る（毎回新しいプロセス）
+
+    Returns:
+        秒数・中央値・読み込まれた重いライブラリ・時間のかかったパッケージを持つ dict
+    """
+    seconds = []
+    loaded = []
+    for _ in range(repeat):
+        output = json.loads(_run_child(module).stdout.strip().splitlines()[-1])
+        seconds.append(output["seconds"])
+        loaded = output["loaded"]
+    packages = parse_importtime(_run_child(module, importtime=True).stderr, top)
+    return {
+        "module": module,
+        "seconds": seconds,
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "heavy_loaded": loaded,
+        "top_packages": packages,
+    }
+
+
+def compare(results: dict, baseline_path: str):
+    """以前の結果と中央値を比べて表示する"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {r["module"]: r for r in baseline["results"]}
+    print(f"\n{baseline_path} との比較（中央値）")
+    for result in results["results"]:
+        old = previous.get(result["module"])
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] > 0 else float("inf")
+        mark = "  ← 悪化" if ratio >= REGRESSION_RATIO else ""
+        print(f"  {result['module']:<20} {old['median']:7.3f}s → {result['median']:7.3f}s ({ratio:.2f}x){mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="モジュールの読み込み時間を測る")
+    parser.add_argument("--modules", nargs="+", default=TARGETS, help="測るモジュール")
+    parser.add_argument("--repeat", type=int, default=5, help="プロセスを起動する回数")
+    parser.add_argument("--top", type=int, default=5, help="表示する時間のかかったパッケージの数")
+    parser.add_argument("--output", default="import_results.json", help="結果のJSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果のJSONファイル")
+    args = parser.parse_args()
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "repeat": args.repeat,
+        "results": [],
+    }
+    for module in args.modules:
+        result = measure(module, args.repeat, args.top)
+        results["results"].append(result)
+        heavy = ", ".join(result["heavy_loaded"]) or "なし"
+        packages = ", ".join(f"{p['package']} {p['cumulative_ms']:.0f}ms" for p in result["top_packages"])
+        print(f"  {module:<20} {result['median']:7.3f}s  重いライブラリ: {heavy}")
+        print(f"  {'':<20} {packages}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を {args.output} に書き出しました")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
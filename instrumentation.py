@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+処理段階ごとの計測（診断用）
+
+取得・名寄せ・正規化・集計・地図の組み立て・描画などの段階ごとに、
+処理時間・呼び出し回数・キャッシュのヒット/ミス・生成したバイト数を記録する。
+環境変数 HOUGEN_DIAGNOSTICS=1 で有効になり、ダッシュボードのサイドバーに診断パネルが表示される。
+無効なときは計測用のオブジェクトを作らず、フラグの確認1回だけで元の処理を呼ぶ。
+
+    with stage("fetch") as s:
+        s.add_bytes(len(body))
+
+    @timed("question_distribution")
+    @st.cache_data
+    @cache_miss("question_distribution")
+    def get_question_distribution(...): ...
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+import pandas as pd
+
+# 計測を有効にするか（enable() で実行中に切り替えられる）
+ENABLED = os.environ.get("HOUGEN_DIAGNOSTICS", "") not in ("", "0")
+
+# 保持する計測記録の最大件数（古いものから捨てる）
+MAX_EVENTS = 20000
+
+_events = deque(maxlen=MAX_EVENTS)
+_lock = threading.Lock()
+_last_run = 0
+
+# 実行中の再実行の番号（Streamlit のセッションごとのスレッドで別々に持つ）
+_current_run = ContextVar("hougen_run", default=0)
+
+# cache_miss を付けた段階（キャッシュヒットを求められる段階）
+_cached_stages = set()
+
+
+def enable(enabled: bool = True):
+    """計測の有効・無効を切り替える"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def start_run() -> int:
+    """
+    スクリプトの再実行（rerun）の始まりを記録する
+
+    以降にこのスレッド（コンテキスト）で記録した計測記録にはこの番号が付き、
+    summary(run=...) で1回の再実行分だけを集計できる。同時に開いている他のセッションの番号は変えない。
+    ワーカースレッドで計測するときは contextvars.copy_context().run で番号を引き継ぐ。
+    """
+    global _last_run
+    with _lock:
+        _last_run += 1
+        run = _last_run
+    _current_run.set(run)
+    return run
+
+
+def current_run() -> int:
+    return _current_run.get()
+
+
+def _record(name: str, seconds: float, nbytes: int = 0, cache: str = None):
+    event = {
+        "run": _current_run.get(),
+        "stage": name,
+        "seconds": seconds,
+        "bytes": nbytes,
+        "cache": cache,
+        "thread": threading.current_thread().name,
+        "time": time.time(),
+    }
+    with _lock:
+        _events.append(event)
+
+
+class _Stage:
+    """有効時の計測区間"""
+
+    __slots__ = ("name", "nbytes", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.nbytes = 0
+
+    def add_bytes(self, nbytes: int):
+        self.nbytes += nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self._start, self.nbytes)
+        return False
+
+
+class _NullStage:
+    """無効時の計測区間（何もしない、1つのインスタンスを使い回す）"""
+
+    __slots__ = ()
+
+    def add_bytes(self, nbytes: int):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """
+    処理区間の時間を計測するコンテキストマネージャ
+
+    Args:
+        name: 段階名（fetch, resolution など）
+    """
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def nbytes(value) -> int:
+    """処理結果のおおよそのバイト数（DataFrame は浅いメモリ使用量、文字列はUTF-8の長さ）"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (tuple, list)) and value and not isinstance(value[0], (str, dict)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+
+def timed(name: str = None, measure_bytes: bool = False):
+    """
+    関数の呼び出しを計測するデコレータ
+
+    st.cache_data / st.cache_resource の外側に付けると、キャッシュのヒットも含めた呼び出し回数と時間を記録する
+    （内側に cache_miss を付けるとミスの回数も分かる）。
+
+    Args:
+        name: 段階名（省略時は関数名）
+        measure_bytes: 戻り値のバイト数を記録するか
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            _record(label, time.perf_counter() - start, nbytes(result) if measure_bytes else 0)
+            return result
+
+        # st.cache_data の clear() などをそのまま使えるようにする
+        if hasattr(func, "clear"):
+            wrapper.clear = func.clear
+        return wrapper
+
+    return decorator
+
+
+def cache_miss(name: str = None):
+    """
+    キャッシュされる関数の本体に付け、本体が実行された（キャッシュミスの）回数を記録するデコレータ
+
+    Args:
+        name: 段階名（外側の timed と同じ名前にする）
+    """
+    def decorator(func):
+        label = name or func.__name__
+        _cached_stages.add(label)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if ENABLED:
+                _record(label, 0.0, cache="miss")
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def iter_stage(name: str, iterable, size=len):
+    """
+    イテレータから値を取り出す時間（ストリーミング取得の待ち時間など）を計測する
+
+    無効時は iterable をそのまま返す。
+
+    Args:
+        name: 段階名
+        iterable: 計測するイテレータ
+        size: 値からバイト数を求める関数
+    """
+    if not ENABLED:
+        return iterable
+
+    def generator():
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            _record(name, time.perf_counter() - start, size(value) if size else 0)
+            yield value
+
+    return generator()
+
+
+def events(run: int = None) -> list:
+    """計測記録のリスト（run を指定するとその再実行分だけ）"""
+    with _lock:
+        snapshot = list(_events)
+    return snapshot if run is None else [event for event in snapshot if event["run"] == run]
+
+
+def clear():
+    """計測記録を消す"""
+    with _lock:
+        _events.clear()
+
+
+def summary(run: int = None) -> pd.DataFrame:
+    """
+    段階ごとの集計
+
+    Args:
+        run: 集計する再実行の番号（省略時はすべて）
+
+    Returns:
+        段階をインデックスとし、呼び出し回数, 合計秒, 平均秒, 最大秒, キャッシュミス, キャッシュヒット, バイト数 を持つDataFrame
+        （合計秒の降順）。キャッシュヒットは cache_miss を付けた段階だけ求める。
+    """
+    columns = ["呼び出し回数", "合計秒", "平均秒", "最大秒", "キャッシュミス", "キャッシュヒット", "バイト数"]
+    frame = pd.DataFrame(events(run))
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    is_miss = frame["cache"].eq("miss")
+    calls = frame[~is_miss].groupby("stage")
+    result = pd.DataFrame({
+        "呼び出し回数": calls.size(),
+        "合計秒": calls["seconds"].sum(),
+        "平均秒": calls["seconds"].mean(),
+        "最大秒": calls["seconds"].max(),
+        "バイト数": calls["bytes"].sum(),
+    })
+    misses = frame[is_miss].groupby("stage").size()
+    cached = result.index.isin(list(_cached_stages))
+    result["キャッシュミス"] = misses.reindex(result.index).fillna(0).where(cached)
+    result["キャッシュヒット"] = (result["呼び出し回数"] - result["キャッシュミス"]).clip(lower=0)
+    result.index.name = "段階"
+    return result[columns].sort_values("合計秒", ascending=False)
+
+
+def to_jsonl(run: int = None) -> str:
+    """計測記録をJSON Lines（1行1記録）の文字列にする"""
+    return "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events(run))
+
+
+def export_jsonl(path: str, run: int = None):
+    """計測記録をJSON Linesファイルに追記する"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(to_jsonl(run))
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+回答割合の空間補間（ラスター表示用）
+
+市町村の代表点の回答件数から、県内の規則的な緯度経度グリッド上の回答割合を
+カーネル平滑化（または逆距離加重）で推定する。
+グリッドの県域マスクと各セル × 市町村の重み行列は一度だけ計算し、
+回答ごとの補間は重み行列と件数ベクトルの積だけで求める。
+"""
+
+import numpy as np
+import pandas as pd
+
+# グリッドの間隔（度、約500m）
+GRID_RESOLUTION = 0.005
+
+# ガウスカーネルのバンド幅（km）
+KERNEL_BANDWIDTH_KM = 10.0
+
+# 逆距離加重のべき指数
+IDW_POWER = 2.0
+
+# 緯度1度あたりの距離（km）
+KM_PER_DEGREE = 111.32
+
+
+class InterpolationGrid:
+    """
+    県域で切り抜いた緯度経度グリッド
+
+    Args:
+        geojson: 市町村ごとにマージ済みのFeatureCollection（N03_004 に市町村名）
+        resolution: グリッドの間隔（度）
+    """
+
+    def __init__(self, geojson: dict, resolution: float = GRID_RESOLUTION):
+        import shapely
+        from shapely.geometry import shape
+        from shapely.ops import unary_union
+
+        polygons = {}
+        for feature in geojson["features"]:
+            name = feature.get("properties", {}).get("N03_004")
+            if not name:
+                continue
+            geometry = shape(feature["geometry"])
+            polygons[name] = geometry if geometry.is_valid else geometry.buffer(0)
+
+        prefecture = unary_union(list(polygons.values()))
+        shapely.prepare(prefecture)
+        west, south, east, north = prefecture.bounds
+
+        # セル中心の座標（行は北から南の順、画像と同じ向き）
+        self.lons = np.arange(west + resolution / 2, east, resolution)
+        self.lats = np.arange(north - resolution / 2, south, -resolution)
+        self.bounds = [[self.lats[-1] - resolution / 2, west], [north, self.lons[-1] + resolution / 2]]
+        grid_lon, grid_lat = np.meshgrid(self.lons, self.lats)
+
+        # 県域マスク（ベクトル化した点の内外判定）
+        self.mask = shapely.contains_xy(prefecture, grid_lon, grid_lat)
+        self.cell_lats = grid_lat[self.mask]
+        self.cell_lons = grid_lon[self.mask]
+
+        # 市町村の代表点（ポリゴン内部にあることが保証される点）
+        self.names = list(polygons)
+        points = [polygons[name].representative_point() for name in self.names]
+        self.point_lats = np.array([p.y for p in points])
+        self.point_lons = np.array([p.x for p in points])
+
+    @property
+    def shape(self) -> tuple:
+        return self.mask.shape
+
+    def distances_km(self) -> np.ndarray:
+        """
+        県内の各セルと各市町村の代表点の距離（正距円筒近似）
+
+        Returns:
+            形状 (県内セル数, 市町村数) の距離行列
+        """
+        scale = np.cos(np.radians(self.point_lats.mean()))
+        dy = (self.cell_lats[:, None] - self.point_lats[None, :]) * KM_PER_DEGREE
+        dx = (self.cell_lons[:, None] - self.point_lons[None, :]) * KM_PER_DEGREE * scale
+        return np.hypot(dx, dy)
+
+
+class SurfaceInterpolator:
+    """
+    グリッドと補間方法ごとの重み行列を保持し、件数から回答割合の面を求める
+
+    推定値は Σ w·件数 / Σ w·総回答数（Nadaraya-Watson 推定量）で、
+    回答の多い市町村ほど強く効く。
+
+    Args:
+        grid: InterpolationGrid
+        method: "kernel"（ガウスカーネル）または "idw"（逆距離加重）
+        bandwidth_km: ガウスカーネルのバンド幅
+        power: 逆距離加重のべき指数
+    """
+
+    def __init__(self, grid: InterpolationGrid, method: str = "kernel",
+                 bandwidth_km: float = KERNEL_BANDWIDTH_KM, power: float = IDW_POWER):
+        distances = grid.distances_km()
+        if method == "kernel":
+            weights = np.exp(-0.5 * (distances / bandwidth_km) ** 2)
+        elif method == "idw":
+            # 代表点と同じセルで発散しないよう、セル幅程度の距離を下限にする
+            weights = 1.0 / np.maximum(distances, 0.5) ** power
+        else:
+            raise ValueError(f"未対応の補間方法です: {method}")
+
+        self.grid = grid
+        self.method = method
+        self.weights = weights.astype(np.float32)
+        self._position = {name: k for k, name in enumerate(grid.names)}
+
+    def _counts(self, cross_tab: pd.DataFrame) -> pd.DataFrame:
+        """クロス集計をグリッドの市町村の順に並べる（データのない市町村は0件）"""
+        return cross_tab.reindex(self.grid.names).fillna(0)
+
+    def _to_grid(self, values: np.ndarray) -> np.ndarray:
+        """県内セルの値をグリッドの形に戻す（県外は NaN）"""
+        surface = np.full(self.grid.shape + values.shape[1:], np.nan, dtype=np.float32)
+        surface[self.grid.mask] = values
+        return surface
+
+    def share_surface(self, cross_tab: pd.DataFrame, answer: str) -> np.ndarray:
+        """
+        1つの回答の割合の面
+
+        Args:
+            cross_tab: 市町村 × 回答の件数
+            answer: 回答
+
+        Returns:
+            グリッドと同じ形状の割合（0〜1、県外は NaN）
+        """
+        counts = self._counts(cross_tab)
+        numerator = self.weights @ counts[answer].to_numpy(dtype=np.float32)
+        denominator = self.weights @ counts.sum(axis=1).to_numpy(dtype=np.float32)
+        shares = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+        return self._to_grid(shares)
+
+    def dominant_surface(self, cross_tab: pd.DataFrame) -> tuple:
+        """
+        各セルで最も割合の高い回答の面
+
+        Returns:
+            (最多回答の列番号の面（県外は -1）, その割合の面) のタプル
+        """
+        counts = self._counts(cross_tab).to_numpy(dtype=np.float32)
+        estimates = self.weights @ counts
+        totals = estimates.sum(axis=1)
+        top = estimates.argmax(axis=1)
+        shares = np.divide(estimates[np.arange(len(top)), top], totals,
+                           out=np.zeros(len(top), dtype=np.float32), where=totals > 0)
+
+        indices = np.full(self.grid.shape, -1, dtype=np.int64)
+        indices[self.grid.mask] = np.where(totals > 0, top, -1)
+        return indices, self._to_grid(shares)
+
+
+def _hex_to_rgb(color: str) -> np.ndarray:
+    color = color.lstrip("#")
+    return np.array([int(color[k:k + 2], 16) for k in (0, 2, 4)], dtype=np.uint8)
+
+
+def render_share(surface: np.ndarray, color: str, max_alpha: int = 220) -> np.ndarray:
+    """
+    割合の面を単色のRGBA画像にする（割合が高いほど不透明）
+
+    Returns:
+        形状 (行, 列, 4) の uint8 配列（ImageOverlay にそのまま渡せる）
+    """
+    image = np.zeros(surface.shape + (4,), dtype=np.uint8)
+    image[..., :3] = _hex_to_rgb(color)
+    alpha = np.nan_to_num(surface, nan=0.0).clip(0, 1) * max_alpha
+    image[..., 3] = alpha.astype(np.uint8)
+    return image
+
+
+def render_dominant(indices: np.ndarray, shares: np.ndarray, colors: list,
+                    min_alpha: int = 90, max_alpha: int = 230) -> np.ndarray:
+    """
+    最多回答の面を色分けしたRGBA画像にする（最多回答の割合が高いほど不透明）
+
+    Args:
+        indices, shares: SurfaceInterpolator.dominant_surface の結果
+        colors: 回答の列番号ごとの色（#rrggbb）
+    """
+    palette = np.array([_hex_to_rgb(color) for color in colors], dtype=np.uint8)
+    inside = indices >= 0
+    image = np.zeros(indices.shape + (4,), dtype=np.uint8)
+    image[inside, :3] = palette[indices[inside]]
+    alpha = min_alpha + (max_alpha - min_alpha) * np.nan_to_num(shares, nan=0.0).clip(0, 1)
+    image[inside, 3] = alpha[inside].astype(np.uint8)
+    return image
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+等語線（方言境界）の自動抽出
+
+隣接する市町村の回答分布を比べ、最多回答が入れ替わる境界、または
+分布の乖離（ジェンセン・シャノン距離）がしきい値を超える境界を線として出力する。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 分布の乖離を等語線とみなすしきい値（ジェンセン・シャノン距離、底2で0〜1）
+DIVERGENCE_THRESHOLD = 0.5
+
+
+def jensen_shannon_distance(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    行ごとのジェンセン・シャノン距離（底2、0〜1）
+
+    Args:
+        p, q: 形状 (m, k) の確率分布（各行の和が1）
+
+    Returns:
+        長さmの配列
+    """
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_p = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=-1)
+        kl_q = np.where(q > 0, q * np.log2(q / m), 0.0).sum(axis=-1)
+    return np.sqrt(np.clip((kl_p + kl_q) / 2, 0.0, None))
+
+
+def compute_isoglosses(cross_tab: pd.DataFrame, adjacency: dict,
+                       threshold: float = DIVERGENCE_THRESHOLD) -> dict:
+    """
+    1設問の等語線を求める
+
+    Args:
+        cross_tab: get_municipality_distribution の結果（市町村 × 回答の件数）
+        adjacency: load_adjacency の結果（辺に共有境界線 border を持つもの）
+        threshold: 分布の乖離とみなすジェンセン・シャノン距離
+
+    Returns:
+        等語線のGeoJSON FeatureCollection。各Featureは共有境界線のジオメトリと、
+        両側の市町村名・最多回答・乖離度・種別をプロパティに持つ。
+    """
+    features = []
+    if cross_tab.empty:
+        return {"type": "FeatureCollection", "features": features}
+
+    names = adjacency["municipalities"]
+    edges = [e for e in adjacency["edges"] if "border" in e
+             and names[e["i"]] in cross_tab.index and names[e["j"]] in cross_tab.index]
+    if not edges:
+        return {"type": "FeatureCollection", "features": features}
+
+    counts = cross_tab.to_numpy(dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    shares = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    dominant = counts.argmax(axis=1)
+    position = {name: k for k, name in enumerate(cross_tab.index)}
+
+    # 全辺をまとめて比較する
+    a = np.array([position[names[e["i"]]] for e in edges])
+    b = np.array([position[names[e["j"]]] for e in edges])
+    has_data = (totals[a, 0] > 0) & (totals[b, 0] > 0)
+    divergence = jensen_shannon_distance(shares[a], shares[b])
+    switched = dominant[a] != dominant[b]
+    selected = has_data & (switched | (divergence >= threshold))
+
+    answers = list(cross_tab.columns)
+    for k in np.flatnonzero(selected):
+        edge = edges[k]
+        features.append({
+            "type": "Feature",
+            "geometry": edge["border"],
+            "properties": {
+                "市町村A": names[edge["i"]],
+                "市町村B": names[edge["j"]],
+                "最多回答A": answers[dominant[a[k]]],
+                "最多回答B": answers[dominant[b[k]]],
+                "乖離度": round(float(divergence[k]), 3),
+                "種別": "最多回答の変化" if switched[k] else "分布の乖離",
+            },
+        })
+
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+地図の境界データのタイル（z/x/y の GeoJSON タイル）
+
+全国の市区町村境界を1つの GeoJSON として地図に埋め込むと重すぎるため、ズームレベルごとに簡略化した境界を
+Web メルカトルのタイル（{z}/{x}/{y}.json）に切り分けて静的ファイルとして書き出す。
+縮小したとき（MUNICIPALITY_MIN_ZOOM 未満）は都道府県の境界、拡大したときは市区町村の境界のタイルを使う。
+地図（TiledGeoJson）は表示範囲のタイルだけを読み込み、塗り色とポップアップは都道府県名・市区町村名で引く。
+
+    python map_tiles.py N03-20240101_*.shp --output static/tiles
+
+Streamlit の静的ファイル配信（.streamlit/config.toml の server.enableStaticServing）で
+static/tiles を /app/static/tiles として配信する。
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+from collections import defaultdict
+
+from gazetteer import PREFECTURES, UNASSIGNED_NAMES, n03_unit, read_n03_features
+
+# タイルの書き出し先（Streamlit の静的ファイル配信のフォルダ）
+TILE_DIR = os.path.join("static", "tiles")
+
+# 地図がタイルを読み込むURL（環境変数で配信先を変えられる）
+TILE_URL = os.environ.get("HOUGEN_TILE_URL", "/app/static/tiles")
+
+# タイルの一覧と各レイヤーのズームの範囲を書くファイル
+TILE_INDEX_FILE = "index.json"
+
+# 書き出すズームの範囲（MAX_ZOOM より拡大したときは MAX_ZOOM のタイルを拡大して使う）
+MIN_ZOOM = 4
+MAX_ZOOM = 12
+
+# このズーム以上で市区町村の境界を表示する（未満では都道府県の境界と都道府県ごとの集計）
+MUNICIPALITY_MIN_ZOOM = 8
+
+# 境界を簡略化する許容誤差（ピクセル）
+SIMPLIFY_PIXELS = 0.5
+
+# 座標を丸める細かさ（ピクセル）
+PRECISION_PIXELS = 0.125
+
+# タイルの1辺のピクセル数
+TILE_SIZE = 256
+
+# レイヤー → ズームの範囲
+LAYERS = {
+    "prefectures": (MIN_ZOOM, MUNICIPALITY_MIN_ZOOM - 1),
+    "municipalities": (MUNICIPALITY_MIN_ZOOM, MAX_ZOOM),
+}
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> tuple:
+    """
+    経度・緯度を含むタイルの番号
+
+    Returns:
+        (x, y) のタプル
+    """
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> tuple:
+    """
+    タイルの範囲
+
+    Returns:
+        (西端の経度, 南端の緯度, 東端の経度, 北端の緯度) のタプル
+    """
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def _degrees_per_pixel(zoom: int) -> float:
+    """ズームレベルでの1ピクセルの経度の幅"""
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def read_boundaries(n03_paths: list, default_prefecture: str = None) -> tuple:
+    """
+    N03 の区域を市区町村ごと・都道府県ごとにまとめる（政令指定都市の区は市にまとめる）
+
+    Args:
+        n03_paths: N03 のファイル（都道府県ごとのファイルを複数指定できる）
+        default_prefecture: 都道府県名（N03_001）のない区域の都道府県（市町村ごとにマージした GeoJSON 用）
+
+    Returns:
+        (市区町村のリスト, 都道府県のリスト) のタプル。
+        各要素は {"properties": {...}, "geometry": shapely の形状} の dict
+    """
+    from shapely import make_valid, unary_union
+    from shapely.geometry import shape
+
+    parts = defaultdict(list)
+    codes = defaultdict(set)
+    for path in n03_paths:
+        for props, geometry in read_n03_features(path):
+            prefecture, _, name = n03_unit(props)
+            prefecture = prefecture or default_prefecture
+            if name in UNASSIGNED_NAMES or not prefecture or not geometry:
+                continue
+            parts[(prefecture, name)].append(make_valid(shape(geometry)))
+            code = (props.get("N03_007") or "").strip()
+            if code:
+                codes[(prefecture, name)].add(code)
+
+    municipalities = []
+    for (prefecture, name), geometries in parts.items():
+        unit_codes = codes[(prefecture, name)]
+        municipalities.append({
+            "properties": {
+                # 政令指定都市は区ごとにコードが分かれるため、市のコードは空にする
+                "code": next(iter(unit_codes)) if len(unit_codes) == 1 else "",
+                "prefecture": prefecture,
+                "name": name,
+            },
+            "geometry": unary_union(geometries),
+        })
+
+    by_prefecture = defaultdict(list)
+    for municipality in municipalities:
+        by_prefecture[municipality["properties"]["prefecture"]].append(municipality["geometry"])
+    codes_by_name = {name: code for code, name in PREFECTURES.items()}
+    prefectures = [
+        {
+            "properties": {"code": codes_by_name.get(prefecture, ""), "name": prefecture},
+            "geometry": unary_union(geometries),
+        }
+        for prefecture, geometries in by_prefecture.items()
+    ]
+    return municipalities, prefectures
+
+
+def cut_tiles(features: list, min_zoom: int, max_zoom: int) -> dict:
+    """
+    境界をズームレベルごとに簡略化し、タイルに切り分ける
+
+    ポリゴンはタイルの境目で切れるため、塗りのポリゴン（part = "fill"）と、
+    線を引く境界線（part = "boundary"）を別の Feature にする。
+
+    Args:
+        features: read_boundaries の結果の一方
+        min_zoom: 書き出す最小のズーム
+        max_zoom: 書き出す最大のズーム
+
+    Returns:
+        (z, x, y) → Feature のリスト の辞書
+    """
+    import numpy as np
+    from shapely import clip_by_rect, transform
+    from shapely.geometry import mapping
+
+    tiles = defaultdict(list)
+    for zoom in range(min_zoom, max_zoom + 1):
+        pixel = _degrees_per_pixel(zoom)
+        # 座標の小数点以下の桁数（PRECISION_PIXELS より細かい桁は書き出さない）
+        decimals = max(0, math.ceil(-math.log10(pixel * PRECISION_PIXELS)))
+        for feature in features:
+            geometry = feature["geometry"].simplify(pixel * SIMPLIFY_PIXELS)
+            if geometry.is_empty:
+                continue
+            boundary = geometry.boundary
+            west, south, east, north = geometry.bounds
+            x_min, y_min = lonlat_to_tile(west, north, zoom)
+            x_max, y_max = lonlat_to_tile(east, south, zoom)
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    bounds = tile_bounds(zoom, x, y)
+                    for part, source in (("fill", geometry), ("boundary", boundary)):
+                        clipped = clip_by_rect(source, *bounds)
+                        if clipped.is_empty:
+                            continue
+                        clipped = transform(clipped, lambda coords: np.round(coords, decimals))
+                        tiles[(zoom, x, y)].append({
+                            "type": "Feature",
+                            "properties": {**feature["properties"], "part": part},
+                            "geometry": mapping(clipped),
+                        })
+    return tiles
+
+
+def write_tiles(n03_paths: list, output_dir: str = TILE_DIR) -> dict:
+    """
+    N03 から都道府県・市区町村の境界のタイルを作り、output_dir/{レイヤー}/{z}/{x}/{y}.json に書き出す
+
+    Args:
+        n03_paths: N03 のファイル
+        output_dir: 書き出し先（既存のタイルは消す）
+
+    Returns:
+        タイルの一覧（index.json の内容）
+    """
+    municipalities, prefectures = read_boundaries(n03_paths)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+
+    index = {"layers": {}, "bounds": None}
+    for layer, features in (("prefectures", prefectures), ("municipalities", municipalities)):
+        min_zoom, max_zoom = LAYERS[layer]
+        tiles = cut_tiles(features, min_zoom, max_zoom)
+        for (zoom, x, y), tile_features in tiles.items():
+            path = os.path.join(output_dir, layer, str(zoom), str(x), f"{y}.json")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"type": "FeatureCollection", "features": tile_features},
+                          f, ensure_ascii=False, separators=(",", ":"))
+        index["layers"][layer] = {
+            "minzoom": min_zoom,
+            "maxzoom": max_zoom,
+            "features": len(features),
+            "tiles": len(tiles),
+        }
+
+    if prefectures:
+        from shapely import unary_union
+
+        west, south, east, north = unary_union([p["geometry"] for p in prefectures]).bounds
+        index["bounds"] = [[south, west], [north, east]]
+    with open(os.path.join(output_dir, TILE_INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    return index
+
+
+def load_tile_index(tile_dir: str = TILE_DIR):
+    """タイルの一覧（タイルを書き出していなければ None）"""
+    try:
+        with open(os.path.join(tile_dir, TILE_INDEX_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# <script> の中に JSON を書くときにエスケープする文字（回答に </script> などがあってもスクリプトが途切れないようにする）
+_SCRIPT_ESCAPES = {ord("<"): "\\u003c", ord(">"): "\\u003e", ord("&"): "\\u0026",
+                   ord("\u2028"): "\\u2028", ord("\u2029"): "\\u2029"}
+
+
+def _script_json(value) -> str:
+    """<script> の中にそのまま書ける JSON の文字列"""
+    return json.dumps(value, ensure_ascii=False).translate(_SCRIPT_ESCAPES)
+
+
+def tiled_geojson(prefecture_styles: dict, municipality_styles: dict, prefecture: str, url: str = TILE_URL):
+    """
+    表示範囲のタイルだけを読み込む境界のレイヤー（folium の地図に add_to で追加する）
+
+    Args:
+        prefecture_styles: 都道府県名 → {"fillColor", "popup_content"}（縮小時に表示）
+        municipality_styles: 市区町村名 → {"fillColor", "popup_content"}（拡大時に表示）
+        prefecture: municipality_styles の市区町村の都道府県（他の都道府県の同名の市区町村は塗らない）
+        url: タイルの配信先
+
+    Returns:
+        folium の MacroElement
+    """
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    class TiledGeoJson(MacroElement):
+        _template = Template(_TILED_GEOJSON_TEMPLATE)
+
+        def __init__(self):
+            super().__init__()
+            self._name = "TiledGeoJson"
+            self.url = _script_json(url.rstrip("/"))
+            self.layers = _script_json({
+                layer: {"minNativeZoom": min_zoom, "maxNativeZoom": max_zoom}
+                for layer, (min_zoom, max_zoom) in LAYERS.items()
+            })
+            self.styles = _script_json({
+                "prefectures": prefecture_styles,
+                "municipalities": {prefecture + name: style for name, style in municipality_styles.items()},
+            })
+
+    return TiledGeoJson()
+
+
+# 地図に埋め込むスクリプト。レイヤーごとに L.GridLayer で表示範囲のタイルを求め、タイルの GeoJSON を
+# 読み込んで描画し、タイルが範囲から外れたら取り除く。都道府県のレイヤーは縮小時、市区町村のレイヤーは拡大時だけ表示する
+_TILED_GEOJSON_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this._parent.get_name() }};
+    var baseUrl = {{ this.url }};
+    var layers = {{ this.layers }};
+    var styles = {{ this.styles }};
+
+    Object.keys(layers).forEach(function(layer) {
+        var range = layers[layer];
+        var keyOf = function(props) {
+            return layer === "prefectures" ? props.name : props.prefecture + props.name;
+        };
+        // 区域 → タイルに分かれた塗りのポリゴン（マウスを乗せたときに区域全体を強調する）
+        var pieces = {};
+        var options = {
+            style: function(feature) {
+                var props = feature.properties;
+                if (props.part === "boundary") {
+                    return {color: "#ffffff", weight: 1.5, opacity: 0.8, fill: false};
+                }
+                var style = styles[layer][keyOf(props)];
+                return {fillColor: style ? style.fillColor : "#404050", fillOpacity: 0.75, stroke: false};
+            },
+            onEachFeature: function(feature, shape) {
+                var props = feature.properties;
+                if (props.part !== "fill") { return; }
+                var key = keyOf(props);
+                var style = styles[layer][key];
+                (pieces[key] = pieces[key] || []).push(shape);
+                shape.bindPopup(style ? style.popup_content : "<b>" + props.name + "</b>", {maxWidth: 300});
+                shape.on("mouseover", function() {
+                    pieces[key].forEach(function(piece) {
+                        piece.setStyle({fillColor: "#4ecdc4", fillOpacity: 0.95});
+                    });
+                });
+                shape.on("mouseout", function() {
+                    pieces[key].forEach(function(piece) { piece._tileShapes.resetStyle(piece); });
+                });
+            }
+        };
+
+        var Grid = L.GridLayer.extend({
+            createTile: function(coords, done) {
+                var tile = document.createElement("div");
+                fetch(baseUrl + "/" + layer + "/" + coords.z + "/" + coords.x + "/" + coords.y + ".json")
+                    .then(function(response) { return response.ok ? response.json() : null; })
+                    .then(function(data) {
+                        if (data && !tile._unloaded) {
+                            var shapes = L.geoJSON(null, options);
+                            shapes.addData(data);
+                            shapes.eachLayer(function(shape) { shape._tileShapes = shapes; });
+                            tile._shapes = shapes.addTo(map);
+                        }
+                        done(null, tile);
+                    })
+                    .catch(function(error) { done(error, tile); });
+                return tile;
+            }
+        });
+        var grid = new Grid({
+            minZoom: layer === "prefectures" ? 0 : range.minNativeZoom,
+            maxZoom: layer === "prefectures" ? range.maxNativeZoom : 22,
+            minNativeZoom: range.minNativeZoom,
+            maxNativeZoom: range.maxNativeZoom,
+            updateWhenZooming: false,
+            keepBuffer: 1
+        });
+        grid.on("tileunload", function(event) {
+            var shapes = event.tile._shapes;
+            event.tile._unloaded = true;
+            if (!shapes) { return; }
+            shapes.eachLayer(function(shape) {
+                var key = keyOf(shape.feature.properties);
+                if (pieces[key]) {
+                    pieces[key] = pieces[key].filter(function(piece) { return piece !== shape; });
+                }
+            });
+            map.removeLayer(shapes);
+        });
+        grid.addTo(map);
+    });
+})();
+{% endmacro %}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N03 から都道府県・市区町村の境界のタイルを書き出す")
+    parser.add_argument("n03", nargs="+", help="N03 のファイル（.shp / .zip / .geojson）")
+    parser.add_argument("--output", default=TILE_DIR, help="書き出し先のフォルダ（既存のタイルは消す）")
+    args = parser.parse_args()
+
+    index = write_tiles(args.n03, args.output)
+    for layer, info in index["layers"].items():
+        print(f"  {layer:<15} z{info['minzoom']}-{info['maxzoom']}  {info['features']}区域  {info['tiles']}タイル")
+    print(f"{args.output} に書き出しました")
+
+
+if __name__ == "__main__":
+    main()
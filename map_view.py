@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+地図の表示データ
+
+市町村 × 回答の件数から、地図に表示する最多回答の表と、塗り色・ポップアップを注入した
+市町村ポリゴンを組み立てる。ダッシュボード（app.py）とバッチ処理（batch_report.py）で共通に使う。
+"""
+
+import pandas as pd
+
+from municipalities import HOME_PREFECTURE, MUNICIPALITIES, get_coordinates
+
+# カラーパレット（プロット用、上位の回答から順に割り当てる）
+YAMAGATA_COLORS = [
+    "#E95464",  # 韓紅 (Karakurenai) - 鮮やかな赤
+    "#F4A460",  # 洒落柿 (Sharegaki) - 洗練されたオレンジ
+    "#8B4F35",  # 煉瓦色 (Rengairo) - 落ち着いた赤茶
+    "#2F5D50",  # 老竹色 (Oitakeiro) - 深い緑
+    "#91B493",  # 白緑 (Byakuroku) - 淡い緑
+    "#4B6584",  # 鉄御納戸 (Tetsuonando) - グレイッシュな青
+    "#A5B2C6",  # 藤鼠 (Fujinezu) - 紫がかったグレー
+    "#D7C4BB",  # 亜麻色 (Amairo) - ベージュ
+    "#E6C35C",  # 黄金 (Kogane) - 上品なゴールド
+    "#7B5544",  # 栗色 (Kuriiro) - ダークブラウン
+    "#6FA0B6",  # 錆浅葱 (Sabiasagi) - くすんだ青緑
+    "#C08EAF",  # 長春色 (Choshuniro) - 落ち着いたピンク
+    "#766C5B",  # 利休茶 (Rikyucha) - 緑がかった茶色
+    "#3A4F52",  # 鉄色 (Tetsuiro) - 非常に濃い青緑
+    "#BDBDB8",  # 潤色 (Urumiiro) - ウォームグレー
+]
+
+# パレットに入らない回答の色
+OTHER_COLOR = "#808080"
+
+# 回答のない市町村の色
+NO_DATA_COLOR = "#404050"
+
+
+def build_color_map(top_answers: list) -> dict:
+    """
+    回答に色を割り当てる（件数の多い順にパレットの色、パレットを使い切ったらグレー）
+
+    Args:
+        top_answers: 件数の降順に並べた回答
+
+    Returns:
+        回答 → 色（Hex）の辞書
+    """
+    return {
+        answer: YAMAGATA_COLORS[i] if i < len(YAMAGATA_COLORS) else OTHER_COLOR
+        for i, answer in enumerate(top_answers)
+    }
+
+
+def build_map_table(map_dist: pd.DataFrame) -> pd.DataFrame:
+    """
+    地図に表示する市町村ごとの最多回答・上位3回答・ラベルの座標
+
+    Args:
+        map_dist: 市町村 × 回答の件数
+
+    Returns:
+        市町村, 最も多い方言, 回答数, 総回答数, 割合, 上位回答, 緯度, 経度 のDataFrame
+    """
+    map_data = []
+    for city in map_dist.index:
+        row = map_dist.loc[city]
+        if row.sum() == 0:
+            continue
+
+        # 最も多い回答を取得
+        top_answer = row.idxmax()
+        count = row[top_answer]
+        total = row.sum()
+        ratio = count / total
+
+        # 上位3回答の詳細を作成
+        sorted_answers = row[row > 0].sort_values(ascending=False).head(3)
+        top3_details = []
+        for ans, cnt in sorted_answers.items():
+            pct = cnt / total * 100
+            top3_details.append(f"{ans}: {pct:.0f}%")
+        top3_str = " / ".join(top3_details)
+
+        map_data.append({
+            "市町村": city,
+            "最も多い方言": top_answer,
+            "回答数": count,
+            "総回答数": total,
+            "割合": f"{ratio:.1%}",
+            "上位回答": top3_str,
+        })
+
+    df_map_viz = pd.DataFrame(map_data, columns=["市町村", "最も多い方言", "回答数", "総回答数", "割合", "上位回答"])
+
+    # 座標情報を追加（ラベル表示用）
+    # 緯度経度が取得できない（Noneの）場合はその行を除外
+    coords_mask = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[0] is not None)
+    df_map_viz = df_map_viz[coords_mask].copy()
+
+    if not df_map_viz.empty:
+        df_map_viz["緯度"] = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[0]).astype(float)
+        df_map_viz["経度"] = df_map_viz["市町村"].apply(lambda x: get_coordinates(x)[1]).astype(float)
+    return df_map_viz
+
+
+def build_map_styles(map_dist: pd.DataFrame, df_map_viz: pd.DataFrame,
+                     base_color_map: dict, dominant_intervals: pd.DataFrame) -> dict:
+    """
+    市町村ごとの塗り色とポップアップ
+
+    Args:
+        map_dist: 市町村 × 回答の件数
+        df_map_viz: build_map_table の結果
+        base_color_map: 回答 → 色
+        dominant_intervals: 市町村名をインデックスとする最多回答の割合の信用区間
+
+    Returns:
+        市町村名 → {"fillColor": 色, "popup_content": ポップアップのHTML} の辞書
+    """
+    # 市町村ごとの最多回答の色を準備
+    municipality_colors = {}  # 市町村名 -> 色
+    for city in map_dist.index:
+        row = map_dist.loc[city]
+        total = row.sum()
+        if total == 0:
+            continue
+
+        # 最も多い回答を取得
+        top_answer = row.idxmax()
+        color = base_color_map.get(top_answer, "#808080")
+        municipality_colors[city] = color
+
+    # ツールチップ用のデータを準備
+    tooltip_data = {}
+    for _, row in df_map_viz.iterrows():
+        city = row['市町村']
+        tooltip_data[city] = {
+            'top_ans': row['最も多い方言'],
+            'top3_str': row['上位回答'],
+            'total_count': row['総回答数']
+        }
+        if city in dominant_intervals.index:
+            interval = dominant_intervals.loc[city]
+            tooltip_data[city]['interval_str'] = (
+                f"{interval['割合']:.0%}（95%区間 {interval['下限']:.0%}〜{interval['上限']:.0%}）"
+            )
+            if not interval['区別可能']:
+                tooltip_data[city]['warning'] = (
+                    f"2番目の「{interval['2番目の方言']}」と統計的に区別できません"
+                )
+
+    styles = {}
+    for city_name in {**municipality_colors, **tooltip_data}:
+        tip_info = tooltip_data.get(city_name, {})
+
+        # ツールチップ/ポップアップHTMLの構築
+        if tip_info:
+            html_content = f"""
+            <div style="font-family: sans-serif; font-size: 14px; padding: 5px; min-width: 200px;">
+                <b style="font-size: 16px;">{city_name}</b><br>
+                <hr style="margin: 5px 0; border-color: #ccc;">
+                <b>最多回答:</b> {tip_info.get('top_ans', 'N/A')}<br>
+                <b>割合:</b> {tip_info.get('interval_str', 'N/A')}<br>
+                <b>詳細:</b> {tip_info.get('top3_str', 'N/A')}<br>
+                <b>回答数:</b> {tip_info.get('total_count', 0)}件
+                {f"<br><span style='color: #c41e3a;'>⚠️ {tip_info['warning']}</span>" if 'warning' in tip_info else ""}
+            </div>
+            """
+        else:
+            html_content = f"<b>{city_name}</b>"
+        styles[city_name] = {
+            "fillColor": municipality_colors.get(city_name, NO_DATA_COLOR),
+            "popup_content": html_content,
+        }
+    return styles
+
+
+def home_prefecture_distribution(map_dist: pd.DataFrame) -> tuple:
+    """
+    対象県の市町村 × 回答の件数を対象県1行にまとめる（期間を指定したときなど、都道府県ごとの集計がないとき用）
+
+    Returns:
+        (都道府県 × 回答の件数, 都道府県 → 回答のあった市町村数) のタプル
+    """
+    home = map_dist[map_dist.index.isin(list(MUNICIPALITIES))]
+    prefecture_dist = home.sum().to_frame(HOME_PREFECTURE).T
+    prefecture_dist.index.name = "都道府県"
+    return prefecture_dist, {HOME_PREFECTURE: int((home.sum(axis=1) > 0).sum())}
+
+
+def build_prefecture_styles(prefecture_dist: pd.DataFrame, base_color_map: dict, municipality_counts: dict = None) -> dict:
+    """
+    都道府県ごとに集計した塗り色とポップアップ（地図を縮小したときに表示する）
+
+    Args:
+        prefecture_dist: 都道府県 × 回答の件数（get_prefecture_distribution の結果）
+        base_color_map: 回答 → 色
+        municipality_counts: 都道府県 → 回答のあった市町村数（ある都道府県だけポップアップに書く）
+
+    Returns:
+        都道府県名 → {"fillColor": 色, "popup_content": ポップアップのHTML} の辞書
+    """
+    totals = prefecture_dist[prefecture_dist.index != ""]
+    municipality_counts = municipality_counts or {}
+
+    styles = {}
+    for prefecture, row in totals.iterrows():
+        total = row.sum()
+        if total == 0:
+            continue
+        top_answer = row.idxmax()
+        top3_str = " / ".join(
+            f"{answer}: {count / total:.0%}"
+            for answer, count in row[row > 0].sort_values(ascending=False).head(3).items()
+        )
+        count_str = f"（{municipality_counts[prefecture]}市町村）" if prefecture in municipality_counts else ""
+        styles[prefecture] = {
+            "fillColor": base_color_map.get(top_answer, OTHER_COLOR),
+            "popup_content": f"""
+            <div style="font-family: sans-serif; font-size: 14px; padding: 5px; min-width: 200px;">
+                <b style="font-size: 16px;">{prefecture}</b><br>
+                <hr style="margin: 5px 0; border-color: #ccc;">
+                <b>最多回答:</b> {top_answer}<br>
+                <b>詳細:</b> {top3_str}<br>
+                <b>回答数:</b> {int(total)}件{count_str}
+            </div>
+            """,
+        }
+    return styles
+
+
+def build_map_features(geojson: dict, map_dist: pd.DataFrame, df_map_viz: pd.DataFrame,
+                       base_color_map: dict, dominant_intervals: pd.DataFrame) -> list:
+    """
+    市町村ポリゴンに塗り色とポップアップを注入する
+
+    Args:
+        geojson: get_geojson の結果（Feature のプロパティを書き換える）
+        map_dist: 市町村 × 回答の件数
+        df_map_viz: build_map_table の結果
+        base_color_map: 回答 → 色
+        dominant_intervals: 市町村名をインデックスとする最多回答の割合の信用区間
+
+    Returns:
+        プロパティに fillColor と popup_content を持つ Feature のリスト
+    """
+    styles = build_map_styles(map_dist, df_map_viz, base_color_map, dominant_intervals)
+
+    # GeoJsonデータの構築（プロパティ注入）
+    processed_features = []
+
+    for feature in geojson['features']:
+        props = feature['properties']
+        city_name = props.get('N03_004')
+
+        # 該当なしの場合はスキップまたはデフォルト表示
+        if not city_name:
+            continue
+
+        style = styles.get(city_name, {"fillColor": NO_DATA_COLOR, "popup_content": f"<b>{city_name}</b>"})
+
+        # プロパティに情報を注入
+        feature['properties']['fillColor'] = style["fillColor"]
+        feature['properties']['popup_content'] = style["popup_content"]
+        processed_features.append(feature)
+
+    return processed_features
@@ -3,6 +3,11 @@
 山形県35市町村のデータ定義と名寄せロジック
 """
 
+import os
+from functools import lru_cache
+
+from gazetteer import HISTORY_FILE, Gazetteer, read_history
+
 # 山形県の市町村リスト（35市町村）と代表緯度経度
 MUNICIPALITIES = {
     # 村山地方（13市町村）
@@ -85,100 +90,198 @@ HIRAGANA_TO_KANJI = {
     "しょうないまち": "庄内町", "ゆざまち": "遊佐町"
 }
 
-def extract_municipality(location_text: str) -> str:
+# 調査の対象県（同名の市町村を区別できないときはこの県の市町村とみなす）
+HOME_PREFECTURE = "山形県"
+
+# 全国の市区町村辞書（gazetteer.py で N03 から生成する。コードと一緒に置くため、このファイルの場所から探す）
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json")
+
+# 合併の経緯の表（辞書ファイルがないときに使う）
+MUNICIPAL_HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), HISTORY_FILE)
+_gazetteer = None
+
+# 名寄せ結果をキャッシュする住所テキストの数
+EXTRACT_CACHE_SIZE = 65536
+
+# 名寄せで使った規則（resolve_location が返す整数コード）
+RULE_EMPTY = 0              # 空欄
+RULE_KANJI = 1              # 市町村名（漢字）
+RULE_READING = 2            # 市町村名の読み（ひらがな）
+RULE_FORMER = 3             # 旧市町村・地区名（承継先に変換）
+RULE_REGION = 4             # 地域名のみ（市町村を特定できない）
+RULE_OTHER_PREFECTURE = 5   # 他の都道府県・その市区町村
+RULE_OUTSIDE_KEYWORD = 6    # 県外キーワード
+RULE_UNMATCHED = 7          # どの規則にも当たらない
+RULE_POINT = 8              # 回答地点の座標（境界ポリゴン）
+
+# 「ルーツ」から判定したときに規則のコードに足すフラグ
+RULE_ROOTS = 16
+
+# 規則のコード → 表示名
+RESOLUTION_RULES = {
+    RULE_EMPTY: "空欄",
+    RULE_KANJI: "漢字",
+    RULE_READING: "ひらがな",
+    RULE_FORMER: "旧市町村・地区名",
+    RULE_REGION: "地域名のみ",
+    RULE_OTHER_PREFECTURE: "他の都道府県",
+    RULE_OUTSIDE_KEYWORD: "県外キーワード",
+    RULE_UNMATCHED: "該当なし",
+    RULE_POINT: "回答地点の座標",
+}
+
+
+def get_gazetteer(reload: bool = False) -> Gazetteer:
     """
-    住所テキストから市町村名を抽出する名寄せ関数
-    
+    市区町村辞書を読み込む（プロセスごとに1回だけ読み、ファイルがなければ山形県35市町村と合併の経緯の表から作る）
+
     Args:
-        location_text: 「現在お住まいの場所」カラムの値
-        
+        reload: 辞書ファイルを読み直すか（辞書を作り直した後に使う）
+
     Returns:
-        市町村名、または「県外/不明」
+        Gazetteer
     """
-    if not location_text or not isinstance(location_text, str):
-        return "県外/不明"
-        
-    # 平仮名の正規化（長音等はそのまま）
-    # まず長い市町村名（漢字）からマッチを試みる
-    for municipality in MUNICIPALITY_NAMES:
-        if municipality in location_text:
-            return municipality
-            
-    # 平仮名での完全一致または部分一致チェック
-    # "やまがたし" などが含まれているかをチェック
-    for hira, kanji in HIRAGANA_TO_KANJI.items():
-        if hira in location_text:
-            return kanji
-    
-    # 旧地域名から現在の市町村への変換
-    old_name_mapping = {
-        # 鶴岡市の旧町村
-        "温海": "鶴岡市",
-        "あつみ": "鶴岡市",
-        "藤島": "鶴岡市",
-        "羽黒": "鶴岡市",
-        "櫛引": "鶴岡市",
-        "朝日": "鶴岡市",  # 鶴岡市朝日地域
-        "湯野浜": "鶴岡市",
-        "大山": "鶴岡市",
-        "由良": "鶴岡市",
-        "越沢": "鶴岡市",
-        
-        # 酒田市の旧町村
-        "平田": "酒田市",
-        "松山": "酒田市",
-        "八幡": "酒田市",
-        "本楯": "酒田市",
-        
-        # 庄内町の旧町
-        "余目": "庄内町",
-        "立川": "庄内町",
-    }
-    
-    for old_name, new_municipality in old_name_mapping.items():
-        if old_name in location_text:
-            return new_municipality
-    
+    global _gazetteer
+    if _gazetteer is None or reload:
+        try:
+            _gazetteer = Gazetteer.load(GAZETTEER_FILE, HOME_PREFECTURE)
+        except FileNotFoundError:
+            readings = {}
+            for hira, kanji in HIRAGANA_TO_KANJI.items():
+                readings.setdefault(kanji, []).append(hira)
+            entries = [
+                {"code": "", "prefecture": HOME_PREFECTURE, "county": "", "name": name, "readings": readings.get(name, [])}
+                for name in MUNICIPALITIES
+            ]
+            former = read_history(MUNICIPAL_HISTORY_FILE) if os.path.exists(MUNICIPAL_HISTORY_FILE) else []
+            _gazetteer = Gazetteer(entries, home_prefecture=HOME_PREFECTURE, former=former)
+        _resolve_place.cache_clear()
+    return _gazetteer
+
+
+@lru_cache(maxsize=EXTRACT_CACHE_SIZE)
+def _resolve_place(location_text: str) -> tuple:
+    # 市区町村辞書で都道府県・市区町村（漢字・読み）と旧市町村・地区（承継先に変換）を照合する
+    match = get_gazetteer().resolve(location_text)
+    if match is not None and match.prefecture != HOME_PREFECTURE:
+        # 他の都道府県の市区町村・都道府県名（全国の集計用に都道府県・市区町村・コードを残す）
+        return "県外/不明", RULE_OTHER_PREFECTURE, match.prefecture, match.municipality or "", match.code or ""
+    if match is not None and match.municipality in MUNICIPALITIES:
+        if match.former is not None:
+            rule = RULE_FORMER
+        else:
+            rule = RULE_KANJI if match.pattern == match.municipality else RULE_READING
+        return match.municipality, rule, HOME_PREFECTURE, match.municipality, match.code or ""
+
     # 山形県内の地域名のみのマッチ
     region_keywords = ["村山", "最上", "置賜", "庄内"]
     for region in region_keywords:
         if region in location_text:
             # 地域名だけでは市町村を特定できないので、不明扱い
-            return "県外/不明"
+            return "県外/不明", RULE_REGION, HOME_PREFECTURE, "", ""
     
+    # 県名だけが分かったとき（「山形県」など）は都道府県を残す
+    prefecture = match.prefecture if match is not None else ""
+
     # 他県名や県外キーワードの検出
     outside_keywords = ["東京", "神奈川", "宮城", "秋田", "岩手", "福島", "新潟", 
                         "北海道", "埼玉", "千葉", "大阪", "愛知", "県外"]
     for keyword in outside_keywords:
         if keyword in location_text:
-            return "県外/不明"
+            return "県外/不明", RULE_OUTSIDE_KEYWORD, prefecture, "", ""
     
-    return "県外/不明"
+    return "県外/不明", RULE_UNMATCHED, prefecture, "", ""
 
 
-def get_coordinates(municipality: str) -> tuple:
+def resolve_place(location_text: str) -> tuple:
+    """
+    住所テキストから全国の都道府県・市区町村と、判定に使った規則を求める
+
+    対象県以外の市区町村も「県外/不明」にまとめず、辞書の都道府県・市区町村・団体コードを返す。
+    結果は resolve_location と同じキャッシュを使う。
+
+    Args:
+        location_text: 「現在お住まいの場所」「ルーツ」カラムの値
+
+    Returns:
+        (都道府県, 市区町村, 団体コード, 規則のコード RULE_*) のタプル（分からない項目は空文字）
+    """
+    if not location_text or not isinstance(location_text, str):
+        return "", "", "", RULE_EMPTY
+    _, rule, prefecture, municipality, code = _resolve_place(location_text)
+    return prefecture, municipality, code, rule
+
+
+def resolve_location(location_text: str) -> tuple:
+    """
+    住所テキストから市町村名と、判定に使った規則を求める
+
+    結果は住所テキストごとにキャッシュするため、同じ回答が何度現れても照合は1回だけになる。
+
+    Args:
+        location_text: 「現在お住まいの場所」「ルーツ」カラムの値
+
+    Returns:
+        (市町村名または「県外/不明」, 規則のコード RULE_*) のタプル
+    """
+    if not location_text or not isinstance(location_text, str):
+        return "県外/不明", RULE_EMPTY
+    return _resolve_place(location_text)[:2]
+
+
+def extract_municipality(location_text: str) -> str:
+    """
+    住所テキストから市町村名を抽出する名寄せ関数
+
+    Args:
+        location_text: 「現在お住まいの場所」カラムの値
+        
+    Returns:
+        市町村名、または「県外/不明」
+    """
+    return resolve_location(location_text)[0]
+
+
+def get_coordinates(municipality: str, prefecture: str = HOME_PREFECTURE) -> tuple:
     """
     市町村名から緯度経度を取得
-    
+
+    対象県の市町村は MUNICIPALITIES の代表点、他の都道府県の市区町村（市区町村が空なら都道府県）は
+    市区町村辞書の代表点を使う。
+
+    Args:
+        municipality: 市町村名
+        prefecture: 都道府県（省略時は対象県）
+
     Returns:
         (lat, lon) のタプル。存在しない場合は (None, None)
     """
-    if municipality in MUNICIPALITIES:
+    if prefecture == HOME_PREFECTURE and municipality in MUNICIPALITIES:
         data = MUNICIPALITIES[municipality]
         return (data["lat"], data["lon"])
+    if prefecture and prefecture != HOME_PREFECTURE:
+        place = get_gazetteer().place(prefecture, municipality)
+        if place is not None and "lat" in place:
+            return (place["lat"], place["lon"])
     return (None, None)
 
 
-def get_region(municipality: str) -> str:
+def get_region(municipality: str, prefecture: str = HOME_PREFECTURE) -> str:
     """
     市町村名から地域名を取得
-    
+
+    Args:
+        municipality: 市町村名
+        prefecture: 都道府県（省略時は対象県）
+
     Returns:
-        地域名（村山/最上/置賜/庄内）、または「不明」
+        対象県の市町村は地域名（村山/最上/置賜/庄内）、他の都道府県は都道府県名、分からなければ「不明」
     """
-    if municipality in MUNICIPALITIES:
-        return MUNICIPALITIES[municipality]["region"]
-    return "不明"
+    if prefecture == HOME_PREFECTURE:
+        if municipality in MUNICIPALITIES:
+            return MUNICIPALITIES[municipality]["region"]
+        return "不明"
+    return prefecture or "不明"
 
 
 if __name__ == "__main__":
@@ -194,11 +297,17 @@ if __name__ == "__main__":
         "藤島",
         "やまがたし",
         "つるおかし",
+        "奈良県川西町",
+        "福島県川西町",
+        "富山県朝日町",
+        "山形県川西町",
+        "西置賜郡白鷹町",
         "",
         None,
     ]
     
     print("名寄せテスト結果:")
     for test in test_cases:
-        result = extract_municipality(test)
-        print(f"  {test!r} -> {result}")
+        result, rule = resolve_location(test)
+        prefecture, municipality, code, _ = resolve_place(test)
+        print(f"  {test!r} -> {result}（{RESOLUTION_RULES[rule]}）  全国: {prefecture}{municipality} {code}")
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+座標（GPS・地図のクリック位置）から市区町村を求める点ジオコーダ
+
+N03 の境界ポリゴンを STRtree（外接矩形の R 木）に入れ、多数の点をまとめて照合する。
+点の配列を1回の query で外接矩形の候補に絞り、市区町村ごとに候補の点が準備済みのポリゴンに
+含まれるかをまとめて調べるため、点ごとに Python のループを回さない。
+
+    python point_geocoder.py --points 1000000   # 照合の速さを測る
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from adjacency import GEOJSON_FILE
+from municipalities import HOME_PREFECTURE
+
+_point_geocoder = None
+_point_geocoder_path = None
+
+
+class PointGeocoder:
+    """
+    市区町村の境界ポリゴンによる点の照合器
+
+    Args:
+        features: [{"properties": {"code", "prefecture", "name"}, "geometry": shapely の形状}, ...]
+            （map_tiles.read_boundaries の市区町村のリスト）
+    """
+
+    def __init__(self, features: list):
+        import shapely
+        from shapely.strtree import STRtree
+
+        self.codes = np.array([f["properties"].get("code", "") for f in features], dtype=object)
+        self.prefectures = np.array([f["properties"]["prefecture"] for f in features], dtype=object)
+        self.names = np.array([f["properties"]["name"] for f in features], dtype=object)
+        geometries = np.array([f["geometry"] for f in features], dtype=object)
+        shapely.prepare(geometries)
+        self._geometries = geometries
+        self._tree = STRtree(geometries)
+
+    def locate(self, lons, lats) -> np.ndarray:
+        """
+        点を含む市区町村の番号
+
+        境界線上の点のように複数のポリゴンに含まれる点は、番号の小さい市区町村にする。
+
+        Args:
+            lons: 経度の配列
+            lats: 緯度の配列
+
+        Returns:
+            市区町村の番号の配列（どの市区町村にも含まれない点・欠損値は -1）
+        """
+        import shapely
+
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        result = np.full(len(lons), -1, dtype=np.int64)
+        valid = np.flatnonzero(np.isfinite(lons) & np.isfinite(lats))
+        if len(valid) == 0:
+            return result
+
+        x, y = lons[valid], lats[valid]
+        # 1. 外接矩形で候補の組（点, 市区町村）に絞る
+        point_index, polygon_index = self._tree.query(shapely.points(x, y))
+        # 2. 市区町村ごとに、候補の点がポリゴン（準備済み）に含まれるかをまとめて調べる
+        order = np.argsort(polygon_index, kind="stable")
+        point_index, polygon_index = point_index[order], polygon_index[order]
+        starts = np.flatnonzero(np.r_[True, polygon_index[1:] != polygon_index[:-1]])
+        inside = np.zeros(len(point_index), dtype=bool)
+        for start, end in zip(starts, np.r_[starts[1:], len(point_index)]):
+            candidates = point_index[start:end]
+            inside[start:end] = shapely.intersects_xy(self._geometries[polygon_index[start]], x[candidates], y[candidates])
+        # 同じ点の組は番号の大きい順に書き込み、最後に書く番号の小さい市区町村を残す
+        point_index, polygon_index = point_index[inside], polygon_index[inside]
+        order = np.lexsort((-polygon_index, point_index))
+        result[valid[point_index[order]]] = polygon_index[order]
+        return result
+
+    def municipality_names(self, lons, lats, missing: str = "") -> np.ndarray:
+        """
+        点を含む市区町村名
+
+        Returns:
+            市区町村名の配列（どの市区町村にも含まれない点は missing）
+        """
+        numbers = self.locate(lons, lats)
+        names = np.full(len(numbers), missing, dtype=object)
+        found = numbers >= 0
+        names[found] = self.names[numbers[found]]
+        return names
+
+    @classmethod
+    def from_n03(cls, paths: list, default_prefecture: str = None) -> "PointGeocoder":
+        """N03 のファイル（または市区町村ごとにマージした GeoJSON）から作る"""
+        from map_tiles import read_boundaries
+
+        municipalities, _ = read_boundaries(paths, default_prefecture)
+        return cls(municipalities)
+
+
+def load_point_geocoder(path: str = GEOJSON_FILE, reload: bool = False):
+    """
+    点ジオコーダを読み込む（プロセスごとに1回だけ作り、境界データがなければ None）
+
+    Args:
+        path: 境界ポリゴンのファイル（N03 または市区町村ごとにマージした GeoJSON）
+        reload: 境界データを読み直すか
+
+    Returns:
+        PointGeocoder、または None
+    """
+    global _point_geocoder, _point_geocoder_path
+    if _point_geocoder is None or reload or path != _point_geocoder_path:
+        try:
+            _point_geocoder = PointGeocoder.from_n03([path], HOME_PREFECTURE)
+        except FileNotFoundError:
+            _point_geocoder = None
+        _point_geocoder_path = path
+    return _point_geocoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点ジオコーダの照合の速さを測る")
+    parser.add_argument("--boundaries", default=GEOJSON_FILE, help="境界ポリゴンのファイル")
+    parser.add_argument("--points", type=int, default=1_000_000, help="照合する点の数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    geocoder = load_point_geocoder(args.boundaries)
+    if geocoder is None:
+        raise FileNotFoundError(f"{args.boundaries} が見つかりません")
+    print(f"索引の構築: {time.perf_counter() - start:.2f}s（{len(geocoder.names)}区域）")
+
+    # 境界ポリゴンの外接矩形の中に一様に点を置く
+    import shapely
+
+    west, south, east, north = shapely.total_bounds(geocoder._geometries)
+    rng = np.random.default_rng(args.seed)
+    lons = rng.uniform(west, east, args.points)
+    lats = rng.uniform(south, north, args.points)
+
+    start = time.perf_counter()
+    numbers = geocoder.locate(lons, lats)
+    seconds = time.perf_counter() - start
+    print(f"{args.points}点: {seconds:.2f}s（{args.points / seconds:,.0f}点/秒、"
+          f"市区町村の中の点 {np.mean(numbers >= 0):.1%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+ダッシュボードの再実行（rerun）のベンチマーク
+
+Streamlit の AppTest で app.main() をヘッドレスに実行し、設問・地域・市町村の選択を
+すべて順に切り替えて、操作ごとの再実行にかかる時間とピークメモリ（RSS）を測る。
+メモリは別スレッドで RSS を一定間隔で読んで求める（tracemalloc は再実行が10倍ほど遅くなるため使わない）。
+データは synthetic_survey.py の合成データをローカルのHTTPサーバーから配信する。
+
+    python rerun_benchmark.py --rows 100k --output rerun.json
+
+地図の描画まで測るには、カレントディレクトリに yamagata_municipalities.geojson が必要。
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmark import LocalServer
+from data_processor import QUESTION_LABELS
+from municipalities import MUNICIPALITIES, REGIONS
+from synthetic_survey import parse_size, write_survey
+
+# 1回の再実行のタイムアウト（秒）
+RERUN_TIMEOUT = 600
+
+# RSS を読む間隔（秒）
+RSS_SAMPLE_INTERVAL = 0.01
+
+# 操作するウィジェットのラベル
+QUESTION_SELECT = "分析する設問を選択"
+REGION_SELECT = "地域を選択"
+MUNICIPALITY_SELECT = "自由記入欄を見る市町村"
+
+# AppTest で実行するスクリプト（データの取得先をローカルのサーバーに差し替えて main を呼ぶ）
+_SCRIPT = """
+import sys
+sys.path.insert(0, {repo!r})
+import data_processor
+data_processor.SPREADSHEET_URLS.clear()
+data_processor.SPREADSHEET_URLS.update({{"benchmark": {url!r}}})
+import app
+app.main()
+"""
+
+
+def interactions() -> list:
+    """
+    再実行を起こす操作の一覧
+
+    Returns:
+        [(操作の種類, ウィジェットのラベル, 値), ...] のリスト
+    """
+    steps = [("question", QUESTION_SELECT, label) for label in QUESTION_LABELS.values()]
+    steps += [("region", REGION_SELECT, region) for region in ["すべて", *REGIONS]]
+    steps.append(("region", REGION_SELECT, "すべて"))
+    steps += [("municipality", MUNICIPALITY_SELECT, name) for name in MUNICIPALITIES]
+    return steps
+
+
+def _rss_bytes() -> int:
+    """現在の RSS（Linux 以外では生涯のピーク RSS）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class PeakRSS:
+    """
+    with ブロックの間の RSS の最大値を別スレッドで測る
+
+    Attributes:
+        start_mb: 開始時の RSS（MB）
+        peak_mb: ブロック中の RSS の最大値（MB）
+    """
+
+    def __enter__(self):
+        self._stop = threading.Event()
+        self.start_mb = self.peak_mb = _rss_bytes() / 1024 / 1024
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_mb = max(self.peak_mb, _rss_bytes() / 1024 / 1024)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, _rss_bytes() / 1024 / 1024)
+        return False
+
+
+def _selectbox(at: AppTest, label: str):
+    return next(widget for widget in at.selectbox if widget.label == label)
+
+
+def _check(at: AppTest, description: str):
+    """スクリプトが例外で止まっていないか確認する"""
+    if at.exception:
+        raise RuntimeError(f"{description} で例外が発生しました: {at.exception[0].value}")
+
+
+def run_session(url: str) -> list:
+    """
+    初回実行とすべての操作を1つのセッションで行い、再実行ごとの時間とピークメモリを測る
+
+    Args:
+        url: 合成データのURL
+
+    Returns:
+        再実行ごとの結果（dict）のリスト
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    at = AppTest.from_string(_SCRIPT.format(repo=repo, url=url), default_timeout=RERUN_TIMEOUT)
+    results = []
+
+    def measure(kind, label, value, action):
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            action()
+            seconds = time.perf_counter() - start
+        _check(at, f"{label}={value}")
+        results.append({
+            "interaction": kind, "widget": label, "value": value, "seconds": seconds,
+            "peak_mb": rss.peak_mb, "delta_mb": rss.peak_mb - rss.start_mb,
+        })
+        print(f"  {kind:<13} {str(value):<14} {seconds:8.3f}s  peak {rss.peak_mb:8.1f} MB"
+              f" (+{rss.peak_mb - rss.start_mb:.1f})", flush=True)
+
+    measure("initial", None, None, at.run)
+    for kind, label, value in interactions():
+        widget = _selectbox(at, label)
+        if value not in widget.options:
+            continue
+        measure(kind, label, value, lambda: widget.set_value(value).run())
+    return results
+
+
+def summarize(results: list) -> dict:
+    """操作の種類ごとの再実行時間の分布（中央値・90パーセンタイル・最大）と、ピーク RSS・再実行中の増加量の最大"""
+    frame = pd.DataFrame(results)
+    summary = {}
+    for kind, group in frame.groupby("interaction", sort=False):
+        seconds = group["seconds"].to_numpy()
+        summary[kind] = {
+            "count": len(seconds),
+            "median": float(np.median(seconds)),
+            "p90": float(np.percentile(seconds, 90)),
+            "max": float(seconds.max()),
+            "peak_mb": float(group["peak_mb"].max()),
+            "max_delta_mb": float(group["delta_mb"].max()),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ダッシュボードの再実行時間とメモリを測る")
+    parser.add_argument("--rows", default="100k", help="合成データの行数（1k / 100k / 1m または整数）")
+    parser.add_argument("--data-dir", default="bench_data", help="合成データの保存先")
+    parser.add_argument("--output", default="rerun_results.json", help="結果のJSONファイル")
+    args = parser.parse_args()
+
+    n_rows = parse_size(args.rows)
+    path = write_survey(n_rows, args.data_dir)
+    output = {
+        "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "streamlit": st.__version__,
+            "pandas": pd.__version__,
+        },
+        "rows": n_rows,
+    }
+
+    with LocalServer(args.data_dir) as server:
+        # キャッシュが空の状態から始める（初回の実行がワーカー起動直後に相当する）
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        print(f"{n_rows}行")
+        output["reruns"] = run_session(server.url(path))
+    output["summary"] = summarize(output["reruns"])
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+
+    print()
+    for kind, stats in output["summary"].items():
+        print(f"  {kind:<13} n={stats['count']:<3} 中央値 {stats['median']:.3f}s  p90 {stats['p90']:.3f}s"
+              f"  最大 {stats['max']:.3f}s  peak {stats['peak_mb']:.1f} MB (+{stats['max_delta_mb']:.1f})")
+    print(f"\n結果を {args.output} に書き出しました")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
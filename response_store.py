@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+名寄せ・正規化済みの回答を保存するSQLiteストア
+
+複数のStreamlitワーカープロセスが、それぞれCSVを解析してDataFrameを保持する代わりに、
+ディスク上の1つのデータベースを共有して集計クエリを実行するためのもの。
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from data_processor import (
+    FREE_TEXT_COLUMN,
+    LOCATION_COLUMNS,
+    PLACE_CODE_COLUMN,
+    PLACE_COLUMN,
+    PREFECTURE_COLUMN,
+    RULE_COLUMN,
+    SOURCE_COLUMN,
+    TIMESTAMP_COLUMN,
+    explode_answers,
+)
+
+# スキーマの版（カラムを増やしたら上げる。版の違うデータベースは古いものとして書き直す）
+SCHEMA_VERSION = "3"
+
+SCHEMA = """
+CREATE TABLE responses (
+    response_id INTEGER PRIMARY KEY,
+    source TEXT,
+    municipality TEXT NOT NULL,
+    region TEXT,
+    lat REAL,
+    lon REAL,
+    submitted_at REAL,
+    rule INTEGER,
+    location TEXT,
+    prefecture TEXT,
+    place TEXT,
+    place_code TEXT
+);
+CREATE TABLE answers (
+    response_id INTEGER NOT NULL,
+    question_key TEXT NOT NULL,
+    municipality TEXT NOT NULL,
+    answer TEXT NOT NULL
+);
+CREATE TABLE free_texts (
+    response_id INTEGER NOT NULL,
+    municipality TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX idx_answers_question_municipality ON answers (question_key, municipality);
+CREATE INDEX idx_free_texts_municipality ON free_texts (municipality);
+"""
+
+
+def write_responses(df: pd.DataFrame, db_path: str) -> None:
+    """
+    前処理済みの回答をSQLiteデータベースに書き出す
+
+    一時ファイルに書き込んでから置き換えるため、読み込み中の他プロセスが
+    書きかけのデータベースを見ることはない。書き込みに失敗したときは一時ファイルを消す。
+
+    Args:
+        df: load_data / load_multiple_data が返す前処理済みDataFrame
+        db_path: データベースファイルのパス
+    """
+    df = df.reset_index(drop=True)
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    # 前回の書き込みが途中で失敗した一時ファイルが残っていれば消す（残っているとスキーマを作れない）
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+
+        source = df[SOURCE_COLUMN].astype(str) if SOURCE_COLUMN in df.columns else pd.Series(None, index=df.index)
+        # 回答日時はUNIX秒で保存する
+        if TIMESTAMP_COLUMN in df.columns:
+            submitted_at = (df[TIMESTAMP_COLUMN] - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+        else:
+            submitted_at = pd.Series(None, index=df.index, dtype="float64")
+        # 名寄せの規則と住所テキスト（診断の名寄せパネル・unmatched_locations 用）
+        rule = df[RULE_COLUMN] if RULE_COLUMN in df.columns else pd.Series(None, index=df.index, dtype="float64")
+        location = df[LOCATION_COLUMNS[0]] if LOCATION_COLUMNS[0] in df.columns else pd.Series(None, index=df.index)
+        # 全国の都道府県・市区町村・団体コード（都道府県ごとの集計用）
+        places = {
+            name: df[col].astype(str) if col in df.columns else pd.Series(None, index=df.index)
+            for name, col in (("prefecture", PREFECTURE_COLUMN), ("place", PLACE_COLUMN),
+                              ("place_code", PLACE_CODE_COLUMN))
+        }
+        responses = pd.DataFrame({
+            "response_id": df.index,
+            "source": source,
+            "municipality": df["市町村名"].astype(str),
+            "region": df["地域"].astype(str),
+            "lat": df["緯度"].astype(float),
+            "lon": df["経度"].astype(float),
+            "submitted_at": submitted_at,
+            "rule": rule,
+            "location": location,
+            **places,
+        })
+        conn.executemany(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            responses.astype(object).where(responses.notna(), None).itertuples(index=False),
+        )
+
+        answers = explode_answers(df)
+        conn.executemany("INSERT INTO answers VALUES (?, ?, ?, ?)", answers.itertuples(index=False))
+
+        if FREE_TEXT_COLUMN in df.columns:
+            texts = df[FREE_TEXT_COLUMN].dropna().astype(str).str.strip()
+            texts = texts[texts != ""]
+            conn.executemany(
+                "INSERT INTO free_texts VALUES (?, ?, ?)",
+                zip(texts.index.tolist(), df.loc[texts.index, "市町村名"].astype(str), texts),
+            )
+
+        conn.execute("INSERT INTO meta VALUES ('written_at', ?)", (str(time.time()),))
+        conn.execute("INSERT INTO meta VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+
+
+@contextmanager
+def _connect(db_path: str):
+    """読み取り専用で接続し、with ブロックを抜けるときに閉じる"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def store_is_fresh(db_path: str, max_age: float) -> bool:
+    """
+    データベースが存在し、現在のスキーマの版で、書き出しから max_age 秒以内かどうか
+
+    Args:
+        db_path: データベースファイルのパス
+        max_age: 許容する経過秒数
+
+    Returns:
+        新しければ True
+    """
+    if not db_path or not os.path.exists(db_path):
+        return False
+    try:
+        with _connect(db_path) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    except sqlite3.Error:
+        return False
+    if meta.get("schema_version") != SCHEMA_VERSION or "written_at" not in meta:
+        return False
+    return time.time() - float(meta["written_at"]) < max_age
+
+
+def read_responses(db_path: str) -> tuple:
+    """
+    回答者テーブルと自由記入欄テーブルを読み込む
+
+    Returns:
+        (DataFrame, 自由記入欄テーブル) のタプル。
+        DataFrameは市町村名・地域・緯度・経度（とソース・タイムスタンプ・名寄せ規則・住所テキスト・
+        都道府県・市区町村・市区町村コード）を持ち、設問カラムは含まない。
+    """
+    with _connect(db_path) as conn:
+        df = pd.read_sql_query(
+            "SELECT * FROM responses ORDER BY response_id",
+            conn, index_col="response_id",
+        )
+        free_text_df = pd.read_sql_query(
+            "SELECT response_id, municipality, text FROM free_texts ORDER BY response_id",
+            conn, index_col="response_id",
+        )
+
+    df = df.rename(columns={
+        "source": SOURCE_COLUMN, "municipality": "市町村名", "region": "地域", "lat": "緯度", "lon": "経度",
+        "rule": RULE_COLUMN, "location": LOCATION_COLUMNS[0],
+        "prefecture": PREFECTURE_COLUMN, "place": PLACE_COLUMN, "place_code": PLACE_CODE_COLUMN,
+    })
+    # 名寄せ規則・住所テキスト・全国の市区町村のない（古い版の）データベースでは、そのカラムを持たない
+    for column in (SOURCE_COLUMN, LOCATION_COLUMNS[0], PREFECTURE_COLUMN, PLACE_COLUMN, PLACE_CODE_COLUMN):
+        if column in df.columns and df[column].isna().all():
+            df = df.drop(columns=[column])
+    if RULE_COLUMN in df.columns:
+        if df[RULE_COLUMN].isna().any():
+            df = df.drop(columns=[RULE_COLUMN])
+        else:
+            df[RULE_COLUMN] = df[RULE_COLUMN].astype("int8")
+    if df["submitted_at"].isna().all():
+        df = df.drop(columns=["submitted_at"])
+    else:
+        df[TIMESTAMP_COLUMN] = pd.to_datetime(df.pop("submitted_at"), unit="s")
+    free_text_df = free_text_df.rename(columns={"municipality": "市町村名", "text": FREE_TEXT_COLUMN})
+    df.index.name = None
+    free_text_df.index.name = None
+    return df, free_text_df
+
+
+def read_answers(db_path: str) -> pd.DataFrame:
+    """
+    回答を縦持ちのまま読み込む（explode_answers と同じ形式）
+    """
+    with _connect(db_path) as conn:
+        return pd.read_sql_query(
+            "SELECT response_id, question_key, municipality, answer FROM answers ORDER BY response_id",
+            conn,
+        )
+
+
+def query_question_distribution(db_path: str, question_key: str) -> pd.DataFrame:
+    """
+    特定の設問の回答分布を取得（get_question_distribution のSQLite版）
+    """
+    with _connect(db_path) as conn:
+        distribution = pd.read_sql_query(
+            "SELECT answer AS 回答, COUNT(*) AS 件数 FROM answers "
+            "WHERE question_key = ? GROUP BY answer ORDER BY 件数 DESC",
+            conn, params=(question_key,),
+        )
+    return distribution
+
+
+def query_municipality_distribution(db_path: str, question_key: str) -> pd.DataFrame:
+    """
+    市町村ごとの設問回答分布を取得（get_municipality_distribution のSQLite版）
+    """
+    with _connect(db_path) as conn:
+        counts = pd.read_sql_query(
+            "SELECT municipality AS 市町村名, answer AS 回答, COUNT(*) AS 件数 FROM answers "
+            "WHERE question_key = ? AND municipality != '県外/不明' "
+            "GROUP BY municipality, answer",
+            conn, params=(question_key,),
+        )
+
+    if counts.empty:
+        return pd.DataFrame()
+
+    return counts.pivot(index="市町村名", columns="回答", values="件数").fillna(0).astype("int64")
+
+
+def query_prefecture_distribution(db_path: str, question_key: str) -> pd.DataFrame:
+    """
+    都道府県ごとの設問回答分布を取得（get_prefecture_distribution のSQLite版）
+    """
+    with _connect(db_path) as conn:
+        counts = pd.read_sql_query(
+            "SELECT responses.prefecture AS 都道府県, answers.answer AS 回答, COUNT(*) AS 件数 "
+            "FROM answers JOIN responses USING (response_id) "
+            "WHERE answers.question_key = ? AND responses.prefecture != '' "
+            "GROUP BY responses.prefecture, answers.answer",
+            conn, params=(question_key,),
+        )
+
+    if counts.empty:
+        return pd.DataFrame()
+
+    return counts.pivot(index="都道府県", columns="回答", values="件数").fillna(0).astype("int64")
+
+
+def query_free_text_by_municipality(db_path: str, municipality: str) -> list:
+    """
+    指定した市町村の自由記入欄を取得（get_free_text_by_municipality のSQLite版）
+    """
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT text FROM free_texts WHERE municipality = ? ORDER BY response_id",
+            (municipality,),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    # テスト
+    from data_processor import load_data, get_question_distribution
+
+    db_path = "responses.sqlite3"
+    print("データ読み込み・書き出しテスト...")
+    df = load_data(db_path=db_path)
+    print(f"  データ件数: {len(df)}")
+
+    print(f"\nQ2の回答分布（SQLite）:")
+    print(query_question_distribution(db_path, "Q2").head(10))
+    print(f"\nQ2の回答分布（DataFrame）:")
+    print(get_question_distribution(df, "Q2").head(10))
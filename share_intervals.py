@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+市町村ごとの回答割合の信用区間
+
+回答数の少ない市町村では割合のばらつきが大きいため、ディリクレ事後分布から
+全設問・全市町村・全回答の割合をまとめてサンプリングし、信用区間を求める。
+あわせて「最も多い方言」が2番目の回答と区別できるかを判定する。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 事後分布のサンプル数
+DRAWS = 500
+
+# 事前分布の強さ（設問ごとに、この値を回答の種類数で等分して各回答に加える）
+PRIOR_STRENGTH = 1.0
+
+# 信用区間の水準
+CREDIBLE_LEVEL = 0.95
+
+# 最多回答が2番目より大きい事後確率がこの値未満なら「区別できない」とする
+DISTINGUISHABLE_PROBABILITY = 0.95
+
+
+def compute_share_intervals(cross_tabs: dict, draws: int = DRAWS, seed: int = 0) -> tuple:
+    """
+    全設問の市町村 × 回答の割合について信用区間を計算する
+
+    全設問の件数を1つの行列（市町村 × 全回答）に並べ、ガンマ分布から一度にサンプリングして
+    設問ごとに正規化する（ディリクレ分布のサンプリング）。
+
+    Args:
+        cross_tabs: {設問キー: 市町村 × 回答のクロス集計} の辞書
+        draws: 事後分布のサンプル数
+
+    Returns:
+        (全セルの区間DataFrame, 市町村ごとの最多回答DataFrame) のタプル
+        - 全セル: 設問, 市町村名, 回答, 件数, 割合, 下限, 上限
+        - 最多回答: 設問, 市町村名, 最も多い方言, 割合, 下限, 上限, 2番目の方言, 優位確率, 区別可能
+    """
+    tabs = {key: tab for key, tab in cross_tabs.items() if not tab.empty}
+    if not tabs:
+        return pd.DataFrame(), pd.DataFrame()
+
+    municipalities = sorted(set().union(*(tab.index for tab in tabs.values())))
+    keys = list(tabs)
+    blocks = [tabs[key].reindex(municipalities).fillna(0).to_numpy(dtype=np.float64) for key in keys]
+    widths = np.array([block.shape[1] for block in blocks])
+    starts = np.concatenate([[0], np.cumsum(widths)[:-1]])
+    counts = np.concatenate(blocks, axis=1)
+    prior = np.repeat(PRIOR_STRENGTH / widths, widths)
+
+    # (市町村, 全回答, draws) のディリクレ・サンプル（サンプル軸を連続にして順序統計量を取りやすくする）
+    rng = np.random.default_rng(seed)
+    samples = rng.standard_gamma((counts + prior)[:, :, None], size=counts.shape + (draws,), dtype=np.float32)
+    block_sums = np.add.reduceat(samples, starts, axis=1)
+    samples /= np.repeat(block_sums, widths, axis=1)
+
+    # 信用区間は順序統計量で求める（全体のソートは不要）
+    tail = (1 - CREDIBLE_LEVEL) / 2
+    ranks = [int(np.floor(tail * (draws - 1))), int(np.ceil((1 - tail) * (draws - 1)))]
+    lower, upper = np.moveaxis(np.partition(samples, ranks, axis=2)[:, :, ranks], 2, 0)
+
+    totals = np.repeat(np.add.reduceat(counts, starts, axis=1), widths, axis=1)
+    shares = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+    # 設問ごとの最多回答と2番目の回答（観測件数の順）
+    answers = np.concatenate([np.asarray(tabs[key].columns, dtype=object) for key in keys])
+    names = np.asarray(municipalities, dtype=object)
+    municipality_index = np.arange(len(municipalities))
+    cells = []
+    dominants = []
+    for q, key in enumerate(keys):
+        start = starts[q]
+        block_counts = counts[:, start:start + widths[q]]
+        answered = np.flatnonzero(block_counts.sum(axis=1) > 0)
+        order = np.argsort(-block_counts, axis=1, kind="stable")
+        top = start + order[:, 0]
+        second = start + order[:, min(1, widths[q] - 1)]
+
+        if widths[q] > 1:
+            probability = (samples[municipality_index, top] > samples[municipality_index, second]).mean(axis=1)
+        else:
+            probability = np.ones(len(municipalities))
+
+        dominants.append(pd.DataFrame({
+            "設問": key,
+            "市町村名": names[answered],
+            "最も多い方言": answers[top[answered]],
+            "割合": shares[answered, top[answered]],
+            "下限": lower[answered, top[answered]],
+            "上限": upper[answered, top[answered]],
+            "2番目の方言": answers[second[answered]] if widths[q] > 1 else None,
+            "優位確率": probability[answered],
+            "区別可能": probability[answered] >= DISTINGUISHABLE_PROBABILITY,
+        }))
+
+        rows = np.repeat(answered, widths[q])
+        cols = np.tile(np.arange(start, start + widths[q]), len(answered))
+        cells.append(pd.DataFrame({
+            "設問": key,
+            "市町村名": names[rows],
+            "回答": answers[cols],
+            "件数": counts[rows, cols].astype(np.int64),
+            "割合": shares[rows, cols],
+            "下限": lower[rows, cols],
+            "上限": upper[rows, cols],
+        }))
+
+    cells_df = pd.concat(cells, ignore_index=True)
+    dominant_df = pd.concat(dominants, ignore_index=True)
+    return cells_df, dominant_df
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+方言回答の空間的自己相関の統計量
+
+市町村ごとの回答割合について、大域・局所モランI統計量と結合数統計量を計算する。
+並べ替え検定は、すべての回答と並べ替えをまとめたNumPyの一括演算で行う。
+"""
+
+import numpy as np
+import pandas as pd
+
+from adjacency import SpatialWeights
+
+# 並べ替え検定の回数
+PERMUTATIONS = 999
+
+# 局所モランIの有意水準
+LISA_ALPHA = 0.05
+
+
+def _pseudo_p_values(observed: np.ndarray, simulated: np.ndarray) -> np.ndarray:
+    """
+    並べ替え分布から片側の擬似p値を求める（観測値がどちらの裾にあるかで向きを決める）
+
+    観測値がNaN（割合がすべての市町村で同じで分散が0）のときはp値もNaNとする。
+
+    Args:
+        observed: 形状 (...) の観測値
+        simulated: 形状 (..., P) の並べ替え統計量
+    """
+    permutations = simulated.shape[-1]
+    upper = (simulated >= observed[..., None]).sum(axis=-1)
+    lower = (simulated <= observed[..., None]).sum(axis=-1)
+    p_values = (np.minimum(upper, lower) + 1) / (permutations + 1)
+    return np.where(np.isnan(observed), np.nan, p_values)
+
+
+def _proportions(cross_tab: pd.DataFrame, weights: SpatialWeights):
+    """
+    クロス集計を市町村 × 回答の割合行列にし、重み行列をデータのある市町村に絞る
+
+    Returns:
+        (回答の一覧, 形状 (回答数, 市町村数) の割合行列, 絞り込んだ重み行列)
+    """
+    names = [name for name in weights.names if name in cross_tab.index]
+    counts = cross_tab.loc[names].to_numpy(dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    keep = totals[:, 0] > 0
+    names = [name for name, k in zip(names, keep) if k]
+    shares = (counts[keep] / totals[keep]).T
+    return list(cross_tab.columns), shares, weights.subset(names)
+
+
+def global_morans_i(values: np.ndarray, weights: SpatialWeights, permutations: int = PERMUTATIONS,
+                    rng: np.random.Generator = None) -> dict:
+    """
+    大域モランI統計量と並べ替え検定
+
+    Args:
+        values: 形状 (k, n) の配列（k個の変数をまとめて計算する）
+        weights: n市町村の重み行列
+        permutations: 並べ替え回数
+
+    Returns:
+        "I", "expected", "p_value" をキーに持つ辞書（各値は長さkの配列）
+    """
+    rng = rng or np.random.default_rng()
+    values = np.atleast_2d(values)
+    n = weights.n
+    z = values - values.mean(axis=1, keepdims=True)
+    denominator = (z ** 2).sum(axis=1)
+    denominator = np.where(denominator > 0, denominator, np.nan)
+
+    observed = n / weights.s0 * (z * weights.lag(z)).sum(axis=1) / denominator
+
+    # 並べ替えは全変数で共通の添字を使い、(k, P, n) を一括でラグ計算する
+    order = np.argsort(rng.random((permutations, n)), axis=1)
+    z_perm = z[:, order]
+    simulated = n / weights.s0 * (z_perm * weights.lag(z_perm)).sum(axis=2) / denominator[:, None]
+
+    return {
+        "I": observed,
+        "expected": np.full(len(observed), -1.0 / (n - 1)),
+        "p_value": _pseudo_p_values(observed, simulated),
+    }
+
+
+def local_morans_i(values: np.ndarray, weights: SpatialWeights, permutations: int = PERMUTATIONS,
+                   rng: np.random.Generator = None) -> dict:
+    """
+    局所モランI統計量（LISA）と条件付き並べ替え検定
+
+    各市町村について、自身を除いた値から近傍数と同じ個数を無作為に選んで空間ラグを作る。
+    重みは行和が1に正規化されていることを前提とする。
+
+    Args:
+        values: 形状 (k, n) の配列
+        weights: 行和を正規化した重み行列
+
+    Returns:
+        "I", "p_value", "quadrant" をキーに持つ辞書（各値は形状 (k, n)）。
+        quadrant は "HH"/"LL"/"HL"/"LH"、有意でない市町村（p値がNaNの場合を含む）は ""。
+    """
+    rng = rng or np.random.default_rng()
+    values = np.atleast_2d(values)
+    n = weights.n
+    z = values - values.mean(axis=1, keepdims=True)
+    m2 = (z ** 2).mean(axis=1, keepdims=True)
+    m2 = np.where(m2 > 0, m2, np.nan)
+    lag = weights.lag(z)
+    observed = z / m2 * lag
+
+    # 並べ替えごとの候補（先頭 max_k + 1 個）から自分自身を除き、近傍数ぶんを採用する
+    cardinalities = weights.cardinalities
+    max_k = int(cardinalities.max()) if n else 0
+    candidates = np.argsort(rng.random((permutations, n)), axis=1)[:, :max_k + 1]
+    is_self = candidates[None, :, :] == np.arange(n)[:, None, None]
+    rank = np.cumsum(~is_self, axis=2)
+    selected = ~is_self & (rank <= cardinalities[:, None, None])
+
+    # 全変数・全市町村・全並べ替えの近傍和を1回の縮約で求める
+    neighbor_sums = np.einsum("kpc,ipc->kip", z[:, candidates], selected.astype(np.float64), optimize=True)
+    simulated_lag = neighbor_sums / np.maximum(cardinalities, 1)[None, :, None]
+    simulated = z[:, :, None] / m2[:, :, None] * simulated_lag
+
+    p_values = _pseudo_p_values(observed, simulated)
+    quadrant = np.select(
+        [(z > 0) & (lag > 0), (z < 0) & (lag < 0), (z > 0) & (lag < 0), (z < 0) & (lag > 0)],
+        ["HH", "LL", "HL", "LH"],
+        default="",
+    )
+    quadrant = np.where((p_values <= LISA_ALPHA) & (cardinalities > 0), quadrant, "")
+    return {"I": observed, "p_value": p_values, "quadrant": quadrant}
+
+
+def join_counts(indicators: np.ndarray, weights: SpatialWeights, permutations: int = PERMUTATIONS,
+                rng: np.random.Generator = None) -> dict:
+    """
+    結合数統計量（BB結合）と並べ替え検定
+
+    Args:
+        indicators: 形状 (k, n) の 0/1 配列（その回答が最多の市町村を1とする）
+        weights: 重み行列（正規化の有無は問わず、隣接の有無のみ使う）
+
+    Returns:
+        "BB", "expected", "p_value" をキーに持つ辞書（各値は長さkの配列）
+    """
+    rng = rng or np.random.default_rng()
+    x = np.atleast_2d(indicators).astype(np.float64)
+    rows, cols = weights.rows, weights.cols
+
+    observed = (x[:, rows] * x[:, cols]).sum(axis=1) / 2
+
+    order = np.argsort(rng.random((permutations, weights.n)), axis=1)
+    x_perm = x[:, order]
+    simulated = (x_perm[:, :, rows] * x_perm[:, :, cols]).sum(axis=2) / 2
+
+    return {"BB": observed, "expected": simulated.mean(axis=1), "p_value": _pseudo_p_values(observed, simulated)}
+
+
+def question_spatial_statistics(cross_tab: pd.DataFrame, weights: SpatialWeights,
+                                permutations: int = PERMUTATIONS, seed: int = 0) -> tuple:
+    """
+    1設問のすべての回答について空間的自己相関を計算する
+
+    Args:
+        cross_tab: get_municipality_distribution の結果（市町村 × 回答の件数）
+        weights: 全市町村の重み行列
+
+    Returns:
+        (回答ごとの統計量DataFrame, 市町村 × 回答の局所モランI象限DataFrame)
+    """
+    if cross_tab.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    rng = np.random.default_rng(seed)
+    answers, shares, local_weights = _proportions(cross_tab, weights)
+    if local_weights.n < 3:
+        return pd.DataFrame(), pd.DataFrame()
+
+    dominant = shares.argmax(axis=0)
+    indicators = (dominant[None, :] == np.arange(len(answers))[:, None])
+
+    moran = global_morans_i(shares, local_weights, permutations, rng)
+    joins = join_counts(indicators, local_weights, permutations, rng)
+    lisa = local_morans_i(shares, local_weights, permutations, rng)
+
+    summary = pd.DataFrame({
+        "回答": answers,
+        "モランI": moran["I"],
+        "期待値": moran["expected"],
+        "p値": moran["p_value"],
+        "最多の市町村数": indicators.sum(axis=1),
+        "BB結合数": joins["BB"],
+        "BB期待値": joins["expected"],
+        "BB p値": joins["p_value"],
+        "ホットスポット数": (lisa["quadrant"] == "HH").sum(axis=1),
+    })
+    clusters = pd.DataFrame(lisa["quadrant"].T, index=local_weights.names, columns=answers)
+    clusters.index.name = "市町村名"
+    return summary, clusters
+
+
+def all_questions_spatial_statistics(cross_tabs: dict, weights: SpatialWeights,
+                                     permutations: int = PERMUTATIONS) -> pd.DataFrame:
+    """
+    全設問・全回答の空間的自己相関の一覧
+
+    Args:
+        cross_tabs: {設問キー: 市町村 × 回答のクロス集計} の辞書
+        weights: 全市町村の重み行列
+
+    Returns:
+        設問キーのカラムを加えた統計量DataFrame
+    """
+    frames = []
+    for question_key, cross_tab in cross_tabs.items():
+        summary, _ = question_spatial_statistics(cross_tab, weights, permutations)
+        if not summary.empty:
+            frames.append(summary.assign(設問=question_key))
+
+    if not frames:
+        return pd.DataFrame()
+    result = pd.concat(frames, ignore_index=True)
+    return result[["設問"] + [c for c in result.columns if c != "設問"]]
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用の合成アンケートデータ生成
+
+本番のスプレッドシートと同じカラム構成（タイムスタンプ・所在地・ルーツ・12設問・自由記入欄）で、
+地域ごとに回答の傾向が異なる、表記ゆれ・複数回答・県外回答を含むCSVを作る。
+乱数のシードを固定しているため、同じ行数なら毎回同じデータになる。
+
+    python synthetic_survey.py --rows 100k --output bench_data/
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processor import QUESTION_COLUMNS, FREE_TEXT_COLUMN, TIMESTAMP_COLUMN
+from municipalities import MUNICIPALITIES, HIRAGANA_TO_KANJI
+
+# 生成する行数のプリセット
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# 設問ごとの回答の語彙（地域ごとに異なる重みで選ぶ）
+VOCABULARY = {
+    "Q1": ["のー", "ずー", "にゃー", "べー", "やー", "じゅー", "の", "ず"],
+    "Q2": ["ありがどさま", "もっけだの", "もっけだ", "おしょうしな", "ありがとさま", "ありがど", "ありがとう",
+           "ありがどの", "ありがどさん"],
+    "Q3": ["はっこい", "つったい", "ひゃっこい", "はっこ", "やばち", "つで", "つめで"],
+    "Q4": ["いっぺ", "えっぺ", "すこだま", "たくさん", "いっぱい", "たんと", "うんと"],
+    "Q5": ["ゆきかき", "ゆきのけ", "ゆぎのげ", "ゆきはき", "ゆぎかぎ", "雪かき", "ゆぎはぎ", "ゆきほり"],
+    "Q6": ["はらくっつい", "はらいっぺ", "はらくっち", "腹くっつい", "はらくず", "はらくつ", "はらえっぺ"],
+    "Q7": ["なげる", "ぶんなげる", "うっちゃる", "すてる", "ほかす"],
+    "Q8": ["くう", "かっこむ", "たべる", "けー", "くらう"],
+    "Q9": ["まなぐ", "め", "まなこ", "めんめ"],
+    "Q10": ["めんこい", "めごい", "めんけ", "かわいい", "めげー"],
+    "Q11": ["ごしゃぐ", "ごせやぐ", "おこる", "ごしゃける", "はらだつ"],
+    "Q12": ["かんます", "かもす", "かきまぜる", "かます", "かんまがす"],
+}
+
+# 地域ごとの回答傾向の集中度（ディリクレ分布のパラメータ、小さいほど地域差が大きい）
+REGIONAL_CONCENTRATION = 0.6
+
+# 複数回答（2つの回答を読点で区切る）の割合
+MULTI_ANSWER_RATE = 0.15
+
+# 未回答の割合
+MISSING_ANSWER_RATE = 0.03
+
+# 表記ゆれ（カタカナ・波ダッシュ・半角カナ・末尾の読点・前後の空白）を入れる割合と種類ごとの重み
+VARIANT_RATE = 0.12
+VARIANT_WEIGHTS = {"katakana": 0.3, "wave": 0.25, "halfwidth": 0.1, "trailing_comma": 0.2, "space": 0.15}
+
+# 所在地の書き方の内訳
+LOCATION_PATTERNS = {
+    "kanji": 0.55,          # 鶴岡市
+    "kanji_address": 0.15,  # 鶴岡市本町
+    "hiragana": 0.07,       # つるおかし
+    "old_town": 0.06,       # 羽黒町
+    "outside": 0.12,        # 東京都
+    "empty": 0.05,
+}
+
+# 旧町村名（名寄せで現在の市町村に寄せられるもの）
+OLD_TOWNS = {
+    "鶴岡市": ["温海町", "藤島町", "羽黒町", "櫛引町", "湯野浜", "大山"],
+    "酒田市": ["平田町", "松山町", "八幡町"],
+    "庄内町": ["余目町", "立川町"],
+}
+
+OUTSIDE_LOCATIONS = ["東京都", "神奈川県横浜市", "宮城県仙台市", "秋田県", "新潟県新潟市", "北海道札幌市",
+                     "埼玉県", "大阪府", "県外", "海外"]
+
+STREET_SUFFIXES = ["本町", "旭町", "緑町", "二丁目", "駅前", "大字上野"]
+
+# 県外在住者がルーツ欄に県内の市町村を書く割合
+OUTSIDE_ROOTS_RATE = 0.6
+
+# 自由記入欄に記入がある割合と文の型
+FREE_TEXT_RATE = 0.3
+FREE_TEXT_TEMPLATES = [
+    "{a}は{m}の言葉です",
+    "「{a}」ってよく言います",
+    "{m}では{a}と言う。{b}とも言うけど",
+    "祖母がよく{a}と言っていました",
+    "{a}、{b}",
+]
+
+# 回答日時の期間と、回答の急増（SNSで拡散された日など）の割合
+RESPONSE_DAYS = 60
+BURST_RATE = 0.1
+START_DATE = pd.Timestamp("2024-01-01")
+
+_HALFWIDTH_KATAKANA = dict(zip(
+    "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲンャュョッー",
+    "ｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜｦﾝｬｭｮｯｰ",
+))
+
+_KANJI_TO_HIRAGANA = {kanji: hira for hira, kanji in reversed(list(HIRAGANA_TO_KANJI.items()))}
+
+
+def _katakana(text: str) -> str:
+    return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text)
+
+
+def _variant(text: str, kind: str) -> str:
+    """表記ゆれを入れた回答"""
+    if kind == "katakana":
+        return _katakana(text)
+    if kind == "wave":
+        return text.replace("ー", "〜") if "ー" in text else text + "〜"
+    if kind == "halfwidth":
+        return "".join(_HALFWIDTH_KATAKANA.get(c, c) for c in _katakana(text))
+    if kind == "trailing_comma":
+        return text + "、"
+    return f" {text}　"
+
+
+def _answer_column(rng: np.random.Generator, vocabulary: list, region_codes: np.ndarray,
+                   n_regions: int) -> np.ndarray:
+    """1設問分の回答（地域ごとの傾向・複数回答・表記ゆれ・未回答を含む）"""
+    n = len(region_codes)
+    weights = rng.dirichlet(np.full(len(vocabulary), REGIONAL_CONCENTRATION), size=n_regions)
+    cumulative = weights.cumsum(axis=1)[region_codes]
+
+    def draw():
+        return (rng.random(n)[:, None] > cumulative).sum(axis=1).clip(max=len(vocabulary) - 1)
+
+    # 回答ごとの表記（0列目が基本形、以降が表記ゆれ）の表から引く
+    kinds = list(VARIANT_WEIGHTS)
+    forms = np.array([[word] + [_variant(word, kind) for kind in kinds] for word in vocabulary], dtype=object)
+    variant_probs = np.array([1 - VARIANT_RATE] + [VARIANT_RATE * VARIANT_WEIGHTS[k] for k in kinds])
+
+    first = forms[draw(), rng.choice(len(variant_probs), size=n, p=variant_probs)]
+    second = forms[draw(), rng.choice(len(variant_probs), size=n, p=variant_probs)]
+    multi = rng.random(n) < MULTI_ANSWER_RATE
+    first[multi] = first[multi] + "、" + second[multi]
+    first[rng.random(n) < MISSING_ANSWER_RATE] = None
+    return first
+
+
+def _location_column(rng: np.random.Generator, municipalities: np.ndarray, patterns: np.ndarray) -> np.ndarray:
+    """所在地の書き方のパターンごとに住所テキストを作る"""
+    n = len(municipalities)
+    values = np.empty(n, dtype=object)
+    values[:] = ""
+    for pattern in LOCATION_PATTERNS:
+        rows = np.flatnonzero(patterns == pattern)
+        if len(rows) == 0:
+            continue
+        names = municipalities[rows]
+        if pattern == "kanji":
+            values[rows] = names
+        elif pattern == "kanji_address":
+            values[rows] = names + np.asarray(STREET_SUFFIXES, dtype=object)[rng.integers(len(STREET_SUFFIXES), size=len(rows))]
+        elif pattern == "hiragana":
+            values[rows] = [_KANJI_TO_HIRAGANA.get(name, name) for name in names]
+        elif pattern == "old_town":
+            values[rows] = [
+                OLD_TOWNS[name][k % len(OLD_TOWNS[name])] if name in OLD_TOWNS else name
+                for name, k in zip(names, rng.integers(1 << 16, size=len(rows)))
+            ]
+        elif pattern == "outside":
+            values[rows] = np.asarray(OUTSIDE_LOCATIONS, dtype=object)[rng.integers(len(OUTSIDE_LOCATIONS), size=len(rows))]
+    return values
+
+
+def _timestamps(rng: np.random.Generator, n: int) -> np.ndarray:
+    """回答日時（期間全体に一様＋数日の急増）を TIMESTAMP_FORMAT の文字列で返す"""
+    seconds = rng.random(n) * RESPONSE_DAYS * 86400
+    burst_days = rng.integers(RESPONSE_DAYS, size=3)
+    burst = rng.random(n) < BURST_RATE
+    seconds[burst] = burst_days[rng.integers(len(burst_days), size=burst.sum())] * 86400 + rng.random(burst.sum()) * 86400
+    times = np.sort(START_DATE.value // 10**9 + seconds.astype(np.int64)).astype("datetime64[s]")
+    # strftime は1行ずつ整形するため遅い（ISO形式の文字列を一括で置換する）
+    text = np.datetime_as_string(times, unit="s")
+    return np.strings.replace(np.strings.replace(text, "-", "/"), "T", " ").astype(object)
+
+
+def generate_survey(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    合成アンケートデータを作る
+
+    Args:
+        n_rows: 行数
+        seed: 乱数のシード
+
+    Returns:
+        スプレッドシートのCSVと同じカラム構成のDataFrame（文字列のみ）
+    """
+    rng = np.random.default_rng(seed)
+    names = list(MUNICIPALITIES)
+    regions = sorted({data["region"] for data in MUNICIPALITIES.values()})
+    region_of = np.array([regions.index(MUNICIPALITIES[name]["region"]) for name in names])
+
+    # 市町村は人口の偏りを模して Zipf 風の重みで選ぶ
+    popularity = 1.0 / np.arange(1, len(names) + 1) ** 0.8
+    municipality_codes = rng.choice(len(names), size=n_rows, p=popularity / popularity.sum())
+    municipalities = np.asarray(names, dtype=object)[municipality_codes]
+    patterns = rng.choice(list(LOCATION_PATTERNS), size=n_rows, p=list(LOCATION_PATTERNS.values()))
+
+    # 県外在住者はルーツ欄で県内の市町村を答えることが多い
+    outside = np.isin(patterns, ["outside", "empty"])
+    roots_patterns = np.where(outside & (rng.random(n_rows) < OUTSIDE_ROOTS_RATE), "kanji", "empty")
+    roots_patterns = np.where(~outside & (rng.random(n_rows) < 0.5), "kanji_address", roots_patterns)
+
+    data = {
+        TIMESTAMP_COLUMN: _timestamps(rng, n_rows),
+        "現在お住まいの場所": _location_column(rng, municipalities, patterns),
+        "ルーツ": _location_column(rng, municipalities, roots_patterns),
+    }
+    for question_key, col_name in QUESTION_COLUMNS.items():
+        data[col_name] = _answer_column(rng, VOCABULARY[question_key], region_of[municipality_codes], len(regions))
+
+    # 自由記入欄（テンプレートの種類 × 回答 × 市町村のユニークな文を作ってから行に割り当てる）
+    q_words = np.asarray(VOCABULARY["Q2"] + VOCABULARY["Q10"], dtype=object)
+    texts = np.array([
+        template.format(a=q_words[k % len(q_words)], b=q_words[(k * 7 + 3) % len(q_words)], m=names[k % len(names)])
+        for k, template in enumerate(FREE_TEXT_TEMPLATES * 200)
+    ], dtype=object)
+    has_text = rng.random(n_rows) < FREE_TEXT_RATE
+    free_text = np.full(n_rows, None, dtype=object)
+    free_text[has_text] = texts[rng.integers(len(texts), size=has_text.sum())]
+    data[FREE_TEXT_COLUMN] = free_text
+
+    return pd.DataFrame(data)
+
+
+def parse_size(size: str) -> int:
+    """行数の指定（1k / 100k / 1m のプリセットまたは整数）"""
+    return SIZES.get(size.lower()) or int(size)
+
+
+def write_survey(n_rows: int, directory: str, seed: int = 0) -> str:
+    """
+    合成データをCSVに書き出す（同じ行数・シードのファイルがあれば作り直さない）
+
+    Returns:
+        CSVファイルのパス
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"survey_{n_rows}_{seed}.csv")
+    if not os.path.exists(path):
+        generate_survey(n_rows, seed).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成アンケートCSVを作る")
+    parser.add_argument("--rows", nargs="+", default=list(SIZES), help="行数（1k / 100k / 1m または整数）")
+    parser.add_argument("--output", default="bench_data", help="出力先ディレクトリ")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.rows:
+        path = write_survey(parse_size(size), args.output, args.seed)
+        print(f"{path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+回答日時にもとづく時系列集計
+
+回答を一定幅の期間（バケット）に分け、設問 × 市町村 × 回答ごとの件数の累積和を持つ。
+任意の期間の分布は累積和の差（2行の引き算）で求めるため、期間を変えても
+DataFrameを絞り込み直す必要はない。
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_processor import TIMESTAMP_COLUMN
+
+# バケットの幅（pandas の頻度文字列）
+BUCKET_FREQ = "D"
+
+# 急増の判定に使う直前のバケット数（この期間の中央値を基準とする）
+BURST_BASELINE_BUCKETS = 7
+
+# 基準からの乖離（ポアソン近似の標準化スコア）がこの値以上で急増とみなす
+BURST_SCORE = 4.0
+
+# 急増とみなす最小件数（件数の少ないバケットの揺らぎを除く）
+BURST_MIN_COUNT = 10
+
+OUTSIDE_PREFECTURE = "県外/不明"
+
+
+class ResponseTimeSeries:
+    """
+    設問 × 市町村 × 回答の件数と、市町村ごとの回答者数の累積和
+
+    Args:
+        df: 市町村名とタイムスタンプを持つ前処理済みDataFrame（インデックスが response_id）
+        answers: explode_answers / read_answers の結果
+        freq: バケットの幅
+    """
+
+    def __init__(self, df: pd.DataFrame, answers: pd.DataFrame, freq: str = BUCKET_FREQ):
+        if TIMESTAMP_COLUMN in df.columns:
+            timestamps = pd.to_datetime(df[TIMESTAMP_COLUMN]).dropna()
+        else:
+            timestamps = pd.Series(dtype="datetime64[ns]")
+        self.freq = freq
+        self.undated = len(df) - len(timestamps)
+        if timestamps.empty:
+            self.edges = pd.DatetimeIndex([])
+            self.features = pd.MultiIndex.from_arrays([[], [], []], names=["設問", "市町村名", "回答"])
+            self.municipalities = pd.Index([], name="市町村名")
+            self._answer_totals = np.zeros((1, 0), dtype=np.int64)
+            self._response_totals = np.zeros((1, 0), dtype=np.int64)
+            return
+
+        start = timestamps.min().floor(freq)
+        end = timestamps.max().floor(freq) + pd.tseries.frequencies.to_offset(freq)
+        self.edges = pd.date_range(start, end, freq=freq)
+        n_buckets = len(self.edges) - 1
+        bucket_of = pd.Series(
+            self.edges.searchsorted(timestamps.to_numpy(), side="right") - 1,
+            index=timestamps.index,
+        )
+
+        # 回答（設問 × 市町村 × 回答）ごとのバケット別件数 → 累積和
+        buckets = bucket_of.reindex(answers["response_id"].to_numpy()).to_numpy()
+        dated = ~np.isnan(buckets)
+        dated_answers = answers[dated]
+        codes, features = pd.factorize(
+            pd.MultiIndex.from_arrays(
+                [dated_answers["question_key"], dated_answers["municipality"].astype(str), dated_answers["answer"]]
+            ),
+            sort=True,
+        )
+        self.features = pd.MultiIndex.from_tuples(features, names=["設問", "市町村名", "回答"])
+        self._answer_totals = self._prefix_sums(buckets[dated].astype(np.int64), codes, n_buckets, len(features))
+
+        # 回答者数（市町村別）のバケット別件数 → 累積和
+        municipality_codes, municipalities = pd.factorize(
+            df.loc[timestamps.index, "市町村名"].astype(str), sort=True
+        )
+        self.municipalities = pd.Index(municipalities, name="市町村名")
+        self._response_totals = self._prefix_sums(
+            bucket_of.to_numpy(), municipality_codes, n_buckets, len(municipalities)
+        )
+
+    @staticmethod
+    def _prefix_sums(buckets: np.ndarray, codes: np.ndarray, n_buckets: int, n_codes: int) -> np.ndarray:
+        """バケット × コードの件数の累積和（先頭に0の行を持つ、形状 (n_buckets + 1, n_codes)）"""
+        counts = np.bincount(buckets * n_codes + codes, minlength=n_buckets * n_codes)
+        totals = np.zeros((n_buckets + 1, n_codes), dtype=np.int64)
+        np.cumsum(counts.reshape(n_buckets, n_codes), axis=0, out=totals[1:])
+        return totals
+
+    @property
+    def bucket_starts(self) -> pd.DatetimeIndex:
+        """各バケットの開始日時"""
+        return self.edges[:-1]
+
+    def __len__(self) -> int:
+        return max(len(self.edges) - 1, 0)
+
+    def _bucket_range(self, start=None, end=None) -> tuple:
+        """期間 [start, end) に開始日時が含まれるバケットの範囲（累積和の行番号）"""
+        starts = self.bucket_starts
+        lo = 0 if start is None else int(starts.searchsorted(pd.Timestamp(start), side="left"))
+        hi = len(starts) if end is None else int(starts.searchsorted(pd.Timestamp(end), side="left"))
+        return lo, max(lo, hi)
+
+    def window_counts(self, start=None, end=None) -> pd.Series:
+        """
+        期間内の (設問, 市町村名, 回答) ごとの件数
+
+        Args:
+            start: 期間の開始（含む、省略時は最初から）
+            end: 期間の終了（含まない、省略時は最後まで）
+        """
+        lo, hi = self._bucket_range(start, end)
+        return pd.Series(self._answer_totals[hi] - self._answer_totals[lo], index=self.features, name="件数")
+
+    def question_distribution(self, question_key: str, start=None, end=None) -> pd.DataFrame:
+        """期間内の設問の回答分布（get_question_distribution と同じ形式）"""
+        counts = self.window_counts(start, end)
+        if question_key not in counts.index.get_level_values(0):
+            return pd.DataFrame(columns=["回答", "件数"])
+        counts = counts.loc[question_key].groupby(level="回答").sum()
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts.rename_axis("回答").reset_index(name="件数")
+
+    def municipality_distribution(self, question_key: str, start=None, end=None) -> pd.DataFrame:
+        """期間内の市町村ごとの設問回答分布（get_municipality_distribution と同じ形式）"""
+        counts = self.window_counts(start, end)
+        if question_key not in counts.index.get_level_values(0):
+            return pd.DataFrame()
+        counts = counts.loc[question_key]
+        counts = counts[(counts > 0) & (counts.index.get_level_values("市町村名") != OUTSIDE_PREFECTURE)]
+        if counts.empty:
+            return pd.DataFrame()
+        return counts.unstack("回答", fill_value=0).astype("int64")
+
+    def responses_per_bucket(self) -> pd.DataFrame:
+        """バケット × 市町村の回答者数"""
+        return pd.DataFrame(
+            np.diff(self._response_totals, axis=0), index=self.bucket_starts, columns=self.municipalities
+        )
+
+    def detect_bursts(self, baseline_buckets: int = BURST_BASELINE_BUCKETS, score: float = BURST_SCORE,
+                      min_count: int = BURST_MIN_COUNT) -> pd.DataFrame:
+        """
+        回答数の急増（全体・市町村別）を検出する
+
+        直前 baseline_buckets 個のバケットの中央値を基準とし、
+        (件数 - 基準) / √基準 が score 以上のバケットを急増とする。
+        直前のバケットが baseline_buckets の半分に満たない期間の初めは判定しない。
+
+        Returns:
+            期間, 市町村名（全体は「全体」）, 件数, 基準, スコア の DataFrame（スコアの降順）
+        """
+        per_bucket = self.responses_per_bucket()
+        if per_bucket.empty:
+            return pd.DataFrame(columns=["期間", "市町村名", "件数", "基準", "スコア"])
+        per_bucket.insert(0, "全体", per_bucket.sum(axis=1))
+
+        baseline = per_bucket.rolling(baseline_buckets, min_periods=max(1, baseline_buckets // 2)).median().shift(1)
+        scores = (per_bucket - baseline) / np.sqrt(baseline.clip(lower=1))
+        flagged = (scores >= score).fillna(False) & (per_bucket >= min_count)
+
+        rows, cols = np.nonzero(flagged.to_numpy())
+        bursts = pd.DataFrame({
+            "期間": per_bucket.index[rows],
+            "市町村名": per_bucket.columns[cols],
+            "件数": per_bucket.to_numpy()[rows, cols],
+            "基準": baseline.to_numpy()[rows, cols],
+            "スコア": scores.to_numpy()[rows, cols],
+        })
+        return bursts.sort_values("スコア", ascending=False, ignore_index=True)
+
+    def stabilization(self, question_key: str) -> pd.DataFrame:
+        """
+        各時点までの累積で、市町村の最多回答が最終結果と一致している割合
+
+        地図の色（最多回答）が回答の集まりとともに落ち着いていく様子を見るためのもの。
+
+        Returns:
+            バケットの開始日時をインデックスとし、累積回答者数, 回答のある市町村数, 最終結果との一致率 を持つDataFrame
+        """
+        questions = self.features.get_level_values(0)
+        columns = np.flatnonzero((questions == question_key)
+                                 & (self.features.get_level_values(1) != OUTSIDE_PREFECTURE))
+        if len(columns) == 0:
+            return pd.DataFrame(columns=["累積回答者数", "回答のある市町村数", "最終結果との一致率"])
+
+        # 累積件数を (バケット, 市町村, 回答) の密な配列に並べ直す
+        features = self.features[columns]
+        municipality_codes, _ = pd.factorize(features.get_level_values(1))
+        answer_codes, answers = pd.factorize(features.get_level_values(2))
+        cumulative = np.zeros((len(self) + 1, municipality_codes.max() + 1, len(answers)), dtype=np.int64)
+        cumulative[:, municipality_codes, answer_codes] = self._answer_totals[:, columns]
+        cumulative = cumulative[1:]
+
+        answered = cumulative.sum(axis=2) > 0
+        dominant = cumulative.argmax(axis=2)
+        matches = (dominant == dominant[-1]) & answered
+        answered_count = answered.sum(axis=1)
+        return pd.DataFrame({
+            "累積回答者数": self._response_totals[1:].sum(axis=1),
+            "回答のある市町村数": answered_count,
+            "最終結果との一致率": matches.sum(axis=1) / answered[-1].sum(),
+        }, index=self.bucket_starts)
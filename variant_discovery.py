@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+未知の表記ゆれの発見と統合ルールの作成
+
+設問ごとに正規化済みの回答（表記）を集め、かなの違いを考慮した編集距離で
+近い表記をまとめて統合候補を提案する。承認した候補は normalization_rules.json に書き出し、
+normalize_dialect_term が読み込み時に適用する。
+
+    python variant_discovery.py                          # 統合候補を表示
+    python variant_discovery.py --output proposals.csv   # 統合候補をCSVに書き出す
+    python variant_discovery.py --accept proposals.csv   # 編集したCSVの統合をルールに追加
+
+近傍検索は、かなの骨格（濁点・小書き・長音を除いた形）の1文字削除を鍵にした索引で候補を絞り、
+候補だけを重み付き編集距離で確かめる（短い表記どうしではBK木の枝刈りがほとんど効かないため）。
+"""
+
+import argparse
+import json
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+import pandas as pd
+
+from data_processor import NORMALIZATION_RULES_FILE, load_normalization_rules
+
+# 統合候補とする距離の上限（通常の1文字の違いを1、かなの関連する違いを0.5とする）
+MAX_DISTANCE = 1.0
+
+# 短い表記どうしの距離の上限（短い方の文字数に対する割合、最低でも関連する違い1つは許す）
+RELATIVE_DISTANCE = 0.25
+
+# 骨格の1文字削除を索引に入れる最小の長さ（これより短い表記は骨格が一致するものだけを候補にする）
+MIN_DELETION_LENGTH = 3
+
+# 長音・促音・小書きの母音など、挿入・削除を関連する違いとみなす文字
+_SOFT_CHARS = set("ーー〜～っッぁぃぅぇぉァィゥェォ")
+
+# 長音記号と入れ替わりやすい母音
+_VOWELS = set("あいうえおぁぃぅぇぉアイウエオァィゥェォ")
+
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+_SMALL_KANA = str.maketrans("ぁぃぅぇぉっゃゅょゎ", "あいうえおつやゆよわ")
+
+
+@lru_cache(maxsize=None)
+def _char_class(char: str) -> str:
+    """文字の種類（ひらがな・大書き・濁点なし）。関連する文字は同じ種類になる"""
+    if "ァ" <= char <= "ヶ":
+        char = chr(ord(char) - 0x60)
+    char = unicodedata.normalize("NFD", char)[0]
+    return char.translate(_SMALL_KANA)
+
+
+def _substitution_cost(a: str, b: str) -> int:
+    """置換の重み（同じなら0、関連する文字なら1、それ以外は2）"""
+    if a == b:
+        return 0
+    if _char_class(a) == _char_class(b):
+        return 1
+    if (a in "ー〜～" and b in _VOWELS) or (b in "ー〜～" and a in _VOWELS):
+        return 1
+    return 2
+
+
+def _indel_cost(char: str) -> int:
+    """挿入・削除の重み（長音・促音などは1、それ以外は2）"""
+    return 1 if char in _SOFT_CHARS else 2
+
+
+def kana_distance(a: str, b: str) -> float:
+    """
+    かなの違いを考慮した編集距離
+
+    濁点・半濁点の有無、小書き、長音と母音の入れ替え、長音・促音の有無は0.5、
+    それ以外の1文字の違いは1として数える。ひらがなとカタカナの違いは語全体で0.5とする。
+    """
+    hiragana_a, hiragana_b = a.translate(_KATAKANA_TO_HIRAGANA), b.translate(_KATAKANA_TO_HIRAGANA)
+    if hiragana_a == hiragana_b:
+        return 0.0 if a == b else 0.5
+    a, b = hiragana_a, hiragana_b
+    previous = [0]
+    for char in b:
+        previous.append(previous[-1] + _indel_cost(char))
+    for char_a in a:
+        current = [previous[0] + _indel_cost(char_a)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + _indel_cost(char_a),
+                current[j - 1] + _indel_cost(char_b),
+                previous[j - 1] + _substitution_cost(char_a, char_b),
+            ))
+        previous = current
+    return previous[-1] / 2
+
+
+def skeleton(token: str) -> str:
+    """かなの骨格（ひらがな・大書き・濁点なしにし、長音・促音・小書きの母音を除く）"""
+    return "".join(_char_class(char) for char in token if char not in _SOFT_CHARS)
+
+
+def distance_limit(a: str, b: str) -> float:
+    """2つの表記を統合候補とする距離の上限"""
+    return min(MAX_DISTANCE, max(0.5, RELATIVE_DISTANCE * min(len(a), len(b))))
+
+
+class VariantIndex:
+    """
+    表記の近傍検索のための索引
+
+    骨格とその1文字削除を鍵にしたバケットに表記を登録する。
+    距離の上限以内の表記は、骨格が一致するか、骨格の1文字削除のどれかが一致するので、
+    同じバケットに入った表記だけを重み付き編集距離で確かめればよい。
+
+    Args:
+        tokens: 表記のリスト
+    """
+
+    def __init__(self, tokens):
+        self.tokens = list(dict.fromkeys(tokens))
+        self._buckets = defaultdict(list)
+        for k, token in enumerate(self.tokens):
+            for key in self._keys(token):
+                self._buckets[key].append(k)
+
+    @staticmethod
+    def _keys(token: str) -> set:
+        base = skeleton(token)
+        keys = {base}
+        if len(base) >= MIN_DELETION_LENGTH:
+            keys.update(base[:k] + base[k + 1:] for k in range(len(base)))
+        return keys
+
+    def query(self, token: str) -> list:
+        """
+        表記に近い登録済みの表記を探す
+
+        Returns:
+            [(表記, 距離), ...] の距離の昇順のリスト（自分自身は含まない）
+        """
+        candidates = {k for key in self._keys(token) for k in self._buckets.get(key, ())}
+        matches = []
+        for k in candidates:
+            other = self.tokens[k]
+            if other == token:
+                continue
+            distance = kana_distance(token, other)
+            if distance <= distance_limit(token, other):
+                matches.append((other, distance))
+        return sorted(matches, key=lambda match: match[1])
+
+    def neighbor_pairs(self) -> dict:
+        """
+        距離の上限以内のすべての表記の組
+
+        Returns:
+            {(i, j): 距離} の辞書（i < j は self.tokens の番号）
+        """
+        pairs = {}
+        for members in self._buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    i, j = sorted((members[x], members[y]))
+                    if (i, j) in pairs:
+                        continue
+                    a, b = self.tokens[i], self.tokens[j]
+                    distance = kana_distance(a, b)
+                    pairs[(i, j)] = distance if distance <= distance_limit(a, b) else None
+        return {pair: distance for pair, distance in pairs.items() if distance is not None}
+
+
+def propose_merges(counts: pd.Series, question_key: str) -> pd.DataFrame:
+    """
+    1設問の表記の統合候補を作る
+
+    件数の多い表記から順に代表とし、まだどこにも属していない近い表記をその代表にまとめる
+    （連鎖して遠い表記どうしがまとまらないよう、代表との距離だけで判定する）。
+
+    Args:
+        counts: 表記ごとの件数
+        question_key: 設問キー
+
+    Returns:
+        設問, 代表, 代表の件数, 表記, 件数, 距離 の DataFrame
+    """
+    counts = counts.sort_values(ascending=False, kind="stable")
+    index = VariantIndex(counts.index)
+    neighbors = defaultdict(dict)
+    for (i, j), distance in index.neighbor_pairs().items():
+        neighbors[i][j] = distance
+        neighbors[j][i] = distance
+
+    assigned = set()
+    rows = []
+    for center in range(len(index.tokens)):
+        if center in assigned:
+            continue
+        assigned.add(center)
+        for member, distance in sorted(neighbors[center].items(), key=lambda item: item[1]):
+            if member in assigned:
+                continue
+            assigned.add(member)
+            rows.append({
+                "設問": question_key,
+                "代表": index.tokens[center],
+                "代表の件数": int(counts.iloc[center]),
+                "表記": index.tokens[member],
+                "件数": int(counts.iloc[member]),
+                "距離": distance,
+            })
+
+    return pd.DataFrame(rows, columns=["設問", "代表", "代表の件数", "表記", "件数", "距離"])
+
+
+def propose_all(answers: pd.DataFrame, min_count: int = 1) -> pd.DataFrame:
+    """
+    全設問の表記の統合候補
+
+    Args:
+        answers: explode_answers / read_answers の結果
+        min_count: この件数未満の表記は対象にしない
+    """
+    frames = []
+    for question_key, group in answers.groupby("question_key", sort=False):
+        counts = group["answer"].value_counts()
+        counts = counts[counts >= min_count]
+        frames.append(propose_merges(counts, question_key))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["設問", "代表", "代表の件数", "表記", "件数", "距離"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def accept_merges(proposals: pd.DataFrame, path: str = NORMALIZATION_RULES_FILE) -> dict:
+    """
+    承認した統合候補を統合ルールに追加して保存する
+
+    代表表記が既存ルールで別の表記に統合されている場合はその先に付け替え、
+    代表表記がルールのキーに残らないようにする（正規化を繰り返しても結果が変わらないように）。
+
+    Args:
+        proposals: 設問・代表・表記のカラムを持つ DataFrame（propose_all の結果を編集したもの）
+        path: ルールファイルのパス
+
+    Returns:
+        保存したルール
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        rules = {}
+
+    for row in proposals.itertuples(index=False):
+        question_rules = rules.setdefault(row.設問, {})
+        if row.表記 == row.代表:
+            continue
+        question_rules[row.表記] = row.代表
+
+    # 連鎖した統合を最終的な代表表記にまとめる
+    for question_key, question_rules in rules.items():
+        for variant in list(question_rules):
+            target = question_rules[variant]
+            seen = {variant}
+            while target in question_rules and target not in seen:
+                seen.add(target)
+                target = question_rules[target]
+            question_rules[variant] = target
+        rules[question_key] = {variant: target for variant, target in question_rules.items() if variant != target}
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f, ensure_ascii=False, indent=2, sort_keys=True)
+    load_normalization_rules(reload=True)
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="表記ゆれの統合候補の作成と統合ルールへの追加")
+    parser.add_argument("--output", help="統合候補を書き出すCSVファイル")
+    parser.add_argument("--accept", help="統合ルールに追加する統合候補のCSVファイル")
+    parser.add_argument("--min-count", type=int, default=1, help="対象にする表記の最小件数")
+    args = parser.parse_args()
+
+    if args.accept:
+        proposals = pd.read_csv(args.accept)
+        rules = accept_merges(proposals)
+        print(f"{NORMALIZATION_RULES_FILE} を更新しました（{sum(len(r) for r in rules.values())}件のルール）")
+        return
+
+    from data_processor import load_data, explode_answers
+
+    print("データ読み込み中...")
+    answers = explode_answers(load_data())
+    proposals = propose_all(answers, args.min_count)
+    if args.output:
+        proposals.to_csv(args.output, index=False)
+        print(f"{len(proposals)}件の統合候補を {args.output} に書き出しました")
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", 120):
+            print(proposals.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ cases = [
     ("Q1", "ずー"), ("Q1", "ず"), ("Q1", "ずぅー"),
     ("Q2", "ありがと"), ("Q2", "ありがど"), ("Q2", "ありがとう"),
     ("Q2", "もっけだの"), ("Q2", "もっけ"),
-    ("Q3", "つったい"), ("Q3", "つっだい"), ("Q3", "はっこい"), ("Q3", "ひゃっこい")
+    ("Q3", "つったい"), ("Q3", "つっだい"), ("Q3", "はっこい"), ("Q3", "ひゃっこい"),
+    ("Q1", "ノォー"), ("Q1", "ﾉｰ"), ("Q10", "メンコイ"), ("Q10", "めんこい　")
 ]
 
 for q, text in cases: